@@ -13,17 +13,17 @@ from src.models.catalog import (
 
 from src.models.orders import (
     Country, State, City, Address,
-    Cart, CartItem,
+    Cart, CartItem, InventoryReservation,
     Order, OrderItem, OrderStatusHistory,
     Payment, PaymentRefund,
     ShippingMethod, Shipment, ShipmentTracking
 )
 
 from src.models.additional import (
-    Review, ReviewHelpfulness,
+    Review, ReviewHelpfulness, ProductReviewStats,
     WishlistItem,
     Coupon, CouponUsage, CouponProductRestriction, CouponCategoryRestriction,
-    Setting, TaxRate,
+    Setting, TaxRate, IdempotencyKey,
     NotificationTemplate, Notification,
     ProductView, SearchQuery
 )
@@ -42,7 +42,7 @@ __all__ = [
     'Country', 'State', 'City', 'Address',
     
     # Carrito y pedidos
-    'Cart', 'CartItem',
+    'Cart', 'CartItem', 'InventoryReservation',
     'Order', 'OrderItem', 'OrderStatusHistory',
     
     # Pagos y envíos
@@ -50,12 +50,12 @@ __all__ = [
     'ShippingMethod', 'Shipment', 'ShipmentTracking',
     
     # Funcionalidades adicionales
-    'Review', 'ReviewHelpfulness',
+    'Review', 'ReviewHelpfulness', 'ProductReviewStats',
     'WishlistItem',
     'Coupon', 'CouponUsage', 'CouponProductRestriction', 'CouponCategoryRestriction',
     
     # Configuración y sistema
-    'Setting', 'TaxRate',
+    'Setting', 'TaxRate', 'IdempotencyKey',
     'NotificationTemplate', 'Notification',
     
     # Analytics
@@ -73,14 +73,14 @@ def get_all_models():
         AttributeGroup, Attribute, ProductAttribute,
         ProductVariant, VariantAttribute,
         Country, State, City, Address,
-        Cart, CartItem,
+        Cart, CartItem, InventoryReservation,
         Order, OrderItem, OrderStatusHistory,
         Payment, PaymentRefund,
         ShippingMethod, Shipment, ShipmentTracking,
-        Review, ReviewHelpfulness,
+        Review, ReviewHelpfulness, ProductReviewStats,
         WishlistItem,
         Coupon, CouponUsage, CouponProductRestriction, CouponCategoryRestriction,
-        Setting, TaxRate,
+        Setting, TaxRate, IdempotencyKey,
         NotificationTemplate, Notification,
         ProductView, SearchQuery
     ]
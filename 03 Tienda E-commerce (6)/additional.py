@@ -113,6 +113,31 @@ class ReviewHelpfulness(Base, TimestampMixin):
         UniqueConstraint('review_id', 'user_id', name='uq_review_helpfulness'),
     )
 
+class ProductReviewStats(Base):
+    """Agregado de reseñas aprobadas por producto (mantenido incrementalmente)"""
+    __tablename__ = 'product_review_stats'
+    
+    product_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    review_count = Column(Integer, default=0, nullable=False)
+    rating_sum = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), 
+                       onupdate=lambda: datetime.now(timezone.utc), nullable=False)
+    
+    # Relaciones
+    product = relationship("Product", back_populates="review_stats")
+    
+    # Constraints
+    __table_args__ = (
+        CheckConstraint('review_count >= 0', name='ck_review_stats_count_positive'),
+        CheckConstraint('rating_sum >= 0', name='ck_review_stats_sum_positive'),
+    )
+    
+    @hybrid_property
+    def average_rating(self):
+        if self.review_count == 0:
+            return None
+        return round(self.rating_sum / self.review_count, 2)
+
 # ==============================================
 # MODELOS DE WISHLIST
 # ==============================================
@@ -322,6 +347,23 @@ class TaxRate(Base, TimestampMixin):
         CheckConstraint('rate >= 0 AND rate <= 1', name='ck_tax_rate_valid'),
     )
 
+class IdempotencyKey(Base, TimestampMixin):
+    """Respuestas guardadas por Idempotency-Key (respaldo SQL cuando Redis no está disponible)"""
+    __tablename__ = 'idempotency_keys'
+    
+    key = Column(String(64), primary_key=True)  # sha256 de usuario + método + ruta + header
+    fingerprint = Column(String(64), nullable=False)  # sha256 del cuerpo de la request
+    status_code = Column(Integer, nullable=True)  # NULL mientras la request está en curso
+    response_body = Column(Text(length=16777215), nullable=True)
+    content_type = Column(String(100), nullable=True)
+    locked_until = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    
+    # Índices
+    __table_args__ = (
+        Index('idx_idempotency_keys_expires', 'expires_at'),
+    )
+
 # ==============================================
 # MODELOS DE NOTIFICACIONES
 # ==============================================
@@ -76,3 +76,28 @@ INSERT IGNORE INTO store_config (`key`, value) VALUES
 ('newsletter_enabled', 'true'),
 ('reviews_enabled', 'true');
 
+-- Rollups de ventas del dashboard (mantenidos por sales_rollup.py)
+CREATE TABLE IF NOT EXISTS daily_sales_rollup (
+    sales_date DATE PRIMARY KEY,
+    order_count INT NOT NULL DEFAULT 0,
+    cancelled_count INT NOT NULL DEFAULT 0,
+    gross_sales DECIMAL(14,2) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS product_sales_rollup (
+    product_id INT PRIMARY KEY,
+    units_sold INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_product_sales_units (units_sold)
+);
+
+-- Última orden incorporada a los rollups
+CREATE TABLE IF NOT EXISTS sales_rollup_state (
+    id TINYINT PRIMARY KEY,
+    last_order_id INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+INSERT IGNORE INTO sales_rollup_state (id, last_order_id) VALUES (1, 0);
@@ -20,6 +20,19 @@ from controllers.orders_controller import orders_bp
 # Importar configuración
 from config.settings import get_config
 
+# Importar middleware
+from middleware.compression import CompressionMiddleware
+from middleware.sql_instrumentation import init_sql_instrumentation
+from utils.json_provider import FastJSONProvider
+
+# Importar servicios
+from services.system_status_service import system_status_service
+from services.search_sync_service import search_sync_service
+from services.local_search_index import local_search_index
+from services.autocomplete_service import autocomplete_service
+from services.auth_service import decode_token
+from config.database import set_routing_key, db_manager
+
 def create_app(config_name='development'):
     """Factory para crear la aplicación Flask"""
     
@@ -29,6 +42,13 @@ def create_app(config_name='development'):
     config = get_config(config_name)
     app.config.update(config)
     
+    # Conteo de SQL por request, detección de N+1 y header Server-Timing
+    # (se registra primero para medir también el resto de los hooks)
+    init_sql_instrumentation(app)
+    
+    # Codificación JSON de respuestas (Decimal, datetime y Enum nativos; orjson si está instalado)
+    app.json = FastJSONProvider(app)
+    
     # Configurar CORS para permitir requests desde el frontend
     CORS(app, origins=['http://localhost:3000', 'http://localhost:5173', '*'])
     
@@ -99,6 +119,49 @@ def create_app(config_name='development'):
     app.register_blueprint(products_bp)
     app.register_blueprint(orders_bp)
     
+    # Intervalos del health probe y del rollup de estadísticas
+    system_status_service.configure(app.config)
+    
+    # Indexador incremental del índice de búsqueda (un hilo por worker, arrancado tras el fork)
+    if app.config.get('SEARCH_SYNC_ENABLED', True):
+        search_sync_service.configure(app.config)
+        
+        @app.before_request
+        def start_search_sync():
+            search_sync_service.start()
+    
+    # Índice de búsqueda embebido: respaldo de Elasticsearch y búsqueda de /api/v1/products/search
+    if app.config.get('LOCAL_SEARCH_ENABLED', True):
+        local_search_index.configure(app.config)
+        
+        @app.before_request
+        def start_local_search_index():
+            local_search_index.start()
+    
+    # Tries de autocompletado en memoria (las filas se consultan una vez por intervalo para todos los workers)
+    if app.config.get('AUTOCOMPLETE_ENABLED', True):
+        autocomplete_service.configure(app.config)
+        
+        @app.before_request
+        def start_autocomplete_service():
+            autocomplete_service.start()
+    
+    # Compresión gzip/brotli de las respuestas a nivel WSGI
+    app.wsgi_app = CompressionMiddleware(app.wsgi_app, app.config)
+    
+    # Identidad para read-your-writes: tras escribir, las lecturas del usuario van al primario
+    @app.before_request
+    def set_db_routing_key():
+        """Asocia las sesiones del request al usuario del token (si lo hay)"""
+        user_id = None
+        auth_header = request.headers.get('Authorization', '')
+        if auth_header.startswith('Bearer '):
+            try:
+                user_id = decode_token(auth_header[7:]).get('user_id')
+            except Exception:
+                pass
+        set_routing_key(user_id)
+    
     # Middleware para logging de requests
     @app.before_request
     def log_request_info():
@@ -168,22 +231,15 @@ def create_app(config_name='development'):
                 database:
                   type: string
         """
-        # Verificar conexión a base de datos
-        try:
-            from config.database import get_database_url
-            from sqlalchemy import create_engine, text
-            
-            engine = create_engine(get_database_url())
-            with engine.connect() as conn:
-                conn.execute(text("SELECT 1"))
-            db_status = "connected"
-        except Exception as e:
-            db_status = f"error: {str(e)}"
+        # Resultado cacheado del probe (lo refresca un hilo en segundo plano)
+        probe = system_status_service.get_health()
         
         return jsonify({
             'status': 'healthy',
             'timestamp': datetime.now().isoformat(),
-            'database': db_status,
+            'database': probe['database'],
+            'redis': probe['redis'],
+            'checked_at': probe['checked_at'],
             'version': '1.0.0'
         })
     
@@ -199,46 +255,14 @@ def create_app(config_name='development'):
             description: Estadísticas de la API
         """
         try:
-            from config.database import get_database_url
-            from sqlalchemy import create_engine, text
-            from sqlalchemy.orm import sessionmaker
-            
-            engine = create_engine(get_database_url())
-            Session = sessionmaker(bind=engine)
-            session = Session()
-            
-            # Obtener estadísticas básicas
-            stats = {}
-            
-            try:
-                # Contar productos activos
-                result = session.execute(text("SELECT COUNT(*) FROM products WHERE is_active = true"))
-                stats['active_products'] = result.scalar()
-            except:
-                stats['active_products'] = 0
-            
-            try:
-                # Contar usuarios
-                result = session.execute(text("SELECT COUNT(*) FROM users WHERE is_active = true"))
-                stats['active_users'] = result.scalar()
-            except:
-                stats['active_users'] = 0
-            
-            try:
-                # Contar pedidos del último mes
-                result = session.execute(text("""
-                    SELECT COUNT(*) FROM orders 
-                    WHERE created_at >= DATE_SUB(NOW(), INTERVAL 30 DAY)
-                """))
-                stats['orders_last_30_days'] = result.scalar()
-            except:
-                stats['orders_last_30_days'] = 0
-            
-            session.close()
+            # Rollup cacheado (no se ejecutan conteos por request)
+            rollup = system_status_service.get_stats()
+            stats = {key: value for key, value in rollup.items() if key != 'computed_at'}
             
             return jsonify({
                 'success': True,
                 'stats': stats,
+                'computed_at': rollup['computed_at'],
                 'timestamp': datetime.now().isoformat()
             })
             
@@ -249,6 +273,24 @@ def create_app(config_name='development'):
                 'timestamp': datetime.now().isoformat()
             }), 500
     
+    @app.route('/api/v1/metrics/pool')
+    def pool_metrics():
+        """
+        Métricas de los pools de conexiones del proceso
+        ---
+        tags:
+          - System
+        responses:
+          200:
+            description: Ocupación, overflow, histograma de espera de checkout y timeouts por pool
+        """
+        return jsonify({
+            'success': True,
+            'pid': os.getpid(),
+            'pools': db_manager.pool_status(),
+            'timestamp': datetime.now().isoformat()
+        })
+    
     # Manejadores de errores globales
     @app.errorhandler(404)
     def not_found(error):
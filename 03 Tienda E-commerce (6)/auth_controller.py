@@ -7,6 +7,7 @@ from marshmallow import Schema, fields, ValidationError, validate
 import jwt
 
 from services.auth_service import AuthService, token_required, rate_limit
+from services.password_hasher import HasherSaturatedError
 
 # Crear blueprint para autenticación
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/v1/auth')
@@ -115,6 +116,10 @@ def login():
             'error': str(e)
         }), 401
         
+    except HasherSaturatedError:
+        # Respuesta 503 del manejador del blueprint
+        raise
+        
     except Exception as e:
         return jsonify({
             'success': False,
@@ -189,6 +194,10 @@ def register():
             'error': str(e)
         }), 409
         
+    except HasherSaturatedError:
+        # Respuesta 503 del manejador del blueprint
+        raise
+        
     except Exception as e:
         return jsonify({
             'success': False,
@@ -353,6 +362,10 @@ def change_password():
             'error': str(e)
         }), 401
         
+    except HasherSaturatedError:
+        # Respuesta 503 del manejador del blueprint
+        raise
+        
     except Exception as e:
         return jsonify({
             'success': False,
@@ -463,6 +476,10 @@ def reset_password():
             'error': str(e)
         }), 400
         
+    except HasherSaturatedError:
+        # Respuesta 503 del manejador del blueprint
+        raise
+        
     except Exception as e:
         return jsonify({
             'success': False,
@@ -516,7 +533,7 @@ def verify_email(user_id, token):
 @token_required
 def logout():
     """
-    Cerrar sesión (invalidar token)
+    Cerrar sesión (invalidar los tokens de esta sesión; las de otros dispositivos siguen activas)
     ---
     tags:
       - Authentication
@@ -526,14 +543,65 @@ def logout():
       200:
         description: Sesión cerrada exitosamente
     """
-    # En una implementación completa, aquí se agregaría el token a una blacklist
-    # Por simplicidad, solo retornamos éxito
-    return jsonify({
-        'success': True,
-        'message': 'Logged out successfully'
-    }), 200
+    try:
+        auth_service = AuthService()
+        # Sin Redis, o con un token anterior a las sesiones, no se puede revocar
+        # solo este token: se cierran todas las sesiones del usuario
+        if not auth_service.revoke_session(request.token_payload):
+            auth_service.revoke_tokens(request.current_user.id)
+        
+        return jsonify({
+            'success': True,
+            'message': 'Logged out successfully'
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': 'Internal server error'
+        }), 500
+
+@auth_bp.route('/logout-all', methods=['POST'])
+@token_required
+def logout_all():
+    """
+    Cerrar sesión en todos los dispositivos
+    ---
+    tags:
+      - Authentication
+    security:
+      - Bearer: []
+    responses:
+      200:
+        description: Sesiones cerradas exitosamente
+    """
+    try:
+        # Incrementar token_version revoca los tokens emitidos e invalida el principal en cache
+        auth_service = AuthService()
+        auth_service.revoke_tokens(request.current_user.id)
+        
+        return jsonify({
+            'success': True,
+            'message': 'Logged out from all devices'
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': 'Internal server error'
+        }), 500
 
 # Manejadores de errores específicos para el blueprint
+@auth_bp.errorhandler(HasherSaturatedError)
+def hasher_saturated(error):
+    response = jsonify({
+        'success': False,
+        'error': 'Service busy, please retry later'
+    })
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
 @auth_bp.errorhandler(400)
 def bad_request(error):
     return jsonify({
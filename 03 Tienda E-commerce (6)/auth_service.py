@@ -4,10 +4,11 @@ Implementa autenticación segura con tokens JWT y refresh tokens
 """
 import os
 import jwt
-import bcrypt
+import uuid
+import logging
 from datetime import datetime, timedelta, timezone
 from functools import wraps
-from flask import request, jsonify, current_app
+from flask import request, jsonify, current_app, make_response
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import create_engine
 
@@ -15,7 +16,48 @@ from sqlalchemy import create_engine
 import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from models.catalog import User, Role, UserRole
-from config.database import get_database_url
+from config.database import get_database_url, get_redis
+from services.principal_cache import get_principal, EMBED_ROLE_CLAIMS
+from services.password_hasher import password_hasher, HasherSaturatedError
+from services.rate_limiter import RateLimiter, SLIDING_WINDOW
+
+# Configuración JWT (compartida por AuthService y token_required)
+JWT_SECRET = os.getenv('JWT_SECRET_KEY', 'your-super-secret-jwt-key-change-in-production')
+JWT_ALGORITHM = 'HS256'
+
+logger = logging.getLogger(__name__)
+
+# Sesiones cerradas con logout (claim sid compartido por el access y el refresh token de un login)
+REVOKED_SESSION_KEY = 'auth:revoked_session:{}'
+
+def is_session_revoked(session_id) -> bool:
+    """True si la sesión del token se cerró con logout (sin Redis no hay lista y se acepta)"""
+    if not session_id:
+        return False
+    redis_client = get_redis()
+    if not redis_client:
+        return False
+    try:
+        return bool(redis_client.exists(REVOKED_SESSION_KEY.format(session_id)))
+    except Exception as e:
+        logger.warning(f"Error consultando sesiones revocadas: {e}")
+        return False
+
+def decode_token(token: str, token_type: str = 'access') -> dict:
+    """Verifica y decodifica un JWT token"""
+    try:
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        
+        # Verificar tipo de token
+        if payload.get('type') != token_type:
+            raise jwt.InvalidTokenError(f"Invalid token type. Expected {token_type}")
+        
+        return payload
+        
+    except jwt.ExpiredSignatureError:
+        raise jwt.InvalidTokenError("Token has expired")
+    except jwt.InvalidTokenError as e:
+        raise jwt.InvalidTokenError(f"Invalid token: {str(e)}")
 
 class AuthService:
     """Servicio de autenticación JWT"""
@@ -27,36 +69,44 @@ class AuthService:
         self.session = Session()
         
         # Configuración JWT
-        self.jwt_secret = os.getenv('JWT_SECRET_KEY', 'your-super-secret-jwt-key-change-in-production')
-        self.jwt_algorithm = 'HS256'
+        self.jwt_secret = JWT_SECRET
+        self.jwt_algorithm = JWT_ALGORITHM
         self.access_token_expires = timedelta(hours=1)
         self.refresh_token_expires = timedelta(days=30)
     
     def hash_password(self, password: str) -> str:
-        """Hashea una contraseña usando bcrypt"""
-        salt = bcrypt.gensalt()
-        hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-        return hashed.decode('utf-8')
+        """Hashea una contraseña usando bcrypt (en el pool acotado del hasher)"""
+        return password_hasher.hash(password)
     
     def verify_password(self, password: str, hashed: str) -> bool:
         """Verifica una contraseña contra su hash"""
-        return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+        return password_hasher.verify(password, hashed)
     
-    def generate_tokens(self, user_id: int) -> dict:
-        """Genera access token y refresh token para un usuario"""
+    def generate_tokens(self, user_id: int, token_version: int = 0, roles: list = None,
+                        session_id: str = None) -> dict:
+        """Genera access token y refresh token para un usuario (session_id: sesión que se renueva)"""
         now = datetime.now(timezone.utc)
+        session_id = session_id or uuid.uuid4().hex
         
-        # Access token payload
+        # Access token payload (tv: token_version del usuario al emitir el token; sid: sesión del login)
         access_payload = {
             'user_id': user_id,
+            'tv': token_version,
+            'sid': session_id,
             'type': 'access',
             'iat': now,
             'exp': now + self.access_token_expires
         }
         
+        # Roles firmados: evitan consultar roles cuando el principal no está en cache
+        if EMBED_ROLE_CLAIMS and roles is not None:
+            access_payload['roles'] = roles
+        
         # Refresh token payload
         refresh_payload = {
             'user_id': user_id,
+            'tv': token_version,
+            'sid': session_id,
             'type': 'refresh',
             'iat': now,
             'exp': now + self.refresh_token_expires
@@ -75,19 +125,7 @@ class AuthService:
     
     def verify_token(self, token: str, token_type: str = 'access') -> dict:
         """Verifica y decodifica un JWT token"""
-        try:
-            payload = jwt.decode(token, self.jwt_secret, algorithms=[self.jwt_algorithm])
-            
-            # Verificar tipo de token
-            if payload.get('type') != token_type:
-                raise jwt.InvalidTokenError(f"Invalid token type. Expected {token_type}")
-            
-            return payload
-            
-        except jwt.ExpiredSignatureError:
-            raise jwt.InvalidTokenError("Token has expired")
-        except jwt.InvalidTokenError as e:
-            raise jwt.InvalidTokenError(f"Invalid token: {str(e)}")
+        return decode_token(token, token_type)
     
     def get_user_by_id(self, user_id: int) -> User:
         """Obtiene un usuario por ID"""
@@ -119,16 +157,24 @@ class AuthService:
         if not self.verify_password(password, user.password_hash):
             raise ValueError("Invalid email or password")
         
+        # Rehash transparente si el costo configurado cambió desde que se guardó el hash
+        if password_hasher.needs_rehash(user.password_hash):
+            try:
+                user.password_hash = self.hash_password(password)
+            except HasherSaturatedError:
+                # El login ya es válido; el rehash queda para un próximo inicio de sesión
+                pass
+        
         # Actualizar último login
         user.last_login_at = datetime.now(timezone.utc)
         self.session.commit()
         
-        # Generar tokens
-        tokens = self.generate_tokens(user.id)
-        
         # Obtener roles
         roles = self.get_user_roles(user.id)
         
+        # Generar tokens
+        tokens = self.generate_tokens(user.id, user.token_version or 0, roles)
+        
         return {
             'user': {
                 'id': user.id,
@@ -152,8 +198,13 @@ class AuthService:
             if not user:
                 raise ValueError("User not found or inactive")
             
-            # Generar nuevo access token
-            tokens = self.generate_tokens(user_id)
+            # Tokens emitidos antes de un logout o cambio de contraseña quedan revocados
+            if payload.get('tv', 0) != (user.token_version or 0) or is_session_revoked(payload.get('sid')):
+                raise ValueError("Invalid refresh token: Token has been revoked")
+            
+            # Generar nuevo access token (misma sesión)
+            roles = self.get_user_roles(user_id) if EMBED_ROLE_CLAIMS else None
+            tokens = self.generate_tokens(user_id, user.token_version or 0, roles, payload.get('sid'))
             
             return tokens
             
@@ -221,13 +272,42 @@ class AuthService:
         if not self.verify_password(current_password, user.password_hash):
             raise ValueError("Current password is incorrect")
         
-        # Actualizar contraseña
+        # Actualizar contraseña y revocar los tokens emitidos
         user.password_hash = self.hash_password(new_password)
         user.password_changed_at = datetime.now(timezone.utc)
+        user.token_version = (user.token_version or 0) + 1
         self.session.commit()
         
         return True
     
+    def revoke_session(self, payload: dict) -> bool:
+        """
+        Cierra solo la sesión del token (logout en este dispositivo). La marca
+        dura lo que el refresh token más nuevo de la sesión. False si el token
+        no tiene sid (emitido antes de las sesiones) o Redis no está disponible.
+        """
+        session_id = payload.get('sid')
+        redis_client = get_redis()
+        if not session_id or not redis_client:
+            return False
+        try:
+            redis_client.setex(REVOKED_SESSION_KEY.format(session_id),
+                               int(self.refresh_token_expires.total_seconds()), 1)
+            return True
+        except Exception as e:
+            logger.warning(f"Error revocando sesión: {e}")
+            return False
+    
+    def revoke_tokens(self, user_id: int) -> bool:
+        """Revoca todos los tokens del usuario (logout en todos los dispositivos)"""
+        user = self.get_user_by_id(user_id)
+        if not user:
+            return False
+        
+        user.token_version = (user.token_version or 0) + 1
+        self.session.commit()
+        return True
+    
     def reset_password_request(self, email: str) -> bool:
         """Solicita reset de contraseña (simplificado para demo)"""
         user = self.get_user_by_email(email)
@@ -257,6 +337,7 @@ class AuthService:
             # Actualizar contraseña
             user.password_hash = self.hash_password(new_password)
             user.password_changed_at = datetime.now(timezone.utc)
+            user.token_version = (user.token_version or 0) + 1
             user.password_reset_token = None
             user.password_reset_requested_at = None
             self.session.commit()
@@ -284,16 +365,22 @@ def token_required(f):
             return jsonify({'error': 'Token is missing'}), 401
         
         try:
-            auth_service = AuthService()
-            payload = auth_service.verify_token(token)
-            current_user = auth_service.get_user_by_id(payload['user_id'])
+            payload = decode_token(token)
+            token_version = payload.get('tv', 0)
+            
+            # Principal desde cache (proceso/Redis); la base de datos solo en un fallo
+            current_user = get_principal(payload['user_id'], token_version, payload.get('roles'))
             
             if not current_user:
                 return jsonify({'error': 'User not found'}), 401
             
+            if current_user.token_version != token_version or is_session_revoked(payload.get('sid')):
+                return jsonify({'error': 'Token has been revoked'}), 401
+            
             # Agregar usuario actual al contexto
             request.current_user = current_user
-            request.current_user_roles = auth_service.get_user_roles(current_user.id)
+            request.token_payload = payload
+            request.current_user_roles = current_user.roles
             
         except jwt.InvalidTokenError as e:
             return jsonify({'error': str(e)}), 401
@@ -332,39 +419,16 @@ def manager_required(f):
     """Decorador que requiere rol de manager o admin"""
     return role_required('admin', 'manager')(f)
 
-# Middleware de rate limiting (simplificado)
-class RateLimiter:
-    """Rate limiter básico en memoria"""
-    
-    def __init__(self):
-        self.requests = {}
-    
-    def is_allowed(self, key: str, limit: int, window: int) -> bool:
-        """Verifica si una request está permitida"""
-        now = datetime.now()
-        
-        if key not in self.requests:
-            self.requests[key] = []
-        
-        # Limpiar requests antiguas
-        self.requests[key] = [
-            req_time for req_time in self.requests[key]
-            if (now - req_time).seconds < window
-        ]
-        
-        # Verificar límite
-        if len(self.requests[key]) >= limit:
-            return False
-        
-        # Agregar request actual
-        self.requests[key].append(now)
-        return True
-
 # Instancia global del rate limiter
 rate_limiter = RateLimiter()
 
-def rate_limit(limit: int = 100, window: int = 3600, per: str = 'ip'):
-    """Decorador de rate limiting"""
+def rate_limit(limit: int = 100, window: int = 3600, per: str = 'ip', algorithm: str = SLIDING_WINDOW):
+    """
+    Decorador de rate limiting.
+    La clave combina endpoint + IP/usuario, así cada endpoint tiene su propio
+    cupo. algorithm: 'sliding_window' (límite estricto) o 'token_bucket'
+    (permite ráfagas de hasta `limit` y recarga continua).
+    """
     def decorator(f):
         @wraps(f)
         def decorated(*args, **kwargs):
@@ -375,15 +439,21 @@ def rate_limit(limit: int = 100, window: int = 3600, per: str = 'ip'):
             else:
                 key = request.remote_addr
             
-            if not rate_limiter.is_allowed(key, limit, window):
-                return jsonify({
+            result = rate_limiter.hit(f"{request.endpoint}:{key}", limit, window, algorithm)
+            
+            if not result.allowed:
+                response = jsonify({
                     'error': 'Rate limit exceeded',
                     'limit': limit,
-                    'window': window
-                }), 429
+                    'window': window,
+                    'retry_after': result.retry_after
+                })
+                response.status_code = 429
+            else:
+                response = make_response(f(*args, **kwargs))
             
-            return f(*args, **kwargs)
+            response.headers.update(result.headers())
+            return response
         
         return decorated
     return decorator
-
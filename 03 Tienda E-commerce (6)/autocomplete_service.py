@@ -0,0 +1,335 @@
+"""
+Servicio de autocompletado para eCommerce Modular
+Tries radix en memoria sobre nombres, SKUs y búsquedas populares, ponderados por vistas y clics
+"""
+import os
+import re
+import sys
+import json
+import math
+import time
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select, desc, asc
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from models.catalog import Product, ProductImage
+from models.additional import ProductView, SearchQuery
+from config.database import get_db_session, get_redis
+from services.local_search_index import fold
+
+logger = logging.getLogger(__name__)
+
+_WORD_PATTERN = re.compile(r'\w+')
+
+# Sugerencias precalculadas por nodo (el endpoint admite hasta 20)
+TOP_K = 20
+
+# Filas ponderadas compartidas por todos los workers: uno consulta SQL y los demás arman sus tries desde Redis
+SNAPSHOT_KEY = 'autocomplete:snapshot'
+BUILD_LOCK_KEY = 'autocomplete:build_lock'
+
+def normalize(text: str) -> str:
+    """Clave de búsqueda: minúsculas, sin tildes ni puntuación y con espacios simples"""
+    return ' '.join(_WORD_PATTERN.findall(fold(text or '')))
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+class _Node:
+    __slots__ = ('children', 'entries', 'top')
+
+    def __init__(self):
+        self.children: Dict[str, Tuple[str, '_Node']] = {}   # primer carácter -> (etiqueta, nodo)
+        self.entries = []   # (peso, sugerencia) que terminan en este nodo; se libera tras build
+        self.top: Tuple[dict, ...] = ()
+
+class PrefixTrie:
+    """
+    Trie radix (aristas con etiquetas de varios caracteres) cuyos nodos
+    guardan las TOP_K sugerencias de mayor peso bajo su prefijo: una consulta
+    recorre a lo sumo len(prefijo) caracteres y devuelve una lista ya armada.
+    """
+
+    def __init__(self):
+        self.root = _Node()
+        self.keys = 0
+
+    def insert(self, key: str, weight: float, suggestion: dict):
+        if not key:
+            return
+        self.keys += 1
+        node, rest = self.root, key
+        while rest:
+            edge = node.children.get(rest[0])
+            if edge is None:
+                leaf = _Node()
+                node.children[rest[0]] = (rest, leaf)
+                node = leaf
+                break
+            label, child = edge
+            common = os.path.commonprefix((label, rest))
+            if common == label:
+                node, rest = child, rest[len(common):]
+                continue
+            # Dividir la arista en el prefijo común
+            middle = _Node()
+            middle.children[label[len(common)]] = (label[len(common):], child)
+            node.children[rest[0]] = (common, middle)
+            node, rest = middle, rest[len(common):]
+        node.entries.append((weight, suggestion))
+
+    def build(self):
+        """Calcula las mejores sugerencias de cada nodo (de las hojas hacia la raíz)"""
+        self._collect(self.root)
+
+    def _collect(self, node: _Node) -> List[Tuple[float, dict]]:
+        candidates = list(node.entries)
+        for _, child in node.children.values():
+            candidates.extend(self._collect(child))
+        candidates.sort(key=lambda candidate: -candidate[0])
+
+        best, seen = [], set()
+        for weight, suggestion in candidates:
+            # Una sugerencia puede llegar por varias claves (p. ej. cada palabra del nombre)
+            if id(suggestion) in seen:
+                continue
+            seen.add(id(suggestion))
+            best.append((weight, suggestion))
+            if len(best) >= TOP_K:
+                break
+        node.top = tuple(suggestion for _, suggestion in best)
+        node.entries = None
+        return best
+
+    def lookup(self, prefix: str) -> Tuple[dict, ...]:
+        node, rest = self.root, prefix
+        while rest:
+            edge = node.children.get(rest[0])
+            if edge is None:
+                return ()
+            label, child = edge
+            if rest.startswith(label):
+                node, rest = child, rest[len(label):]
+            elif label.startswith(rest):
+                return child.top
+            else:
+                return ()
+        return node.top
+
+class AutocompleteService:
+    """
+    Dos tries en memoria por proceso: productos (por cada palabra del nombre
+    y por SKU, ponderados por vistas y clics desde búsquedas) y búsquedas
+    populares de SearchQuery (ponderadas por frecuencia y clics). Se
+    reconstruyen cada `refresh_interval` segundos en un hilo y se
+    intercambian completos; mientras no hay tries, suggest() retorna None y
+    el llamador consulta Elasticsearch. Con Redis, un solo worker por
+    intervalo ejecuta las consultas y publica las filas en SNAPSHOT_KEY; los
+    demás arman sus tries desde ese snapshot.
+    """
+
+    def __init__(self, refresh_interval: float = 300.0, views_days: int = 30, queries_days: int = 90,
+                 min_query_count: int = 2, max_queries: int = 5000):
+        self.refresh_interval = refresh_interval
+        self.views_days = views_days
+        self.queries_days = queries_days
+        self.min_query_count = min_query_count
+        self.max_queries = max_queries
+        self._tries: Optional[Tuple[PrefixTrie, PrefixTrie]] = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.last_build = None
+
+    def configure(self, config):
+        """Toma la configuración de Flask (AUTOCOMPLETE_REFRESH_INTERVAL)"""
+        self.refresh_interval = float(config.get('AUTOCOMPLETE_REFRESH_INTERVAL', self.refresh_interval))
+
+    @property
+    def ready(self) -> bool:
+        return self._tries is not None
+
+    def version(self) -> str:
+        """Momento de los datos de los tries (para el ETag); vacío mientras responde Elasticsearch"""
+        last_build = self.last_build
+        return last_build["built_at"] if self._tries is not None and last_build else ''
+
+    # Construcción
+
+    def _product_rows(self, session):
+        since = _utcnow() - timedelta(days=self.views_days)
+        views = session.query(ProductView.product_id, func.count().label('views')) \
+            .filter(ProductView.created_at >= since) \
+            .group_by(ProductView.product_id).subquery()
+
+        clicks_since = _utcnow() - timedelta(days=self.queries_days)
+        clicks = session.query(SearchQuery.clicked_product_id.label('product_id'), func.count().label('clicks')) \
+            .filter(SearchQuery.clicked_product_id.isnot(None), SearchQuery.created_at >= clicks_since) \
+            .group_by(SearchQuery.clicked_product_id).subquery()
+
+        image_url = (
+            select(ProductImage.image_url)
+            .where(ProductImage.product_id == Product.id)
+            .order_by(desc(ProductImage.is_primary), asc(ProductImage.sort_order), asc(ProductImage.id))
+            .limit(1)
+            .correlate(Product)
+            .scalar_subquery()
+        )
+
+        return session.query(
+            Product.id, Product.name, Product.sku, Product.price, image_url.label('image_url'),
+            func.coalesce(views.c.views, 0).label('views'), func.coalesce(clicks.c.clicks, 0).label('clicks')
+        ).outerjoin(views, views.c.product_id == Product.id) \
+         .outerjoin(clicks, clicks.c.product_id == Product.id) \
+         .filter(Product.is_active == True, Product.deleted_at.is_(None)) \
+         .yield_per(1000)
+
+    def _query_rows(self, session):
+        since = _utcnow() - timedelta(days=self.queries_days)
+        searches = func.count(SearchQuery.id)
+        return session.query(
+            func.min(SearchQuery.query).label('query'),
+            searches.label('searches'),
+            func.count(SearchQuery.clicked_product_id).label('clicks')
+        ).filter(SearchQuery.created_at >= since, SearchQuery.results_count > 0) \
+         .group_by(func.lower(func.trim(SearchQuery.query))) \
+         .having(searches >= self.min_query_count) \
+         .order_by(searches.desc()) \
+         .limit(self.max_queries)
+
+    def _load_rows(self) -> Dict[str, Any]:
+        """Consulta las filas ponderadas de productos y búsquedas populares"""
+        with get_db_session(readonly=True) as session:
+            products = [
+                [row.id, row.name, row.sku or '', float(row.price) if row.price is not None else 0,
+                 row.image_url or '', row.views, row.clicks]
+                for row in self._product_rows(session)
+            ]
+            queries = [[row.query, row.searches, row.clicks] for row in self._query_rows(session)]
+        return {"built_at": _utcnow().isoformat(), "products": products, "queries": queries}
+
+    def _shared_rows(self) -> Dict[str, Any]:
+        """
+        Snapshot de filas vigente en Redis; si venció, el worker que toma el lock
+        lo regenera y los demás siguen usando el anterior mientras exista.
+        """
+        try:
+            redis_client = get_redis()
+        except Exception as e:
+            logger.warning(f"Error obteniendo cliente de Redis para autocompletado: {e}")
+            redis_client = None
+        if not redis_client:
+            return self._load_rows()
+
+        snapshot = None
+        try:
+            raw = redis_client.get(SNAPSHOT_KEY)
+            snapshot = json.loads(raw) if raw else None
+            if snapshot is not None:
+                age = (_utcnow() - datetime.fromisoformat(snapshot['built_at'])).total_seconds()
+                if age < self.refresh_interval:
+                    return snapshot
+            if not redis_client.set(BUILD_LOCK_KEY, os.getpid(), nx=True, ex=max(1, int(self.refresh_interval))):
+                if snapshot is not None:
+                    return snapshot
+        except Exception as e:
+            logger.warning(f"Error leyendo snapshot de autocompletado: {e}")
+
+        rows = self._load_rows()
+        try:
+            redis_client.set(SNAPSHOT_KEY, json.dumps(rows, separators=(',', ':')),
+                             ex=max(1, int(self.refresh_interval * 3)))
+        except Exception as e:
+            logger.warning(f"Error guardando snapshot de autocompletado: {e}")
+        return rows
+
+    def build(self) -> Dict[str, Any]:
+        """Arma tries nuevos y los intercambia de forma atómica"""
+        started = time.time()
+        rows = self._shared_rows()
+        if self._tries is not None and self.last_build and self.last_build["built_at"] == rows["built_at"]:
+            return self.last_build
+        products, queries = PrefixTrie(), PrefixTrie()
+
+        for product_id, name, sku, price, image_url, views, clicks in rows["products"]:
+            suggestion = {
+                "type": "product",
+                "id": product_id,
+                "name": name,
+                "sku": sku,
+                "price": price,
+                "image_url": image_url
+            }
+            weight = 1 + math.log1p(views) + 2 * math.log1p(clicks)
+            words = normalize(name).split()
+            # Cada palabra del nombre inicia una clave: "roja" sugiere "Camiseta roja"
+            for position in range(len(words)):
+                products.insert(' '.join(words[position:]), weight, suggestion)
+            products.insert(normalize(sku), weight, suggestion)
+
+        for query, searches, clicks in rows["queries"]:
+            text = ' '.join(query.split())
+            weight = math.log1p(searches) + 2 * math.log1p(clicks)
+            queries.insert(normalize(text), weight, {"type": "query", "query": text})
+
+        products.build()
+        queries.build()
+        with self._lock:
+            self._tries = (products, queries)
+
+        self.last_build = {
+            "product_keys": products.keys,
+            "query_keys": queries.keys,
+            "duration_seconds": round(time.time() - started, 3),
+            # Momento de la consulta SQL (el mismo en todos los workers que usan el snapshot)
+            "built_at": rows["built_at"]
+        }
+        logger.info(f"Tries de autocompletado reconstruidos: {self.last_build}")
+        return self.last_build
+
+    # Consulta
+
+    def suggest(self, query: str, limit: int = 10) -> Optional[List[dict]]:
+        """
+        Búsquedas populares primero (hasta un cuarto del límite) y luego
+        productos. None si los tries aún no están construidos.
+        """
+        self.start()
+        tries = self._tries
+        if tries is None:
+            return None
+
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        products, queries = tries
+        popular = list(queries.lookup(prefix)[:max(1, limit // 4)])
+        return popular + list(products.lookup(prefix)[:limit - len(popular)])
+
+    # Reconstrucción en segundo plano
+
+    def start(self):
+        """Arranca el hilo de reconstrucción una vez por proceso (también después de un fork)"""
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='autocomplete', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.build()
+            except Exception as e:
+                logger.warning(f"Error reconstruyendo tries de autocompletado: {e}")
+            time.sleep(self.refresh_interval)
+
+# Instancia global del servicio de autocompletado
+autocomplete_service = AutocompleteService()
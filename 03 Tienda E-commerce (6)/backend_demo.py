@@ -5,11 +5,11 @@ Backend API simplificado para demostración del eCommerce
 
 from flask import Flask, jsonify, request, session
 from flask_cors import CORS
-import mysql.connector
 import hashlib
 import jwt
 import datetime
 import os
+from mysql_pool import MySQLPool
 
 app = Flask(__name__)
 app.secret_key = 'dev_secret_key_2024'
@@ -24,8 +24,12 @@ DB_CONFIG = {
     'database': 'ecommerce_dev'
 }
 
+# Pool compartido: conn.close() devuelve la conexión; las que un handler no cierra se devuelven al final del request
+db_pool = MySQLPool(DB_CONFIG, pool_name='ecommerce_demo')
+db_pool.init_app(app)
+
 def get_db_connection():
-    return mysql.connector.connect(**DB_CONFIG)
+    return db_pool.get_connection()
 
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
@@ -46,6 +46,7 @@ class User(Base, TimestampMixin, SoftDeleteMixin):
     is_active = Column(Boolean, default=True, nullable=False)
     is_verified = Column(Boolean, default=False, nullable=False)
     last_login_at = Column(DateTime, nullable=True)
+    token_version = Column(Integer, default=0, nullable=False)  # Incrementar revoca todos los tokens emitidos
     
     # Relaciones
     addresses = relationship("Address", back_populates="user", cascade="all, delete-orphan")
@@ -243,6 +244,7 @@ class Product(Base, TimestampMixin, SoftDeleteMixin):
     variants = relationship("ProductVariant", back_populates="product", cascade="all, delete-orphan")
     attributes = relationship("ProductAttribute", back_populates="product", cascade="all, delete-orphan")
     reviews = relationship("Review", back_populates="product")
+    review_stats = relationship("ProductReviewStats", back_populates="product", uselist=False)
     order_items = relationship("OrderItem", back_populates="product")
     wishlist_items = relationship("WishlistItem", back_populates="product")
     
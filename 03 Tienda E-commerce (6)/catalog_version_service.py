@@ -0,0 +1,105 @@
+"""
+Versión del catálogo para eCommerce Modular
+Contador global que cambia con cada escritura de productos, categorías o marcas
+"""
+import os
+import sys
+import time
+import logging
+import threading
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from models.catalog import (
+    Category, Brand, Product, ProductImage, ProductAttribute, ProductVariant, VariantAttribute
+)
+from models.additional import Review
+from config.database import get_redis
+
+logger = logging.getLogger(__name__)
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+# Modelos cuyas escrituras cambian alguna respuesta del catálogo
+CATALOG_MODELS = (
+    Category, Brand, Product, ProductImage, ProductAttribute, ProductVariant, VariantAttribute, Review
+)
+
+# Un incremento que falló porque Redis no respondía: hasta aplicarlo, este
+# proceso no ofrece versión (si no, tras reconectar serviría la anterior)
+_pending_bump = False
+_pending_lock = threading.Lock()
+
+def _incr_version(redis_client):
+    # Misma semilla que get_catalog_version si la clave no existe
+    pipe = redis_client.pipeline()
+    pipe.set(CATALOG_VERSION_KEY, int(time.time() * 1000), nx=True)
+    pipe.incr(CATALOG_VERSION_KEY)
+    pipe.execute()
+
+def _apply_pending_bump(redis_client) -> bool:
+    """Aplica un incremento pendiente; False si Redis sigue fallando"""
+    global _pending_bump
+    with _pending_lock:
+        if not _pending_bump:
+            return True
+        try:
+            _incr_version(redis_client)
+        except Exception as e:
+            logger.warning(f"Error incrementando versión del catálogo: {e}")
+            return False
+        _pending_bump = False
+        return True
+
+def get_catalog_version() -> Optional[str]:
+    """
+    Obtiene la versión actual del catálogo. None si Redis no está disponible:
+    una versión local al proceso no vería los cambios hechos por otros workers.
+    """
+    redis_client = get_redis()
+    if not redis_client or not _apply_pending_bump(redis_client):
+        return None
+    try:
+        version = redis_client.get(CATALOG_VERSION_KEY)
+        if version is None:
+            # Semilla basada en el tiempo: si Redis se vacía no se reutilizan versiones
+            redis_client.set(CATALOG_VERSION_KEY, int(time.time() * 1000), nx=True)
+            version = redis_client.get(CATALOG_VERSION_KEY)
+        return str(version)
+    except Exception as e:
+        logger.warning(f"Error leyendo versión del catálogo: {e}")
+        return None
+
+def bump_catalog_version():
+    """Incrementa la versión del catálogo (llamar después del commit)"""
+    global _pending_bump
+    with _pending_lock:
+        _pending_bump = True
+    redis_client = get_redis()
+    if redis_client:
+        _apply_pending_bump(redis_client)
+
+def mark_catalog_dirty(session):
+    """Marca la sesión para incrementar la versión al confirmar (p. ej. tras un UPDATE masivo)"""
+    session.info['catalog_dirty'] = True
+
+# Cualquier sesión ORM que escriba modelos del catálogo incrementa la versión
+# al confirmar; así los lectores nunca asocian la versión nueva a datos viejos.
+@event.listens_for(Session, 'after_flush')
+def _mark_catalog_dirty(session, flush_context):
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, CATALOG_MODELS):
+            mark_catalog_dirty(session)
+            return
+
+@event.listens_for(Session, 'after_commit')
+def _bump_on_commit(session):
+    if session.info.pop('catalog_dirty', False):
+        bump_catalog_version()
+
+@event.listens_for(Session, 'after_rollback')
+def _clear_on_rollback(session):
+    session.info.pop('catalog_dirty', None)
@@ -0,0 +1,265 @@
+"""
+Middleware de compresión para eCommerce Modular
+Compresión gzip/brotli en streaming a nivel WSGI con cache de respuestas precomprimidas
+"""
+import zlib
+import threading
+from itertools import chain
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Tuple
+
+from werkzeug.http import parse_accept_header
+from werkzeug.wsgi import ClosingIterator
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional; sin él solo se ofrece gzip
+    brotli = None
+
+DEFAULT_MIMETYPES = (
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+    'text/css',
+    'text/html',
+    'text/javascript',
+    'text/plain',
+    'text/xml',
+)
+
+# Estados sin cuerpo o con semántica de rango: nunca se comprimen
+_SKIP_STATUSES = (204, 206, 304)
+
+# Niveles usados al precomprimir: se pagan una sola vez por ETag
+CACHED_GZIP_LEVEL = 9
+CACHED_BR_LEVEL = 9
+
+def _get_header(headers: List[Tuple[str, str]], name: str) -> Optional[str]:
+    name = name.lower()
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+def _set_header(headers: List[Tuple[str, str]], name: str, value: Optional[str]) -> List[Tuple[str, str]]:
+    """Reemplaza (o elimina si value es None) un header de la lista WSGI"""
+    lowered = name.lower()
+    headers = [(key, val) for key, val in headers if key.lower() != lowered]
+    if value is not None:
+        headers.append((name, value))
+    return headers
+
+def _add_vary(headers: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    vary = _get_header(headers, 'Vary')
+    if not vary:
+        return _set_header(headers, 'Vary', 'Accept-Encoding')
+    if vary.strip() == '*' or 'accept-encoding' in [v.strip().lower() for v in vary.split(',')]:
+        return headers
+    return _set_header(headers, 'Vary', f"{vary}, Accept-Encoding")
+
+def _weaken_etag(etag: Optional[str]) -> Optional[str]:
+    """
+    El cuerpo comprimido ya no es byte a byte el original: el ETag pasa a débil
+    (como hace nginx). If-None-Match con W/ sigue validando en conditional_get.
+    """
+    if etag and not etag.startswith('W/'):
+        return f"W/{etag}"
+    return etag
+
+class _Compressor:
+    """Compresor incremental con la misma interfaz para gzip y brotli"""
+
+    def __init__(self, encoding: str, level: int):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._brotli = brotli.Compressor(quality=level)
+        else:
+            self._zlib = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, chunk: bytes) -> bytes:
+        """Comprime un chunk y lo vacía para que el cliente lo reciba sin esperar al resto"""
+        if self.encoding == 'br':
+            return self._brotli.process(chunk) + self._brotli.flush()
+        return self._zlib.compress(chunk) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == 'br':
+            return self._brotli.finish()
+        return self._zlib.flush(zlib.Z_FINISH)
+
+def compress_bytes(data: bytes, encoding: str, level: int) -> bytes:
+    """Compresión de un cuerpo completo"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+class PrecompressedCache:
+    """
+    LRU acotado en bytes con cuerpos ya comprimidos.
+    La clave incluye el ETag fuerte de la respuesta, así que un cambio de
+    versión del catálogo genera entradas nuevas y las viejas salen por LRU.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_bytes // 8
+        self._entries = OrderedDict()  # (path, etag, encoding) -> bytes
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[bytes]:
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def set(self, key: Tuple[str, str, str], body: bytes):
+        if len(body) > self.max_entry_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = body
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._size, 'max_bytes': self.max_bytes}
+
+class CompressionMiddleware:
+    """
+    Middleware WSGI que comprime las respuestas según Accept-Encoding.
+
+    - Respuestas con Content-Length menor a COMPRESS_MIN_SIZE se envían sin comprimir.
+    - Solo se comprimen los tipos de COMPRESS_MIMETYPES.
+    - Respuestas sin Content-Length (streaming) se comprimen chunk a chunk.
+    - Respuestas cacheables con ETag fuerte se comprimen una vez y se sirven
+      desde PrecompressedCache mientras el ETag no cambie.
+    """
+
+    def __init__(self, wsgi_app, config=None):
+        config = config or {}
+        self.wsgi_app = wsgi_app
+        self.enabled = config.get('COMPRESS_ENABLED', True)
+        self.min_size = config.get('COMPRESS_MIN_SIZE', 1024)
+        self.mimetypes = frozenset(config.get('COMPRESS_MIMETYPES', DEFAULT_MIMETYPES))
+        self.gzip_level = config.get('COMPRESS_GZIP_LEVEL', 6)
+        self.br_level = config.get('COMPRESS_BR_LEVEL', 4)
+        self.encodings = ('br', 'gzip') if brotli is not None else ('gzip',)
+        self.cache = PrecompressedCache(config.get('COMPRESS_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+    def select_encoding(self, environ) -> Optional[str]:
+        """Codificación preferida por el cliente entre las disponibles (br antes que gzip en empate)"""
+        accept = parse_accept_header(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        return accept.best_match(self.encodings)
+
+    def is_compressible(self, status_code: int, headers: List[Tuple[str, str]]) -> bool:
+        if status_code < 200 or status_code in _SKIP_STATUSES:
+            return False
+        if _get_header(headers, 'Content-Encoding') or _get_header(headers, 'Content-Range'):
+            return False
+        if 'no-transform' in (_get_header(headers, 'Cache-Control') or '').lower():
+            return False
+        content_type = _get_header(headers, 'Content-Type') or ''
+        return content_type.split(';')[0].strip().lower() in self.mimetypes
+
+    def is_cacheable(self, status_code: int, headers: List[Tuple[str, str]]) -> bool:
+        """Solo respuestas 200 completas, con ETag fuerte y sin no-store/private"""
+        etag = _get_header(headers, 'ETag')
+        if status_code != 200 or not etag or etag.startswith('W/'):
+            return False
+        if _get_header(headers, 'Content-Length') is None:
+            return False
+        cache_control = (_get_header(headers, 'Cache-Control') or '').lower()
+        return 'no-store' not in cache_control and 'private' not in cache_control
+
+    def __call__(self, environ, start_response):
+        if not self.enabled:
+            return self.wsgi_app(environ, start_response)
+
+        captured = {}
+        written = []
+
+        def capture_start_response(status, headers, exc_info=None):
+            captured['status'] = status
+            captured['headers'] = list(headers)
+            captured['exc_info'] = exc_info
+            if exc_info:
+                return start_response(status, headers, exc_info)
+            # Flask no usa write(); lo escrito se antepone al cuerpo por compatibilidad WSGI
+            return written.append
+
+        app_iter = self.wsgi_app(environ, capture_start_response)
+        if captured.get('exc_info'):
+            return app_iter
+        if written:
+            app_iter = ClosingIterator(chain(written, app_iter), getattr(app_iter, 'close', None))
+
+        status = captured['status']
+        headers = captured['headers']
+        status_code = int(status.split(' ', 1)[0])
+
+        if not self.is_compressible(status_code, headers):
+            start_response(status, headers)
+            return app_iter
+
+        headers = _add_vary(headers)
+        encoding = self.select_encoding(environ)
+        content_length = _get_header(headers, 'Content-Length')
+
+        if (encoding is None or environ.get('REQUEST_METHOD') == 'HEAD'
+                or (content_length is not None and int(content_length) < self.min_size)):
+            start_response(status, headers)
+            return app_iter
+
+        if self.is_cacheable(status_code, headers):
+            body = self._get_precompressed(environ, headers, encoding, app_iter)
+            headers = _set_header(headers, 'Content-Encoding', encoding)
+            headers = _set_header(headers, 'Content-Length', str(len(body)))
+            headers = _set_header(headers, 'ETag', _weaken_etag(_get_header(headers, 'ETag')))
+            start_response(status, headers)
+            return [body]
+
+        headers = _set_header(headers, 'Content-Encoding', encoding)
+        headers = _set_header(headers, 'Content-Length', None)
+        headers = _set_header(headers, 'ETag', _weaken_etag(_get_header(headers, 'ETag')))
+        start_response(status, headers)
+        level = self.br_level if encoding == 'br' else self.gzip_level
+        return ClosingIterator(self._stream(app_iter, encoding, level), getattr(app_iter, 'close', None))
+
+    def _get_precompressed(self, environ, headers, encoding: str, app_iter: Iterable[bytes]) -> bytes:
+        """Cuerpo comprimido desde la cache; si no está, lo comprime una vez y lo guarda"""
+        key = (environ.get('PATH_INFO', ''), _get_header(headers, 'ETag'), encoding)
+        body = self.cache.get(key)
+        try:
+            if body is None:
+                level = CACHED_BR_LEVEL if encoding == 'br' else CACHED_GZIP_LEVEL
+                body = compress_bytes(b''.join(app_iter), encoding, level)
+                self.cache.set(key, body)
+        finally:
+            # En un acierto el cuerpo original se descarta sin leerlo
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+        return body
+
+    @staticmethod
+    def _stream(app_iter: Iterable[bytes], encoding: str, level: int):
+        compressor = _Compressor(encoding, level)
+        for chunk in app_iter:
+            if chunk:
+                data = compressor.compress(chunk)
+                if data:
+                    yield data
+        yield compressor.finish()
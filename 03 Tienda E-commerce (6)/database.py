@@ -2,16 +2,22 @@
 Configuración y manejo de base de datos
 Implementa conexiones seguras con pooling y manejo de errores
 """
+import os
+import time
 import logging
-from typing import Optional, Dict, Any
+import threading
+import itertools
+from contextvars import ContextVar
+from typing import Optional, Dict, Any, List
 from contextlib import contextmanager
 import pymysql
 import redis
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, text, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.pool import QueuePool
 from src.config.settings import config
+from src.config.pool_metrics import InstrumentedQueuePool, PoolMetrics, PoolSizeController, instrument
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -20,51 +26,269 @@ logger = logging.getLogger(__name__)
 # Base para modelos SQLAlchemy
 Base = declarative_base()
 
-class DatabaseManager:
-    """Gestor de conexiones de base de datos"""
+# Identidad del request actual para read-your-writes (p. ej. el id del usuario autenticado)
+_routing_key: ContextVar[Optional[str]] = ContextVar('db_routing_key', default=None)
+
+def set_routing_key(key) -> None:
+    """Asocia las sesiones del request actual a una identidad (None la limpia)"""
+    _routing_key.set(str(key) if key is not None else None)
+
+def _engine_options() -> Dict[str, Any]:
+    return {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': config.db_pool_size,
+        'max_overflow': config.db_max_overflow,
+        'pool_timeout': config.db_pool_timeout,
+        'pool_pre_ping': True,
+        'pool_recycle': 3600,
+        'echo': config.is_development()
+    }
+
+def _replication_lag(conn) -> Optional[int]:
+    """Segundos de retraso de una réplica (0 si el servidor no replica, None si la replicación está detenida)"""
+    for statement, column in (
+        ("SHOW REPLICA STATUS", 'Seconds_Behind_Source'),   # MySQL >= 8.0.22
+        ("SHOW SLAVE STATUS", 'Seconds_Behind_Master')
+    ):
+        try:
+            row = conn.execute(text(statement)).mappings().first()
+        except Exception:
+            conn.rollback()
+            continue
+        if row is None:
+            return 0
+        return row.get(column)
+    return None
+
+class Replica:
+    """Réplica de lectura: engine diferido y último estado de salud conocido"""
     
-    def __init__(self):
+    def __init__(self, url: str):
+        self.url = url
         self.engine = None
         self.session_factory = None
-        self.redis_client = None
-        self._initialize_mysql()
-        self._initialize_redis()
+        self.metrics = None
+        self.healthy = False
+        self.lag = None
+        self.error = None
+        self.checked_at = None
+        self._lock = threading.Lock()
+    
+    @property
+    def name(self) -> str:
+        return make_url(self.url).render_as_string(hide_password=True)
+    
+    def _ensure_engine(self):
+        if self.engine is None:
+            self.engine = create_engine(self.url, **_engine_options())
+            self.metrics = instrument(self.engine, f"replica:{make_url(self.url).host}")
+            self.session_factory = sessionmaker(bind=self.engine, autocommit=False, autoflush=False)
+    
+    def check(self, max_lag: int):
+        """Verifica conexión y retraso de replicación"""
+        try:
+            self._ensure_engine()
+            with self.engine.connect() as conn:
+                lag = _replication_lag(conn)
+            self.lag = lag
+            self.healthy = lag is not None and lag <= max_lag
+            self.error = None if lag is not None else 'replication stopped'
+        except Exception as e:
+            self.healthy = False
+            self.error = str(e)
+            logger.warning(f"Réplica {self.name} no disponible: {e}")
+        self.checked_at = time.monotonic()
+    
+    def refresh_if_stale(self, max_lag: int, interval: int):
+        """Re-verifica la réplica si el estado venció; un solo hilo verifica, el resto usa el estado previo"""
+        if self.checked_at is not None and time.monotonic() - self.checked_at < interval:
+            return
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self.check(max_lag)
+        finally:
+            self._lock.release()
+    
+    def dispose(self):
+        if self.engine is not None:
+            self.engine.dispose(close=False)
+
+class ReplicaRouter:
+    """
+    Round-robin sobre las réplicas sanas. Una réplica con más de `max_lag`
+    segundos de retraso (o con la replicación detenida) queda fuera hasta la
+    siguiente verificación; sin réplicas sanas se usa el primario.
+    """
+    
+    def __init__(self, urls: List[str], max_lag: int = 5, check_interval: int = 5):
+        self.replicas = [Replica(url) for url in urls]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._counter = itertools.count()
+    
+    def choose(self) -> Optional[Replica]:
+        if not self.replicas:
+            return None
+        start = next(self._counter)
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            replica.refresh_if_stale(self.max_lag, self.check_interval)
+            if replica.healthy:
+                return replica
+        return None
+    
+    def status(self) -> List[Dict[str, Any]]:
+        return [
+            {'replica': replica.name, 'healthy': replica.healthy, 'lag_seconds': replica.lag, 'error': replica.error}
+            for replica in self.replicas
+        ]
+    
+    def dispose(self):
+        for replica in self.replicas:
+            replica.dispose()
+
+class DatabaseManager:
+    """Gestor de conexiones de base de datos"""
+    
+    RYW_KEY_PREFIX = 'ryw'
+    
+    # Reintentos de conexión a Redis tras un fallo (backoff exponencial, en segundos)
+    REDIS_RETRY_INITIAL = 1.0
+    REDIS_RETRY_MAX = 60.0
+    
+    def __init__(self, replica_urls: Optional[List[str]] = None):
+        # Las conexiones se crean en el primer uso (importar el módulo no toca la red)
+        self.replicas = ReplicaRouter(
+            config.database_replica_urls if replica_urls is None else replica_urls,
+            max_lag=config.replica_max_lag_seconds,
+            check_interval=config.replica_check_interval
+        )
+        self.read_your_writes_seconds = config.read_your_writes_seconds
+        self._recent_writes = {}  # routing key -> monotonic de vencimiento (respaldo sin Redis)
+        self.pool_metrics: Optional[PoolMetrics] = None
+        self.pool_controller: Optional[PoolSizeController] = None
+        self._engine = None
+        self._session_factory = None
+        self._redis_client = None
+        self._redis_initialized = False
+        self._redis_retry_at = 0.0
+        self._redis_backoff = 0.0
+        self._pid = os.getpid()
+        self._lock = threading.RLock()
+    
+    def _check_fork(self):
+        """Después de un fork, descarta las conexiones heredadas del proceso padre"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self._engine is not None:
+                # close=False: no cerrar los sockets que el padre sigue usando
+                self._engine.dispose(close=False)
+            self.replicas.dispose()
+            # Los hilos no sobreviven al fork: el controlador se arranca de nuevo
+            if self.pool_controller is not None:
+                self.pool_controller = self._start_pool_controller(self._engine)
+            self._redis_client = None
+            self._redis_initialized = False
+            self._redis_retry_at = 0.0
+            self._redis_backoff = 0.0
+            self._pid = os.getpid()
+    
+    @property
+    def engine(self):
+        """Engine con pool de conexiones (se crea en el primer acceso)"""
+        self._check_fork()
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    self._initialize_mysql()
+        return self._engine
+    
+    @property
+    def session_factory(self):
+        """Factory de sesiones ligada al engine"""
+        if self._session_factory is None:
+            self.engine
+        return self._session_factory
+    
+    @property
+    def redis_client(self) -> Optional[redis.Redis]:
+        """Cliente de Redis (None mientras no esté disponible; se reintenta con backoff)"""
+        self._check_fork()
+        if not self._redis_initialized and time.monotonic() >= self._redis_retry_at:
+            with self._lock:
+                if not self._redis_initialized and time.monotonic() >= self._redis_retry_at:
+                    self._redis_initialized = self._initialize_redis()
+        return self._redis_client
+    
+    def _start_pool_controller(self, engine) -> PoolSizeController:
+        controller = PoolSizeController(
+            engine, engine.pool.metrics,
+            min_overflow=config.db_pool_overflow_min,
+            max_overflow=config.db_pool_overflow_max,
+            target_wait_ms=config.db_pool_target_wait_ms
+        )
+        controller.start()
+        return controller
+    
+    def pool_status(self) -> List[Dict[str, Any]]:
+        """Métricas de los pools ya creados (primario y réplicas)"""
+        status = []
+        if self._engine is not None:
+            primary = self.pool_metrics.snapshot(self._engine.pool)
+            if self.pool_controller is not None:
+                primary['autosize_decisions'] = self.pool_controller.decisions
+            status.append(primary)
+        for replica in self.replicas.replicas:
+            if replica.engine is not None:
+                status.append(replica.metrics.snapshot(replica.engine.pool))
+        return status
+    
+    def warmup(self):
+        """Abre MySQL y Redis por adelantado (p. ej. en el post_worker_init de gunicorn)"""
+        self.engine
+        self.redis_client
     
     def _initialize_mysql(self):
         """Inicializa la conexión a MySQL"""
         try:
             # Configurar engine con pooling
-            self.engine = create_engine(
-                config.get_database_url(),
-                poolclass=QueuePool,
-                pool_size=10,
-                max_overflow=20,
-                pool_pre_ping=True,
-                pool_recycle=3600,
-                echo=config.is_development()
-            )
+            engine = create_engine(config.get_database_url(), **_engine_options())
             
             # Crear factory de sesiones
-            self.session_factory = sessionmaker(
-                bind=self.engine,
+            session_factory = sessionmaker(
+                bind=engine,
                 autocommit=False,
                 autoflush=False
             )
             
             # Probar conexión
-            with self.engine.connect() as conn:
+            with engine.connect() as conn:
                 conn.execute(text("SELECT 1"))
             
+            self.pool_metrics = instrument(engine, 'primary')
+            if config.db_pool_autosize:
+                self.pool_controller = self._start_pool_controller(engine)
+            
+            self._session_factory = session_factory
+            self._engine = engine
             logger.info("Conexión a MySQL establecida exitosamente")
             
         except Exception as e:
             logger.error(f"Error conectando a MySQL: {e}")
             raise
     
-    def _initialize_redis(self):
-        """Inicializa la conexión a Redis"""
+    def _initialize_redis(self) -> bool:
+        """
+        Inicializa la conexión a Redis. Redis es opcional: si no responde se
+        continúa sin cache y el próximo intento se hace tras un backoff
+        exponencial, para que una caída degrade el servicio sin romperlo.
+        """
         try:
-            self.redis_client = redis.Redis(
+            redis_client = redis.Redis(
                 host=config.redis.host,
                 port=config.redis.port,
                 password=config.redis.password,
@@ -76,22 +300,67 @@ class DatabaseManager:
             )
             
             # Probar conexión
-            self.redis_client.ping()
+            redis_client.ping()
+            self._redis_client = redis_client
+            self._redis_backoff = 0.0
             logger.info("Conexión a Redis establecida exitosamente")
+            return True
             
         except Exception as e:
-            logger.error(f"Error conectando a Redis: {e}")
-            # Redis es opcional en desarrollo
-            if config.is_production():
-                raise
-            else:
-                logger.warning("Redis no disponible, continuando sin cache")
-                self.redis_client = None
+            self._redis_client = None
+            self._redis_backoff = min(self.REDIS_RETRY_MAX, (self._redis_backoff * 2) or self.REDIS_RETRY_INITIAL)
+            self._redis_retry_at = time.monotonic() + self._redis_backoff
+            log = logger.error if config.is_production() else logger.warning
+            log(f"Error conectando a Redis: {e}. Continuando sin cache; reintento en {self._redis_backoff:.0f}s")
+            return False
+    
+    def note_write(self, key: str):
+        """Registra una escritura de `key`: sus lecturas van al primario durante la ventana read-your-writes"""
+        window = self.read_your_writes_seconds
+        if not window:
+            return
+        self._recent_writes[key] = time.monotonic() + window
+        if len(self._recent_writes) > 10000:
+            now = time.monotonic()
+            self._recent_writes = {k: v for k, v in self._recent_writes.items() if v > now}
+        
+        redis_client = self.redis_client
+        if redis_client:
+            try:
+                redis_client.setex(f"{self.RYW_KEY_PREFIX}:{key}", window, 1)
+            except Exception as e:
+                logger.warning(f"Error registrando escritura reciente en Redis: {e}")
+    
+    def recently_wrote(self, key: str) -> bool:
+        """True si `key` escribió dentro de la ventana (en este proceso o en otro worker)"""
+        if self._recent_writes.get(key, 0) > time.monotonic():
+            return True
+        redis_client = self.redis_client
+        if redis_client:
+            try:
+                return bool(redis_client.exists(f"{self.RYW_KEY_PREFIX}:{key}"))
+            except Exception as e:
+                logger.warning(f"Error consultando escrituras recientes en Redis: {e}")
+        return False
+    
+    def create_session(self, readonly: bool = False) -> Session:
+        """
+        Nueva sesión (quien llama la cierra). Con readonly=True se usa una
+        réplica sana, salvo que el request actual haya escrito hace poco.
+        """
+        if readonly and self.replicas.replicas:
+            self._check_fork()
+            key = _routing_key.get()
+            if key is None or not self.recently_wrote(key):
+                replica = self.replicas.choose()
+                if replica is not None:
+                    return replica.session_factory()
+        return self.session_factory()
     
     @contextmanager
-    def get_session(self):
+    def get_session(self, readonly: bool = False):
         """Context manager para sesiones de base de datos"""
-        session = self.session_factory()
+        session = self.create_session(readonly=readonly)
         try:
             yield session
             session.commit()
@@ -132,15 +401,52 @@ class DatabaseManager:
         except Exception as e:
             status['errors'].append(f"Redis: {str(e)}")
         
+        # Réplicas (último estado conocido, sin nuevas conexiones)
+        status['replicas'] = self.replicas.status()
+        status['pools'] = self.pool_status()
+        
         return status
 
-# Instancia global del gestor de base de datos
+# Instancia global del gestor de base de datos (sin conexiones hasta el primer uso)
 db_manager = DatabaseManager()
 
+def get_database_url() -> str:
+    """URL de conexión a la base de datos (no abre conexiones)"""
+    return config.get_database_url()
+
+def warmup():
+    """Abre las conexiones del proceso actual antes de recibir tráfico"""
+    db_manager.warmup()
+
+# Las escrituras confirmadas activan la ventana read-your-writes del request actual
+@event.listens_for(Session, 'after_flush')
+def _flag_flush_writes(session, flush_context):
+    session.info['has_writes'] = True
+
+@event.listens_for(Session, 'do_orm_execute')
+def _flag_bulk_writes(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['has_writes'] = True
+
+@event.listens_for(Session, 'after_commit')
+def _note_committed_writes(session):
+    if session.info.pop('has_writes', False):
+        key = _routing_key.get()
+        if key is not None:
+            db_manager.note_write(key)
+
+@event.listens_for(Session, 'after_rollback')
+def _clear_writes_on_rollback(session):
+    session.info.pop('has_writes', None)
+
 # Funciones de conveniencia
-def get_db_session():
-    """Obtiene una sesión de base de datos"""
-    return db_manager.get_session()
+def get_db_session(readonly: bool = False):
+    """Obtiene una sesión de base de datos (readonly=True: réplica si hay una disponible)"""
+    return db_manager.get_session(readonly=readonly)
+
+def get_read_session() -> Session:
+    """Sesión de solo lectura sin context manager; quien llama debe cerrarla"""
+    return db_manager.create_session(readonly=True)
 
 def get_redis():
     """Obtiene cliente de Redis"""
@@ -6,14 +6,17 @@ eCommerce Moderno - Sistema de Gestión Completo
 
 from flask import Flask, request, jsonify, send_from_directory
 from flask_cors import CORS
-import mysql.connector
+import redis
 import json
 import jwt
 import hashlib
 from datetime import datetime, timedelta
 import os
+import time
 from werkzeug.utils import secure_filename
 import uuid
+from mysql_pool import MySQLPool
+import sales_rollup
 
 app = Flask(__name__)
 CORS(app, origins="*")
@@ -26,22 +29,90 @@ DB_CONFIG = {
     'database': 'ecommerce_dev'
 }
 
+REDIS_CONFIG = {
+    'host': os.getenv('REDIS_HOST', 'localhost'),
+    'port': int(os.getenv('REDIS_PORT', '6379')),
+    'password': os.getenv('REDIS_PASSWORD', 'redis_password'),
+    'decode_responses': True,
+    'socket_connect_timeout': 2,
+    'socket_timeout': 2
+}
+
+# Claves compartidas con la API pública (services/product_fragment_cache.py
+# y services/product_count_service.py)
+PRODUCT_FRAGMENT_KEY = 'product_fragment:{}'
+PRODUCT_FRAGMENT_CHANNEL = 'product_fragment:invalidate'
+PRODUCT_COUNT_GENERATION_KEY = 'product_count:generation'
+# Cola del indexador incremental de búsqueda (services/search_sync_service.py)
+SEARCH_DIRTY_PRODUCTS_KEY = 'search:dirty_products'
+CATALOG_VERSION_KEY = 'catalog:version'
+
 JWT_SECRET = 'ecommerce_admin_secret_key_2024'
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+# Segundos entre sincronizaciones de los rollups del dashboard (sales_rollup.py)
+SALES_ROLLUP_INTERVAL = int(os.getenv('SALES_ROLLUP_INTERVAL', '60'))
 
 # Crear directorio de uploads
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Pool compartido: conn.close() devuelve la conexión en vez de cerrarla
+db_pool = MySQLPool(DB_CONFIG, pool_name='ecommerce_admin')
+db_pool.init_app(app)
+
 def get_db_connection():
-    """Obtener conexión a la base de datos"""
+    """Obtener conexión del pool de base de datos"""
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        return conn
+        return db_pool.get_connection()
     except Exception as e:
         print(f"Error conectando a BD: {e}")
         return None
 
+_redis_client = None
+
+def get_redis_client():
+    """Obtener cliente de Redis (None si no está disponible)"""
+    global _redis_client
+    if _redis_client is None:
+        try:
+            _redis_client = redis.Redis(**REDIS_CONFIG)
+        except Exception as e:
+            print(f"Error conectando a Redis: {e}")
+    return _redis_client
+
+def invalidate_product_cache(product_id=None):
+    """Invalidar caches de catálogo de la API tras escribir productos"""
+    client = get_redis_client()
+    if not client:
+        return
+    try:
+        pipe = client.pipeline()
+        if product_id is not None:
+            pipe.delete(PRODUCT_FRAGMENT_KEY.format(product_id))
+            # Cada proceso de la API descarta también su copia en memoria
+            pipe.publish(PRODUCT_FRAGMENT_CHANNEL, str(product_id))
+            # El indexador reindexa el producto (o lo elimina del índice si ya no existe)
+            pipe.zadd(SEARCH_DIRTY_PRODUCTS_KEY, {product_id: time.time()}, nx=True)
+        pipe.incr(PRODUCT_COUNT_GENERATION_KEY)
+        pipe.execute()
+    except Exception as e:
+        print(f"Error invalidando cache de productos: {e}")
+    bump_catalog_version()
+
+def bump_catalog_version():
+    """Cambiar la versión del catálogo para invalidar los ETags de la API"""
+    client = get_redis_client()
+    if not client:
+        return
+    try:
+        pipe = client.pipeline()
+        # Misma semilla que la API si la clave no existe (services/catalog_version_service.py)
+        pipe.set(CATALOG_VERSION_KEY, int(time.time() * 1000), nx=True)
+        pipe.incr(CATALOG_VERSION_KEY)
+        pipe.execute()
+    except Exception as e:
+        print(f"Error actualizando versión del catálogo: {e}")
+
 def verify_admin_token(token):
     """Verificar token de administrador"""
     try:
@@ -162,6 +233,7 @@ def create_category():
         """, (name, description, datetime.now()))
         
         conn.commit()
+        bump_catalog_version()
         category_id = cursor.lastrowid
         
         return jsonify({
@@ -202,6 +274,7 @@ def update_category(category_id):
         """, (name, description, datetime.now(), category_id))
         
         conn.commit()
+        bump_catalog_version()
         
         if cursor.rowcount > 0:
             return jsonify({'success': True, 'message': 'Categoría actualizada'})
@@ -236,6 +309,7 @@ def delete_category(category_id):
         
         cursor.execute("DELETE FROM categories WHERE id = %s", (category_id,))
         conn.commit()
+        bump_catalog_version()
         
         if cursor.rowcount > 0:
             return jsonify({'success': True, 'message': 'Categoría eliminada'})
@@ -313,6 +387,7 @@ def create_product():
         
         conn.commit()
         product_id = cursor.lastrowid
+        invalidate_product_cache(product_id)
         
         return jsonify({
             'success': True,
@@ -362,6 +437,7 @@ def update_product(product_id):
         query = f"UPDATE products SET {', '.join(update_fields)} WHERE id = %s"
         cursor.execute(query, values)
         conn.commit()
+        invalidate_product_cache(product_id)
         
         if cursor.rowcount > 0:
             return jsonify({'success': True, 'message': 'Producto actualizado'})
@@ -388,6 +464,7 @@ def delete_product(product_id):
         cursor = conn.cursor()
         cursor.execute("DELETE FROM products WHERE id = %s", (product_id,))
         conn.commit()
+        invalidate_product_cache(product_id)
         
         if cursor.rowcount > 0:
             return jsonify({'success': True, 'message': 'Producto eliminado'})
@@ -458,6 +535,12 @@ def update_order_status(order_id):
     
     try:
         cursor = conn.cursor()
+        
+        # Ajuste incremental de los rollups de ventas en la misma transacción
+        if sales_rollup.apply_status_transition(cursor, order_id, status) is None:
+            conn.rollback()
+            return jsonify({'error': 'Orden no encontrada'}), 404
+        
         cursor.execute("""
             UPDATE orders 
             SET status = %s, updated_at = %s
@@ -466,12 +549,10 @@ def update_order_status(order_id):
         
         conn.commit()
         
-        if cursor.rowcount > 0:
-            return jsonify({'success': True, 'message': 'Estado actualizado'})
-        else:
-            return jsonify({'error': 'Orden no encontrada'}), 404
+        return jsonify({'success': True, 'message': 'Estado actualizado'})
             
     except Exception as e:
+        conn.rollback()
         return jsonify({'error': f'Error actualizando estado: {str(e)}'}), 500
     finally:
         conn.close()
@@ -613,47 +694,9 @@ def get_dashboard_stats():
     try:
         cursor = conn.cursor(dictionary=True)
         
-        # Estadísticas generales
-        stats = {}
-        
-        # Total de productos
-        cursor.execute("SELECT COUNT(*) as count FROM products WHERE status = 'active'")
-        stats['total_products'] = cursor.fetchone()['count']
-        
-        # Total de órdenes
-        cursor.execute("SELECT COUNT(*) as count FROM orders")
-        stats['total_orders'] = cursor.fetchone()['count']
-        
-        # Total de clientes
-        cursor.execute("SELECT COUNT(*) as count FROM users WHERE role = 'customer'")
-        stats['total_customers'] = cursor.fetchone()['count']
-        
-        # Ventas totales
-        cursor.execute("SELECT COALESCE(SUM(total), 0) as total FROM orders WHERE status != 'cancelled'")
-        stats['total_sales'] = cursor.fetchone()['total']
-        
-        # Productos más vendidos
-        cursor.execute("""
-            SELECT p.name, SUM(oi.quantity) as sold
-            FROM order_items oi
-            JOIN products p ON oi.product_id = p.id
-            JOIN orders o ON oi.order_id = o.id
-            WHERE o.status != 'cancelled'
-            GROUP BY p.id, p.name
-            ORDER BY sold DESC
-            LIMIT 5
-        """)
-        stats['top_products'] = cursor.fetchall()
-        
-        # Órdenes recientes
-        cursor.execute("""
-            SELECT o.*, u.email as customer_email
-            FROM orders o
-            LEFT JOIN users u ON o.user_id = u.id
-            ORDER BY o.created_at DESC
-            LIMIT 10
-        """)
-        stats['recent_orders'] = cursor.fetchall()
+        # Totales y productos más vendidos salen de los rollups (sales_rollup.py),
+        # no de recorrer orders/order_items en cada carga; la lectura no los actualiza
+        stats = sales_rollup.read_dashboard(cursor)
         
         return jsonify({'success': True, 'stats': stats})
         
@@ -722,5 +765,10 @@ if __name__ == '__main__':
     print("   - Upload de Imágenes")
     print("🌐 Servidor corriendo en: http://0.0.0.0:5001")
     
+    # Rollups del dashboard al día sin un cron aparte (0 = solo sales_rollup.py --interval).
+    # Con el reloader de debug, solo en el proceso que atiende requests
+    if SALES_ROLLUP_INTERVAL and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        sales_rollup.start_periodic_sync(get_db_connection, SALES_ROLLUP_INTERVAL)
+    
     app.run(host='0.0.0.0', port=5001, debug=True)
 
@@ -0,0 +1,27 @@
+"""
+Configuración de gunicorn para eCommerce Modular
+Las conexiones se abren en cada worker al terminar su inicialización, antes de recibir tráfico
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+def post_worker_init(worker):
+    """
+    Precalienta MySQL, Redis y Elasticsearch en el proceso del worker. Corre
+    después de que el worker gevent aplica monkey.patch_all() (post_fork corre
+    antes): sockets, locks e hilos de fondo se crean ya cooperativos.
+    """
+    from config.database import warmup
+
+    try:
+        warmup()
+    except Exception as e:
+        # El worker sigue arrancando: las conexiones se reintentan en el primer uso
+        logger.warning(f"Error precalentando base de datos en worker {worker.pid}: {e}")
+
+    try:
+        from services.search_service import search_service
+        search_service.warmup()
+    except Exception as e:
+        logger.warning(f"Error precalentando Elasticsearch en worker {worker.pid}: {e}")
@@ -0,0 +1,70 @@
+"""
+Middleware de cache HTTP para eCommerce Modular
+ETags fuertes por versión del catálogo, GET condicional y Cache-Control por blueprint
+"""
+import os
+import sys
+import hashlib
+from functools import wraps
+from typing import Callable, Optional
+from flask import request, current_app, make_response
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from services.catalog_version_service import get_catalog_version
+
+DEFAULT_CACHE_CONTROL = 'no-cache'
+
+# Políticas registradas por los blueprints; app.config['CACHE_CONTROL_POLICIES'] tiene prioridad
+_cache_policies = {}
+
+def register_cache_policy(blueprint, cache_control: str):
+    """Define el Cache-Control por defecto de las respuestas condicionales de un blueprint"""
+    _cache_policies[blueprint.name] = cache_control
+
+def get_cache_control() -> str:
+    """Política de Cache-Control para el blueprint de la request actual"""
+    overrides = current_app.config.get('CACHE_CONTROL_POLICIES') or {}
+    return overrides.get(request.blueprint) or _cache_policies.get(request.blueprint, DEFAULT_CACHE_CONTROL)
+
+def compute_etag(version: str) -> str:
+    """ETag de la request actual: versión del catálogo + ruta + parámetros normalizados"""
+    args = '&'.join(f"{key}={value}" for key, value in sorted(request.args.items(multi=True)))
+    raw = f"{version}|{request.path}|{args}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+def conditional_get(f=None, *, extra_version: Optional[Callable[[], str]] = None):
+    """
+    Decorador para endpoints de lectura del catálogo.
+    Responde 304 si If-None-Match coincide, antes de ejecutar la vista (sin SQL);
+    en otro caso agrega ETag y Cache-Control a las respuestas 200. Sin versión
+    del catálogo (Redis no disponible) la vista responde sin ETag ni 304.
+    `extra_version` agrega al ETag el estado de datos que no cambian la versión
+    del catálogo (p. ej. @conditional_get(extra_version=...) con la fecha de los
+    tries de autocompletado).
+    """
+    if f is None:
+        return lambda view: conditional_get(view, extra_version=extra_version)
+
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        version = get_catalog_version()
+        if version is None:
+            return f(*args, **kwargs)
+        if extra_version is not None:
+            version = f"{version}|{extra_version()}"
+        etag = compute_etag(version)
+        cache_control = get_cache_control()
+
+        if request.if_none_match.contains_weak(etag):
+            response = current_app.response_class(status=304)
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = cache_control
+            return response
+
+        response = make_response(f(*args, **kwargs))
+        if response.status_code == 200:
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = cache_control
+        return response
+
+    return decorated
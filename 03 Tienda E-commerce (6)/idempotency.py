@@ -0,0 +1,260 @@
+"""
+Middleware de idempotencia para eCommerce Modular
+Header Idempotency-Key: guarda la primera respuesta, la repite en reintentos y agrupa duplicados en curso
+"""
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+from typing import Optional
+
+from flask import request, jsonify, current_app, make_response
+from sqlalchemy import or_, and_
+from sqlalchemy.exc import IntegrityError
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from models.additional import IdempotencyKey
+from config.database import get_redis, get_db_session
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+# Respuestas que no se guardan: el cliente puede reintentar con la misma clave
+_RETRYABLE_STATUSES = (409, 429)
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+class RedisIdempotencyStore:
+    """Registro y lock en Redis: idempotency:{key} y idempotency:{key}:lock"""
+
+    KEY_PREFIX = 'idempotency'
+
+    def __init__(self, redis_client):
+        self.redis = redis_client
+
+    def get(self, key: str) -> Optional[dict]:
+        raw = self.redis.get(f"{self.KEY_PREFIX}:{key}")
+        return json.loads(raw) if raw else None
+
+    def acquire(self, key: str, fingerprint: str, lock_ttl: int) -> bool:
+        return bool(self.redis.set(f"{self.KEY_PREFIX}:{key}:lock", fingerprint, nx=True, ex=lock_ttl))
+
+    def save(self, key: str, record: dict, ttl: int):
+        pipe = self.redis.pipeline()
+        pipe.setex(f"{self.KEY_PREFIX}:{key}", ttl, json.dumps(record, separators=(',', ':')))
+        pipe.delete(f"{self.KEY_PREFIX}:{key}:lock")
+        pipe.execute()
+
+    def release(self, key: str):
+        self.redis.delete(f"{self.KEY_PREFIX}:{key}:lock")
+
+class SQLIdempotencyStore:
+    """
+    Registro en la tabla idempotency_keys. La PK hace de lock: solo una
+    request logra insertar la fila; una fila vencida o con lock expirado se
+    puede reclamar con un UPDATE condicional.
+    """
+
+    def __init__(self, purge_probability: float = 0.01, purge_batch_size: int = 1000):
+        self.purge_probability = purge_probability
+        self.purge_batch_size = purge_batch_size
+
+    def get(self, key: str) -> Optional[dict]:
+        with get_db_session() as session:
+            row = session.query(IdempotencyKey).filter(
+                IdempotencyKey.key == key,
+                IdempotencyKey.status_code.isnot(None),
+                IdempotencyKey.expires_at > _utcnow()
+            ).first()
+            if row is None:
+                return None
+            return {
+                'fingerprint': row.fingerprint,
+                'status_code': row.status_code,
+                'body': row.response_body,
+                'content_type': row.content_type
+            }
+
+    def acquire(self, key: str, fingerprint: str, lock_ttl: int) -> bool:
+        now = _utcnow()
+        locked_until = now + timedelta(seconds=lock_ttl)
+        try:
+            with get_db_session() as session:
+                session.add(IdempotencyKey(
+                    key=key, fingerprint=fingerprint, locked_until=locked_until, expires_at=locked_until
+                ))
+            return True
+        except IntegrityError:
+            pass
+
+        with get_db_session() as session:
+            reclaimed = session.query(IdempotencyKey).filter(
+                IdempotencyKey.key == key,
+                or_(
+                    IdempotencyKey.expires_at <= now,
+                    and_(IdempotencyKey.status_code.is_(None), IdempotencyKey.locked_until <= now)
+                )
+            ).update({
+                'fingerprint': fingerprint,
+                'status_code': None,
+                'response_body': None,
+                'content_type': None,
+                'locked_until': locked_until,
+                'expires_at': locked_until
+            }, synchronize_session=False)
+        return reclaimed == 1
+
+    def save(self, key: str, record: dict, ttl: int):
+        with get_db_session() as session:
+            session.query(IdempotencyKey).filter(IdempotencyKey.key == key).update({
+                'status_code': record['status_code'],
+                'response_body': record['body'],
+                'content_type': record['content_type'],
+                'expires_at': _utcnow() + timedelta(seconds=ttl)
+            }, synchronize_session=False)
+
+        if random.random() < self.purge_probability:
+            self.purge_expired()
+
+    def release(self, key: str):
+        with get_db_session() as session:
+            session.query(IdempotencyKey).filter(
+                IdempotencyKey.key == key,
+                IdempotencyKey.status_code.is_(None)
+            ).delete(synchronize_session=False)
+
+    def purge_expired(self) -> int:
+        """Elimina un lote de registros vencidos"""
+        with get_db_session() as session:
+            keys = [key for (key,) in session.query(IdempotencyKey.key).filter(
+                IdempotencyKey.expires_at <= _utcnow()
+            ).limit(self.purge_batch_size)]
+            if not keys:
+                return 0
+            return session.query(IdempotencyKey).filter(
+                IdempotencyKey.key.in_(keys)
+            ).delete(synchronize_session=False)
+
+_sql_store = SQLIdempotencyStore()
+
+def get_idempotency_store():
+    """Redis si está disponible; si no, la tabla idempotency_keys"""
+    redis_client = get_redis()
+    if redis_client:
+        return RedisIdempotencyStore(redis_client)
+    return _sql_store
+
+def _scoped_key(idempotency_key: str) -> str:
+    """Las claves son por usuario y endpoint: dos clientes no pueden colisionar"""
+    current_user = getattr(request, 'current_user', None)
+    owner = f"user:{current_user.id}" if current_user else f"ip:{request.remote_addr}"
+    raw = f"{owner}|{request.method}|{request.path}|{idempotency_key}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def _fingerprint() -> str:
+    return hashlib.sha256(request.get_data()).hexdigest()
+
+def _replay(record: dict, idempotency_key: str):
+    response = current_app.response_class(
+        record['body'], status=record['status_code'], mimetype=record['content_type']
+    )
+    response.headers[IDEMPOTENCY_HEADER] = idempotency_key
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+def _mismatch():
+    return jsonify({
+        'success': False,
+        'error': 'Idempotency-Key reused with a different request body'
+    }), 422
+
+def idempotent(ttl: int = 86400, lock_ttl: int = 30, wait: float = 5.0, poll_interval: float = 0.05):
+    """
+    Decorador para endpoints de escritura (aplicar debajo de token_required).
+    Sin header Idempotency-Key la vista se ejecuta normalmente. Con header:
+    - si ya hay una respuesta guardada para la clave, se repite sin ejecutar la vista;
+    - si otra request con la misma clave está en curso, se espera hasta `wait`
+      segundos su respuesta y luego se responde 409 con Retry-After;
+    - las respuestas 5xx, 409 y 429 no se guardan para permitir reintentos.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            idempotency_key = request.headers.get(IDEMPOTENCY_HEADER)
+            if not idempotency_key:
+                return f(*args, **kwargs)
+
+            if len(idempotency_key) > MAX_KEY_LENGTH:
+                return jsonify({
+                    'success': False,
+                    'error': f'Idempotency-Key must be at most {MAX_KEY_LENGTH} characters'
+                }), 400
+
+            key = _scoped_key(idempotency_key)
+            fingerprint = _fingerprint()
+
+            try:
+                store = get_idempotency_store()
+                record = store.get(key)
+                if record is None and store.acquire(key, fingerprint, lock_ttl):
+                    # La request anterior pudo guardar su respuesta y soltar el lock
+                    # entre get() y acquire(): releer antes de ejecutar la vista
+                    record = store.get(key)
+                    if record is not None:
+                        store.release(key)
+                elif record is None:
+                    # Duplicado en curso: esperar la respuesta de la primera request
+                    deadline = time.time() + wait
+                    while record is None and time.time() < deadline:
+                        time.sleep(poll_interval)
+                        record = store.get(key)
+                    if record is None:
+                        response = jsonify({
+                            'success': False,
+                            'error': 'A request with this Idempotency-Key is already in progress'
+                        })
+                        response.status_code = 409
+                        response.headers['Retry-After'] = '1'
+                        return response
+            except Exception as e:
+                # Sin almacenamiento disponible se procesa la request sin idempotencia
+                logger.warning(f"Error en almacenamiento de idempotencia: {e}")
+                return f(*args, **kwargs)
+
+            if record is not None:
+                if record['fingerprint'] != fingerprint:
+                    return _mismatch()
+                return _replay(record, idempotency_key)
+
+            try:
+                response = make_response(f(*args, **kwargs))
+            except Exception:
+                store.release(key)
+                raise
+
+            try:
+                if response.status_code < 500 and response.status_code not in _RETRYABLE_STATUSES:
+                    store.save(key, {
+                        'fingerprint': fingerprint,
+                        'status_code': response.status_code,
+                        'body': response.get_data(as_text=True),
+                        'content_type': response.mimetype
+                    }, ttl)
+                else:
+                    store.release(key)
+            except Exception as e:
+                logger.warning(f"Error guardando respuesta idempotente: {e}")
+
+            response.headers[IDEMPOTENCY_HEADER] = idempotency_key
+            return response
+
+        return decorated
+    return decorator
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark de arranque en frío para eCommerce Modular
+Mide en procesos nuevos el tiempo de importar cada módulo, con y sin abrir las conexiones
+"""
+import os
+import sys
+import json
+import statistics
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Módulos que cargan los workers y los scripts de línea de comandos
+DEFAULT_MODULES = [
+    'config.database',
+    'services.auth_service',
+    'services.search_service',
+    'app'
+]
+
+# Se ejecuta en un intérprete nuevo: importa el módulo y, con eager, abre las
+# conexiones como lo hacía el import antes de la inicialización diferida
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+if {eager}:
+    from config.database import warmup
+    warmup()
+    if 'services.search_service' in sys.modules:
+        sys.modules['services.search_service'].search_service.warmup()
+finished = time.perf_counter()
+print(json.dumps({{'import_ms': (imported - started) * 1000, 'total_ms': (finished - started) * 1000}}))
+"""
+
+def measure(module: str, eager: bool = False, repeat: int = 5) -> dict:
+    """Mediana de `repeat` arranques en frío de un módulo"""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [ROOT, os.path.dirname(ROOT), env.get('PYTHONPATH')]))
+
+    samples = []
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, '-c', _PROBE.format(module=module, eager=eager)],
+            cwd=ROOT, env=env, capture_output=True, text=True
+        )
+        if completed.returncode != 0:
+            error = completed.stderr.strip().splitlines()
+            return {'module': module, 'eager': eager, 'error': error[-1] if error else 'unknown error'}
+        samples.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    return {
+        'module': module,
+        'eager': eager,
+        'import_ms': statistics.median(s['import_ms'] for s in samples),
+        'total_ms': statistics.median(s['total_ms'] for s in samples)
+    }
+
+def run_benchmark(modules: list, repeat: int = 5) -> list:
+    """Arranque diferido (solo import) frente a arranque con conexiones por módulo"""
+    results = []
+    for module in modules:
+        results.append(measure(module, eager=False, repeat=repeat))
+        results.append(measure(module, eager=True, repeat=repeat))
+    return results
+
+def main():
+    """Función principal"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark de tiempo de importación en frío')
+    parser.add_argument('modules', nargs='*', default=DEFAULT_MODULES, help='Módulos a medir')
+    parser.add_argument('--repeat', type=int, default=5, help='Arranques por medición (se reporta la mediana)')
+
+    args = parser.parse_args()
+
+    results = run_benchmark(args.modules, args.repeat)
+
+    print(f"{'Módulo':<28} {'Modo':<8} {'import ms':>10} {'total ms':>10}")
+    print("-" * 60)
+    for r in results:
+        mode = 'eager' if r['eager'] else 'lazy'
+        if 'error' in r:
+            print(f"{r['module']:<28} {mode:<8} ❌ {r['error']}")
+            continue
+        print(f"{r['module']:<28} {mode:<8} {r['import_ms']:>10.1f} {r['total_ms']:>10.1f}")
+
+if __name__ == "__main__":
+    main()
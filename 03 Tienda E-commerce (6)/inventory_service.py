@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Servicio de inventario para eCommerce Modular
+Descuentos atómicos de stock por pedido, reservas temporales de carrito y liberación de reservas vencidas
+"""
+import os
+import sys
+import time
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, case, or_, update
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from models.catalog import Product
+from models.orders import InventoryReservation
+from services.catalog_version_service import mark_catalog_dirty
+from services.search_sync_service import mark_products_dirty
+from config.database import get_db_session
+
+logger = logging.getLogger(__name__)
+
+class InsufficientInventoryError(Exception):
+    """Uno o más productos no tienen stock suficiente (o no están activos)"""
+
+    def __init__(self, product_ids: List[int]):
+        self.product_ids = product_ids
+        super().__init__(f"Insufficient inventory for products: {product_ids}")
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def merge_quantities(items: Iterable[dict]) -> Dict[int, int]:
+    """Suma las cantidades por producto ([{'product_id', 'quantity'}, ...] -> {product_id: quantity})"""
+    quantities = defaultdict(int)
+    for item in items:
+        quantities[item['product_id']] += item['quantity']
+    return dict(quantities)
+
+class InventoryService:
+    """
+    Todas las variaciones de stock se aplican con un único UPDATE condicional
+    por operación: la condición inventory_quantity >= cantidad se evalúa en la
+    misma sentencia que descuenta, así que no hay lectura previa ni FOR UPDATE
+    sobre products y los bloqueos de fila duran solo hasta el commit.
+    """
+
+    def __init__(self, reservation_ttl: int = 900, sweep_batch_size: int = 500):
+        self.reservation_ttl = reservation_ttl
+        self.sweep_batch_size = sweep_batch_size
+
+    def apply_deltas(self, session, deltas: Dict[int, int]):
+        """
+        Descuenta deltas positivos y repone deltas negativos en una sola sentencia.
+        Si algún descuento no es posible no se modifica ninguna fila y se lanza
+        InsufficientInventoryError; los productos sin track_inventory no cambian.
+        """
+        deltas = {product_id: delta for product_id, delta in deltas.items() if delta}
+        if not deltas:
+            return
+
+        delta = case(deltas, value=Product.id)
+        stmt = (
+            update(Product)
+            .where(
+                Product.id.in_(sorted(deltas)),
+                or_(
+                    delta < 0,
+                    and_(
+                        Product.is_active == True,
+                        or_(Product.track_inventory == False, Product.inventory_quantity >= delta)
+                    )
+                )
+            )
+            .values(inventory_quantity=case(
+                (Product.track_inventory == True, Product.inventory_quantity - delta),
+                else_=Product.inventory_quantity
+            ))
+            .execution_options(synchronize_session=False)
+        )
+
+        # Savepoint: si falta stock se deshace la sentencia completa y el resto
+        # de la transacción del llamador queda intacto
+        savepoint = session.begin_nested()
+        # Los dialectos MySQL de SQLAlchemy usan CLIENT_FOUND_ROWS: rowcount son filas coincidentes
+        matched = session.execute(stmt).rowcount
+        if matched != len(deltas):
+            savepoint.rollback()
+            raise InsufficientInventoryError(self._unavailable(session, deltas))
+        savepoint.commit()
+
+        # inventory_quantity forma parte de las respuestas del catálogo y del índice de búsqueda
+        mark_catalog_dirty(session)
+        mark_products_dirty(session, deltas)
+
+    def _unavailable(self, session, deltas: Dict[int, int]) -> List[int]:
+        """Productos que hicieron fallar el descuento (lectura sin bloqueo, solo para el error)"""
+        rows = session.query(
+            Product.id, Product.is_active, Product.track_inventory, Product.inventory_quantity
+        ).filter(Product.id.in_(list(deltas))).all()
+        found = {row.id: row for row in rows}
+        unavailable = []
+        for product_id, delta in deltas.items():
+            row = found.get(product_id)
+            if delta <= 0:
+                continue
+            if row is None or not row.is_active or (row.track_inventory and row.inventory_quantity < delta):
+                unavailable.append(product_id)
+        return sorted(unavailable)
+
+    def restock(self, session, quantities: Dict[int, int]):
+        """
+        Repone stock (p. ej. al cancelar un pedido). Los productos que ya no
+        existen se omiten: no hay fila que reponer y la cancelación o liberación
+        del resto no debe fallar por ellos.
+        """
+        quantities = {product_id: quantity for product_id, quantity in quantities.items() if quantity}
+        if not quantities:
+            return
+        existing = {row.id for row in session.query(Product.id).filter(Product.id.in_(list(quantities))).all()}
+        missing = sorted(set(quantities) - existing)
+        if missing:
+            logger.warning(f"Reposición omitida para productos inexistentes: {missing}")
+        self.apply_deltas(session, {
+            product_id: -quantity for product_id, quantity in quantities.items() if product_id in existing
+        })
+
+    def _locked_reservations(self, session, cart_ids: List[int], product_ids: Optional[Iterable[int]] = None):
+        query = session.query(InventoryReservation).filter(InventoryReservation.cart_id.in_(cart_ids))
+        if product_ids is not None:
+            query = query.filter(InventoryReservation.product_id.in_(list(product_ids)))
+        return query.order_by(InventoryReservation.id).with_for_update().all()
+
+    def reserve(self, session, cart_id: int, quantities: Dict[int, int],
+                ttl: Optional[int] = None) -> List[InventoryReservation]:
+        """
+        Reserva (o ajusta) las cantidades de un carrito y renueva su vencimiento.
+        Solo se descuenta la diferencia con lo que el carrito ya tenía reservado.
+        """
+        expires_at = _utcnow() + timedelta(seconds=ttl or self.reservation_ttl)
+        existing = {r.product_id: r for r in self._locked_reservations(session, [cart_id], quantities)}
+
+        self.apply_deltas(session, {
+            product_id: quantity - (existing[product_id].quantity if product_id in existing else 0)
+            for product_id, quantity in quantities.items()
+        })
+
+        reservations = []
+        for product_id, quantity in quantities.items():
+            reservation = existing.get(product_id)
+            if reservation is None:
+                reservation = InventoryReservation(cart_id=cart_id, product_id=product_id)
+                session.add(reservation)
+            reservation.quantity = quantity
+            reservation.expires_at = expires_at
+            reservations.append(reservation)
+        return reservations
+
+    def release(self, session, cart_id: int, product_ids: Optional[Iterable[int]] = None) -> int:
+        """Libera las reservas de un carrito (todas o las de product_ids) y repone el stock"""
+        reservations = self._locked_reservations(session, [cart_id], product_ids)
+        if not reservations:
+            return 0
+        self.restock(session, merge_quantities(
+            {'product_id': r.product_id, 'quantity': r.quantity} for r in reservations
+        ))
+        for reservation in reservations:
+            session.delete(reservation)
+        return len(reservations)
+
+    def commit_order(self, session, quantities: Dict[int, int], cart_ids: Optional[List[int]] = None):
+        """
+        Descuenta el stock de un pedido en una sola sentencia.
+        Las reservas de cart_ids sobre esos productos se consumen: lo reservado
+        ya estaba descontado y un excedente reservado vuelve al stock.
+        """
+        held = {}
+        if cart_ids:
+            reservations = self._locked_reservations(session, cart_ids, quantities)
+            held = merge_quantities({'product_id': r.product_id, 'quantity': r.quantity} for r in reservations)
+            for reservation in reservations:
+                session.delete(reservation)
+
+        self.apply_deltas(session, {
+            product_id: quantity - held.get(product_id, 0)
+            for product_id, quantity in quantities.items()
+        })
+
+    def release_expired(self) -> int:
+        """
+        Libera un lote de reservas vencidas. SKIP LOCKED permite varios
+        barredores en paralelo y no espera reservas que un checkout está consumiendo.
+        """
+        with get_db_session() as session:
+            reservations = session.query(InventoryReservation).filter(
+                InventoryReservation.expires_at <= _utcnow()
+            ).order_by(InventoryReservation.id).limit(self.sweep_batch_size).with_for_update(skip_locked=True).all()
+
+            if not reservations:
+                return 0
+
+            self.restock(session, merge_quantities(
+                {'product_id': r.product_id, 'quantity': r.quantity} for r in reservations
+            ))
+            for reservation in reservations:
+                session.delete(reservation)
+            return len(reservations)
+
+    def sweep(self) -> dict:
+        """Libera todas las reservas vencidas por lotes"""
+        started = time.time()
+        released = 0
+        while True:
+            batch = self.release_expired()
+            released += batch
+            if batch < self.sweep_batch_size:
+                break
+
+        result = {'released_reservations': released, 'duration_seconds': round(time.time() - started, 3)}
+        if released:
+            logger.info(f"Reservas de inventario liberadas: {result}")
+        return result
+
+# Instancia global del servicio de inventario
+inventory_service = InventoryService()
+
+def main():
+    """Función principal (barredor de reservas vencidas, para cron o como proceso de larga duración)"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Liberación de reservas de inventario vencidas')
+    parser.add_argument('--interval', type=int, default=0,
+                        help='Segundos entre ejecuciones (0 = ejecutar una sola vez)')
+
+    args = parser.parse_args()
+
+    while True:
+        try:
+            result = inventory_service.sweep()
+            print(f"✓ Reservas liberadas: {result}")
+        except Exception as e:
+            print(f"❌ Error liberando reservas: {e}")
+            if not args.interval:
+                raise
+
+        if not args.interval:
+            break
+        time.sleep(args.interval)
+
+if __name__ == "__main__":
+    main()
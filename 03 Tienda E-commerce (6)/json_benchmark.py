@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark de codificación JSON para eCommerce Modular
+Mide el tiempo de codificación por payload de endpoint con cada backend disponible
+"""
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from models.orders import OrderStatus, PaymentStatus
+from utils.json_provider import available_json_backends
+
+def build_product(product_id: int) -> dict:
+    """Producto con la forma de serialize_product (vista full)"""
+    created_at = datetime(2024, 1, 1) + timedelta(hours=product_id)
+    return {
+        'id': product_id,
+        'name': f"Producto de prueba {product_id}",
+        'slug': f"producto-de-prueba-{product_id}",
+        'short_description': 'Descripción corta del producto para el listado',
+        'description': 'Descripción larga del producto. ' * 40,
+        'sku': f"SKU-{product_id:06d}",
+        'price': Decimal('19990.00') + product_id,
+        'compare_price': Decimal('24990.00'),
+        'cost_price': Decimal('12000.00'),
+        'inventory_quantity': product_id % 50,
+        'category_id': product_id % 12,
+        'brand_id': product_id % 7,
+        'is_active': True,
+        'is_featured': product_id % 5 == 0,
+        'weight': Decimal('1.250'),
+        'meta_title': None,
+        'meta_description': None,
+        'created_at': created_at,
+        'updated_at': created_at,
+        'category': {'id': product_id % 12, 'name': 'Electrónica', 'slug': 'electronica'},
+        'brand': {'id': product_id % 7, 'name': 'Marca', 'slug': 'marca'},
+        'images': [
+            {'id': product_id * 10 + i, 'image_url': f"/uploads/products/{product_id}-{i}.jpg",
+             'alt_text': None, 'is_primary': i == 0, 'sort_order': i}
+            for i in range(4)
+        ],
+        'review_stats': {'average_rating': 4.35, 'review_count': 17}
+    }
+
+def build_card(product_id: int) -> dict:
+    """Producto con la forma de serialize_product_card"""
+    product = build_product(product_id)
+    card = {key: product[key] for key in (
+        'id', 'name', 'slug', 'short_description', 'sku', 'price', 'compare_price',
+        'inventory_quantity', 'is_featured', 'category_id', 'brand_id', 'review_stats',
+        'created_at', 'category', 'brand'
+    )}
+    card['image_url'] = product['images'][0]['image_url']
+    return card
+
+def build_order(order_id: int, items: int = 8) -> dict:
+    """Pedido con la forma de serialize_order (con items y pagos)"""
+    created_at = datetime(2024, 6, 1, 12, 30)
+    return {
+        'id': order_id,
+        'order_number': f"ORD-{order_id:08d}",
+        'user_id': 42,
+        'status': OrderStatus.PROCESSING,
+        'subtotal': Decimal('159920.00'),
+        'tax_amount': Decimal('30384.80'),
+        'shipping_amount': Decimal('3990.00'),
+        'discount_amount': None,
+        'total_amount': Decimal('194294.80'),
+        'currency': 'CLP',
+        'notes': None,
+        'created_at': created_at,
+        'updated_at': created_at,
+        'items': [
+            {'id': i, 'product_id': i, 'quantity': 2,
+             'unit_price': Decimal('9995.00'), 'total_price': Decimal('19990.00'),
+             'product': {'id': i, 'name': f"Producto {i}", 'sku': f"SKU-{i:06d}", 'image_url': None}}
+            for i in range(items)
+        ],
+        'payments': [
+            {'id': 1, 'payment_method': 'webpay', 'amount': Decimal('194294.80'),
+             'status': PaymentStatus.COMPLETED, 'transaction_id': 'TX-1', 'created_at': created_at}
+        ]
+    }
+
+def build_payloads() -> dict:
+    """Payloads representativos por endpoint"""
+    return {
+        'GET /api/v1/products (20, full)': {
+            'success': True, 'products': [build_product(i) for i in range(20)],
+            'pagination': {'page': 1, 'per_page': 20, 'total': 5000, 'pages': 250}
+        },
+        'GET /api/v1/products (100, full)': {
+            'success': True, 'products': [build_product(i) for i in range(100)],
+            'pagination': {'page': 1, 'per_page': 100, 'total': 5000, 'pages': 50}
+        },
+        'GET /api/v1/products (100, card)': {
+            'success': True, 'products': [build_card(i) for i in range(100)],
+            'pagination': {'page': 1, 'per_page': 100, 'total': 5000, 'pages': 50}
+        },
+        'GET /api/v1/products/<id>': {'success': True, 'product': build_product(1)},
+        'GET /api/v1/orders (20)': {
+            'success': True, 'orders': [build_order(i, items=3) for i in range(20)]
+        },
+        'GET /api/v1/orders/<id>': {'success': True, 'order': build_order(1)}
+    }
+
+def run_benchmark(number: int = 200, repeat: int = 5) -> list:
+    """Mejor tiempo por codificación (µs) de cada backend para cada payload"""
+    backends = available_json_backends()
+    results = []
+    for name, payload in build_payloads().items():
+        for backend_name, dumps in backends.items():
+            size = len(dumps(payload, False, False))
+            best = min(timeit.repeat(lambda: dumps(payload, False, False), number=number, repeat=repeat))
+            results.append({
+                'payload': name,
+                'backend': backend_name,
+                'bytes': size,
+                'microseconds': best / number * 1_000_000
+            })
+    return results
+
+def main():
+    """Función principal"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark de codificación JSON por endpoint')
+    parser.add_argument('--number', type=int, default=200, help='Codificaciones por medición')
+    parser.add_argument('--repeat', type=int, default=5, help='Mediciones (se reporta la mejor)')
+
+    args = parser.parse_args()
+
+    results = run_benchmark(args.number, args.repeat)
+    baseline = {r['payload']: r['microseconds'] for r in results if r['backend'] == 'json'}
+
+    print(f"{'Payload':<36} {'Backend':<8} {'KB':>8} {'µs/encode':>12} {'vs json':>8}")
+    print("-" * 76)
+    for r in results:
+        speedup = baseline[r['payload']] / r['microseconds'] if r['microseconds'] else 0
+        print(f"{r['payload']:<36} {r['backend']:<8} {r['bytes'] / 1024:>8.1f} "
+              f"{r['microseconds']:>12.1f} {speedup:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
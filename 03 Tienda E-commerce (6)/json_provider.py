@@ -0,0 +1,109 @@
+"""
+Codificación JSON de respuestas para eCommerce Modular
+Proveedor JSON de Flask con backend intercambiable (orjson si está instalado, json estándar si no)
+"""
+import json
+import uuid
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Callable, Dict
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional
+    orjson = None
+
+def json_default(obj: Any) -> Any:
+    """Convierte los tipos que devuelven los modelos y que JSON no soporta"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+# Un backend recibe (obj, sort_keys, indent) y devuelve bytes UTF-8
+JSONBackend = Callable[[Any, bool, bool], bytes]
+
+def _dumps_stdlib(obj: Any, sort_keys: bool, indent: bool) -> bytes:
+    return json.dumps(
+        obj,
+        default=json_default,
+        ensure_ascii=False,
+        sort_keys=sort_keys,
+        indent=2 if indent else None,
+        separators=None if indent else (',', ':')
+    ).encode('utf-8')
+
+def _dumps_orjson(obj: Any, sort_keys: bool, indent: bool) -> bytes:
+    # datetime, date, Enum y UUID son nativos en orjson; Decimal pasa por json_default
+    option = orjson.OPT_NON_STR_KEYS
+    if sort_keys:
+        option |= orjson.OPT_SORT_KEYS
+    if indent:
+        option |= orjson.OPT_INDENT_2
+    return orjson.dumps(obj, default=json_default, option=option)
+
+_backends: Dict[str, JSONBackend] = {'json': _dumps_stdlib}
+if orjson is not None:
+    _backends['orjson'] = _dumps_orjson
+
+def register_json_backend(name: str, dumps: JSONBackend):
+    """Registra un backend adicional (por ejemplo, para comparar en el benchmark)"""
+    _backends[name] = dumps
+
+def get_json_backend(name: str = 'auto') -> JSONBackend:
+    """Backend por nombre; 'auto' elige orjson si está disponible"""
+    if name == 'auto':
+        name = 'orjson' if 'orjson' in _backends else 'json'
+    if name not in _backends:
+        raise ValueError(f"Backend JSON no disponible: {name}")
+    return _backends[name]
+
+def available_json_backends() -> Dict[str, JSONBackend]:
+    return dict(_backends)
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Proveedor JSON de la app (app.json).
+    Codifica Decimal, datetime y Enum (OrderStatus, PaymentStatus, ...) sin
+    conversión previa y arma la respuesta directamente con los bytes del
+    backend configurado en JSON_BACKEND.
+    """
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.backend_name = app.config.get('JSON_BACKEND', 'auto')
+        # Ordenar claves cuesta en payloads grandes; se conserva el orden de los serializadores
+        self.sort_keys = app.config.get('JSON_SORT_KEYS', False)
+        self._dumps = get_json_backend(self.backend_name)
+
+    def _indent(self) -> bool:
+        return self.compact is False or (self.compact is None and self._app.debug)
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        # Llamadas directas a app.json.dumps: mismas opciones que json.dumps
+        if kwargs:
+            kwargs.setdefault('default', json_default)
+            kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+            kwargs.setdefault('sort_keys', self.sort_keys)
+            return json.dumps(obj, **kwargs)
+        return self._dumps(obj, self.sort_keys, False).decode('utf-8')
+
+    def loads(self, s, **kwargs: Any) -> Any:
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = self._dumps(obj, self.sort_keys, self._indent())
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
@@ -0,0 +1,493 @@
+"""
+Índice de búsqueda embebido para eCommerce Modular
+Índice invertido en memoria con ranking BM25, filtros y facetas; respaldo cuando Elasticsearch no está disponible
+"""
+import os
+import re
+import sys
+import json
+import math
+import time
+import bisect
+import logging
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from models.catalog import Product, Category, Brand
+from config.database import get_db_session
+from services.search_sync_service import add_commit_listener
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_PATTERN = re.compile(r'\w+')
+
+SPANISH_STOPWORDS = frozenset((
+    'a', 'al', 'con', 'de', 'del', 'e', 'el', 'en', 'la', 'las', 'lo', 'los',
+    'o', 'para', 'por', 'se', 'su', 'sus', 'u', 'un', 'una', 'unas', 'unos', 'y'
+))
+
+# Peso de cada campo en la frecuencia de términos (equivalente a name^3 en Elasticsearch)
+FIELD_WEIGHTS = (
+    ('name', 3.0),
+    ('sku', 3.0),
+    ('brand_name', 1.0),
+    ('category_name', 1.0),
+    ('short_description', 1.0),
+    ('description', 1.0),
+)
+
+# Mismos rangos que la faceta price_ranges de SearchService
+PRICE_RANGES = ((None, 50), (50, 100), (100, 200), (200, 500), (500, None))
+
+SORT_FIELDS = ('price', 'name', 'created_at', 'updated_at', 'inventory_quantity')
+
+SNAPSHOT_VERSION = 2
+
+def fold(text: str) -> str:
+    """Minúsculas y sin tildes (ñ pasa a n, igual que el folding de Elasticsearch)"""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+def stem(token: str) -> str:
+    """Stemmer liviano de español: plurales y vocal final de género"""
+    if len(token) <= 3 or token.isdigit():
+        return token
+    if token.endswith('iones'):
+        token = token[:-5] + 'ion'
+    elif token.endswith('ces') and len(token) > 4:
+        token = token[:-3] + 'z'
+    elif token.endswith('es') and len(token) > 4 and token[-3] not in 'aeiou':
+        token = token[:-2]
+    elif token.endswith('s'):
+        token = token[:-1]
+    if len(token) > 3 and token[-1] in 'aeo':
+        token = token[:-1]
+    return token
+
+def analyze(text: Optional[str], stemming: bool = True) -> List[str]:
+    """Tokens normalizados de un texto"""
+    if not text:
+        return []
+    tokens = [token for token in _TOKEN_PATTERN.findall(fold(text)) if token not in SPANISH_STOPWORDS]
+    return [stem(token) for token in tokens] if stemming else tokens
+
+class _IndexData:
+    """
+    Estado del índice. Una vez publicado no se modifica: las búsquedas lo leen
+    sin lock y refresh() aplica los cambios sobre una copia (copy()) que luego
+    intercambia. La copia es superficial; cada posting se copia recién cuando
+    la copia lo modifica.
+    """
+
+    def __init__(self):
+        self.docs: Dict[int, Dict[str, Any]] = {}
+        self.postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self.doc_terms: Dict[int, Dict[str, float]] = {}
+        self.doc_len: Dict[int, float] = {}
+        self.total_len = 0.0
+        self.watermark = None   # mayor updated_at visto
+        self.watermark_ids = set()   # productos ya aplicados con updated_at == watermark
+        self.vocabulary: Optional[List[str]] = None
+        self._shared_terms = frozenset()   # postings compartidos con el índice del que se copió
+
+    def copy(self) -> '_IndexData':
+        data = _IndexData()
+        data.docs = dict(self.docs)
+        data.postings = defaultdict(dict, self.postings)
+        data.doc_terms = dict(self.doc_terms)
+        data.doc_len = dict(self.doc_len)
+        data.total_len = self.total_len
+        data.watermark = self.watermark
+        data.watermark_ids = set(self.watermark_ids)
+        data.vocabulary = self.vocabulary
+        data._shared_terms = set(self.postings)
+        return data
+
+    def _own_posting(self, term: str) -> Dict[int, float]:
+        """Posting modificable de `term` (copia el compartido con el índice publicado)"""
+        if term in self._shared_terms:
+            self._shared_terms.discard(term)
+            self.postings[term] = dict(self.postings[term])
+        return self.postings[term]
+
+    def add(self, doc: Dict[str, Any], text: Dict[str, Optional[str]]):
+        self.remove(doc['id'])
+        terms = Counter()
+        for field, weight in FIELD_WEIGHTS:
+            for token in analyze(text.get(field), stemming=field != 'sku'):
+                terms[token] += weight
+        self.docs[doc['id']] = doc
+        self.doc_terms[doc['id']] = dict(terms)
+        self.doc_len[doc['id']] = sum(terms.values())
+        self.total_len += self.doc_len[doc['id']]
+        for term, frequency in terms.items():
+            if term not in self.postings:
+                self.vocabulary = None
+            self._own_posting(term)[doc['id']] = frequency
+
+    def remove(self, doc_id: int):
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self.docs.pop(doc_id, None)
+        self.total_len -= self.doc_len.pop(doc_id, 0.0)
+        for term in terms:
+            if term in self.postings:
+                posting = self._own_posting(term)
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[term]
+                    self.vocabulary = None
+
+    def prefix_terms(self, prefix: str, limit: int = 50) -> List[str]:
+        if self.vocabulary is None:
+            self.vocabulary = sorted(self.postings)
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        terms = []
+        for term in self.vocabulary[start:start + limit]:
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+        return terms
+
+class LocalSearchIndex:
+    """
+    Índice invertido del catálogo activo en memoria del proceso. Se construye
+    desde SQL al arrancar (o desde un snapshot JSON en disco), aplica
+    enseguida los productos confirmados por este proceso y cada
+    `refresh_interval` segundos los modificados por otros procesos (por
+    updated_at); cada `rebuild_interval` segundos se reconstruye completo para
+    recoger los borrados físicos hechos fuera del proceso.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, refresh_interval: float = 5.0,
+                 rebuild_interval: float = 3600.0, snapshot_path: Optional[str] = None):
+        self.k1 = k1
+        self.b = b
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self.snapshot_path = snapshot_path
+        self._data: Optional[_IndexData] = None
+        self._lock = threading.RLock()
+        self._pending_ids = set()
+        self._thread = None
+        self._pid = None
+
+    def configure(self, config):
+        """Toma la configuración de Flask (LOCAL_SEARCH_REFRESH_INTERVAL, LOCAL_SEARCH_REBUILD_INTERVAL,
+        LOCAL_SEARCH_INDEX_PATH)"""
+        self.refresh_interval = float(config.get('LOCAL_SEARCH_REFRESH_INTERVAL', self.refresh_interval))
+        self.rebuild_interval = float(config.get('LOCAL_SEARCH_REBUILD_INTERVAL', self.rebuild_interval))
+        self.snapshot_path = config.get('LOCAL_SEARCH_INDEX_PATH', self.snapshot_path)
+
+    @property
+    def ready(self) -> bool:
+        return self._data is not None
+
+    # Carga desde SQL
+
+    def _query(self, session):
+        return session.query(
+            Product.id, Product.name, Product.sku, Product.short_description, Product.description,
+            Product.price, Product.compare_price, Product.inventory_quantity, Product.is_featured,
+            Product.is_active, Product.deleted_at, Product.created_at, Product.updated_at,
+            Product.category_id, Category.name.label('category_name'),
+            Product.brand_id, Brand.name.label('brand_name')
+        ).outerjoin(Category, Category.id == Product.category_id) \
+         .outerjoin(Brand, Brand.id == Product.brand_id)
+
+    def _apply_rows(self, data: _IndexData, rows: Iterable) -> int:
+        count = 0
+        for row in rows:
+            count += 1
+            if row.updated_at and (data.watermark is None or row.updated_at > data.watermark):
+                data.watermark = row.updated_at
+                data.watermark_ids = {row.id}
+            elif row.updated_at and row.updated_at == data.watermark:
+                data.watermark_ids.add(row.id)
+            if not row.is_active or row.deleted_at is not None:
+                data.remove(row.id)
+                continue
+            data.add({
+                'id': row.id,
+                'name': row.name,
+                'sku': row.sku,
+                'short_description': row.short_description,
+                'price': float(row.price) if row.price is not None else None,
+                'compare_price': float(row.compare_price) if row.compare_price is not None else None,
+                'inventory_quantity': row.inventory_quantity,
+                'is_featured': row.is_featured,
+                'category_id': row.category_id,
+                'category_name': row.category_name,
+                'brand_id': row.brand_id,
+                'brand_name': row.brand_name,
+                'created_at': row.created_at.isoformat() if row.created_at else None,
+                'updated_at': row.updated_at.isoformat() if row.updated_at else None
+            }, {
+                'name': row.name, 'sku': row.sku, 'brand_name': row.brand_name,
+                'category_name': row.category_name, 'short_description': row.short_description,
+                'description': row.description
+            })
+        return count
+
+    def build(self) -> int:
+        """Reconstruye el índice completo; las búsquedas siguen usando el anterior hasta el intercambio"""
+        started = time.time()
+        data = _IndexData()
+        with get_db_session(readonly=True) as session:
+            rows = self._query(session).filter(
+                Product.is_active == True, Product.deleted_at.is_(None)
+            ).order_by(Product.id).yield_per(1000)
+            self._apply_rows(data, rows)
+        with self._lock:
+            self._data = data
+        logger.info(f"Índice local de búsqueda construido: {len(data.docs)} productos en {time.time() - started:.2f}s")
+        self.save()
+        return len(data.docs)
+
+    def refresh(self) -> int:
+        """Aplica los productos confirmados por este proceso y los modificados desde la marca de agua"""
+        data = self._data
+        if data is None:
+            return 0
+        with self._lock:
+            pending, self._pending_ids = self._pending_ids, set()
+        # Primario: los commits de este proceso podrían no haber llegado aún a la réplica
+        with get_db_session() as session:
+            filters = []
+            if data.watermark is not None:
+                # >= : filas con el mismo updated_at que la marca pueden haberse confirmado después
+                filters.append(Product.updated_at >= data.watermark)
+            # Las filas de la marca ya aplicadas vuelven en cada consulta: sin
+            # descartarlas, cada refresh copiaría el índice completo aunque nada cambie
+            rows = [
+                row for row in self._query(session).filter(*filters).all()
+                if row.id not in data.watermark_ids or row.updated_at != data.watermark
+            ]
+            if pending:
+                rows += self._query(session).filter(Product.id.in_(pending)).all()
+        if not rows and not pending:
+            return 0
+
+        # Copy-on-write: las búsquedas en curso siguen leyendo el índice publicado
+        updated = data.copy()
+        self._apply_rows(updated, rows)
+        # Los pendientes que ya no existen fueron borrados
+        for product_id in pending - {row.id for row in rows}:
+            updated.remove(product_id)
+        with self._lock:
+            if self._data is not data:
+                return 0
+            self._data = updated
+        return len(rows)
+
+    def mark_dirty(self, product_ids: Iterable[int]):
+        """Productos confirmados por este proceso; se aplican en el próximo refresh"""
+        with self._lock:
+            self._pending_ids.update(product_ids)
+
+    # Snapshot en disco
+
+    def save(self) -> bool:
+        """Escribe el snapshot (si LOCAL_SEARCH_INDEX_PATH está configurado)"""
+        data = self._data
+        if not self.snapshot_path or data is None:
+            return False
+        # Un índice publicado no cambia: se serializa sin lock.
+        # Las frecuencias por producto (doc_terms, doc_len) se derivan de postings al cargar
+        snapshot = {
+            'version': SNAPSHOT_VERSION,
+            'docs': list(data.docs.values()),
+            'postings': {term: list(posting.items()) for term, posting in data.postings.items()},
+            'watermark': data.watermark.isoformat() if data.watermark else None,
+            'watermark_ids': sorted(data.watermark_ids)
+        }
+        payload = json.dumps(snapshot, separators=(',', ':'))
+        tmp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(payload)
+            os.replace(tmp_path, self.snapshot_path)
+            return True
+        except OSError as e:
+            logger.warning(f"Error guardando snapshot del índice local: {e}")
+            return False
+
+    def load(self) -> bool:
+        """
+        Carga el snapshot JSON: evita la consulta completa a SQL al arrancar
+        cada worker. Cada proceso arma su propia copia en memoria; el archivo
+        solo contiene datos (nunca se deserializan objetos arbitrarios).
+        """
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return False
+        try:
+            with open(self.snapshot_path, encoding='utf-8') as f:
+                snapshot = json.loads(f.read())
+            if snapshot.get('version') != SNAPSHOT_VERSION:
+                return False
+
+            data = _IndexData()
+            data.docs = {doc['id']: doc for doc in snapshot['docs']}
+            for term, posting in snapshot['postings'].items():
+                data.postings[term] = {doc_id: frequency for doc_id, frequency in posting}
+                for doc_id, frequency in posting:
+                    data.doc_terms.setdefault(doc_id, {})[term] = frequency
+            for doc_id in data.docs:
+                data.doc_terms.setdefault(doc_id, {})
+            data.doc_len = {doc_id: sum(terms.values()) for doc_id, terms in data.doc_terms.items()}
+            data.total_len = sum(data.doc_len.values())
+            data.watermark = datetime.fromisoformat(snapshot['watermark']) if snapshot['watermark'] else None
+            data.watermark_ids = set(snapshot.get('watermark_ids', ()))
+        except Exception as e:
+            logger.warning(f"Snapshot del índice local inválido, se reconstruye: {e}")
+            return False
+
+        with self._lock:
+            self._data = data
+        logger.info(f"Índice local de búsqueda cargado desde {self.snapshot_path}: {len(data.docs)} productos")
+        return True
+
+    # Búsqueda
+
+    def _score(self, data: _IndexData, query: str) -> Dict[int, float]:
+        """Puntaje BM25 de cada producto que contiene algún término (OR, como multi_match)"""
+        weights = Counter(analyze(query))
+        folded = analyze(query, stemming=False)
+        # El último término puede estar incompleto: también cuenta como prefijo
+        if folded and len(folded[-1]) >= 2:
+            for term in data.prefix_terms(folded[-1]):
+                weights[term] = max(weights[term], 0.5)
+
+        total_docs = len(data.docs)
+        avg_len = data.total_len / total_docs if total_docs else 1.0
+        scores = defaultdict(float)
+        for term, query_weight in weights.items():
+            posting = data.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (total_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, frequency in posting.items():
+                norm = self.k1 * (1 - self.b + self.b * data.doc_len[doc_id] / avg_len)
+                scores[doc_id] += query_weight * idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return scores
+
+    def _matches(self, doc: Dict[str, Any], filters: Dict[str, Any]) -> bool:
+        price = doc['price'] or 0.0
+        return not (
+            ('category_id' in filters and doc['category_id'] != int(filters['category_id'])) or
+            ('brand_id' in filters and doc['brand_id'] != int(filters['brand_id'])) or
+            ('price_min' in filters and price < float(filters['price_min'])) or
+            ('price_max' in filters and price > float(filters['price_max'])) or
+            (filters.get('in_stock') and not doc['inventory_quantity']) or
+            ('is_featured' in filters and doc['is_featured'] != filters['is_featured'])
+        )
+
+    def _facets(self, docs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        categories = Counter(doc['category_name'] for doc in docs if doc['category_name'])
+        brands = Counter(doc['brand_name'] for doc in docs if doc['brand_name'])
+        price_ranges = []
+        for low, high in PRICE_RANGES:
+            count = sum(
+                1 for doc in docs
+                if (low is None or (doc['price'] or 0) >= low) and (high is None or (doc['price'] or 0) < high)
+            )
+            price_ranges.append({"from": low, "to": high, "count": count})
+        return {
+            "categories": [{"name": name, "count": count} for name, count in categories.most_common(30)],
+            "brands": [{"name": name, "count": count} for name, count in brands.most_common(30)],
+            "price_ranges": price_ranges
+        }
+
+    def search(
+        self,
+        query: str = None,
+        filters: Dict[str, Any] = None,
+        sort_by: str = None,
+        sort_order: str = 'asc',
+        page: int = 1,
+        page_size: int = 20,
+        include_facets: bool = True
+    ) -> Dict[str, Any]:
+        """Misma forma de respuesta que SearchService.search_products"""
+        data = self._data
+        if data is None:
+            raise RuntimeError("Local search index is not built yet")
+
+        filters = filters or {}
+        # Sin lock: `data` es un índice publicado e inmutable
+        if query and query.strip():
+            scores = self._score(data, query)
+            candidates = [data.docs[doc_id] for doc_id in scores]
+        else:
+            scores = {}
+            candidates = list(data.docs.values())
+        matched = [doc for doc in candidates if self._matches(doc, filters)]
+
+        if sort_by in SORT_FIELDS:
+            present = [doc for doc in matched if doc.get(sort_by) is not None]
+            present.sort(key=lambda doc: doc[sort_by], reverse=sort_order.lower() == 'desc')
+            matched = present + [doc for doc in matched if doc.get(sort_by) is None]
+        elif scores:
+            matched.sort(key=lambda doc: (-scores[doc['id']], doc['id']))
+        else:
+            matched.sort(key=lambda doc: doc['created_at'] or '', reverse=True)
+
+        total = len(matched)
+        start = (page - 1) * page_size
+        products = [
+            {**doc, "score": round(scores[doc['id']], 4)} if scores else dict(doc)
+            for doc in matched[start:start + page_size]
+        ]
+
+        result = {
+            "products": products,
+            "pagination": {
+                "page": page,
+                "page_size": page_size,
+                "total_items": total,
+                "total_pages": (total + page_size - 1) // page_size
+            },
+            "engine": "local"
+        }
+        if include_facets:
+            result["facets"] = self._facets(matched)
+        return result
+
+    # Hilo en segundo plano
+
+    def start(self):
+        """Carga o construye el índice y lo mantiene al día, una vez por proceso (también tras un fork)"""
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='local-search-index', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        last_build = 0.0
+        if self.load():
+            last_build = time.monotonic()
+        while True:
+            try:
+                if not self.ready or time.monotonic() - last_build >= self.rebuild_interval:
+                    self.build()
+                    last_build = time.monotonic()
+                else:
+                    self.refresh()
+            except Exception as e:
+                logger.warning(f"Error actualizando el índice local de búsqueda: {e}")
+            time.sleep(self.refresh_interval)
+
+# Instancia global del índice local
+local_search_index = LocalSearchIndex(snapshot_path=os.getenv('LOCAL_SEARCH_INDEX_PATH') or None)
+
+# Las escrituras confirmadas por este proceso se aplican sin esperar a la marca de agua
+add_commit_listener(local_search_index.mark_dirty)
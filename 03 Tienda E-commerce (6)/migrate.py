@@ -71,6 +71,9 @@ class DatabaseMigrator:
             # Verificar tablas creadas
             self._verify_tables()
             
+            # Columnas nuevas en tablas ya existentes (create_all no altera tablas)
+            self._add_missing_columns()
+            
             # Crear índices adicionales si es necesario
             self._create_additional_indexes()
             
@@ -115,6 +118,33 @@ class DatabaseMigrator:
             if len(created_tables) > 10:
                 print(f"    ... y {len(created_tables) - 10} más")
     
+    def _add_missing_columns(self):
+        """Agrega a las tablas existentes las columnas incorporadas después de su creación"""
+        print("\n🔧 Verificando columnas nuevas...")
+        
+        missing_columns = [
+            # Incrementar token_version revoca todos los tokens emitidos al usuario
+            ('users', 'token_version', "INT NOT NULL DEFAULT 0"),
+        ]
+        
+        try:
+            with self.engine.connect() as conn:
+                for table, column, definition in missing_columns:
+                    exists = conn.execute(text(
+                        "SELECT COUNT(*) FROM INFORMATION_SCHEMA.COLUMNS "
+                        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND COLUMN_NAME = :column"
+                    ), {"table": table, "column": column}).scalar()
+                    if exists:
+                        continue
+                    conn.execute(text(f"ALTER TABLE `{table}` ADD COLUMN `{column}` {definition}"))
+                    print(f"✓ Columna agregada: {table}.{column}")
+                
+                conn.commit()
+                
+        except Exception as e:
+            print(f"❌ Error agregando columnas: {e}")
+            raise
+    
     def _create_additional_indexes(self):
         """Crea índices adicionales para optimización"""
         print("\n🔧 Creando índices adicionales...")
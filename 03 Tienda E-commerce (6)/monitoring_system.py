@@ -220,6 +220,38 @@ class SystemMonitor:
         except Exception as e:
             self.logger.log_event('error', 'database_metrics_error', f'Error collecting database metrics: {str(e)}')
     
+    def collect_pool_metrics(self):
+        """Recopilar métricas del pool de conexiones del backend (por worker que atiende el request)"""
+        try:
+            response = requests.get('http://localhost:5000/api/v1/metrics/pool', timeout=5)
+            data = response.json()
+            
+            pools = []
+            for pool in data.get('pools', []):
+                pools.append({
+                    'pool': pool['pool'],
+                    'size': pool['size'],
+                    'max_overflow': pool['max_overflow'],
+                    'checked_out': pool['checked_out'],
+                    'overflow': pool['overflow'],
+                    'timeouts': pool['timeouts'],
+                    'avg_wait_ms': round(pool['wait_sum_ms'] / pool['wait_count'], 3) if pool['wait_count'] else 0
+                })
+            
+            self.metrics['pool'] = {
+                'timestamp': datetime.utcnow().isoformat(),
+                'pid': data.get('pid'),
+                'pools': pools
+            }
+            
+            self.logger.log_event('info', 'pool_metrics', 'Connection pool metrics collected', **self.metrics['pool'])
+            
+            # Verificar umbrales del pool
+            self._check_pool_thresholds()
+            
+        except Exception as e:
+            self.logger.log_event('error', 'pool_metrics_error', f'Error collecting pool metrics: {str(e)}')
+    
     def _check_system_thresholds(self):
         """Verificar umbrales del sistema y generar alertas"""
         system = self.metrics.get('system', {})
@@ -263,6 +295,19 @@ class SystemMonitor:
             self._create_alert('warning', 'slow_queries', 
                              f"Slow queries detected: {db['slow_queries']}")
     
+    def _check_pool_thresholds(self):
+        """Verificar umbrales del pool de conexiones"""
+        for pool in self.metrics.get('pool', {}).get('pools', []):
+            # Checkouts que agotaron pool_timeout
+            if pool['timeouts'] > 0:
+                self._create_alert('critical', 'db_pool_timeouts',
+                                 f"Pool {pool['pool']}: {pool['timeouts']} checkout timeouts")
+            
+            # Espera media de checkout > 50ms
+            if pool['avg_wait_ms'] > 50:
+                self._create_alert('warning', 'db_pool_wait',
+                                 f"Pool {pool['pool']}: average checkout wait {pool['avg_wait_ms']}ms")
+    
     def _create_alert(self, severity, alert_type, message):
         """Crear alerta"""
         alert = {
@@ -427,6 +472,7 @@ def main():
             monitor.collect_system_metrics()
             monitor.collect_application_metrics()
             monitor.collect_database_metrics()
+            monitor.collect_pool_metrics()
             
             # Analizar logs
             log_files = [
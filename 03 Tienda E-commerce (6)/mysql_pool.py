@@ -0,0 +1,166 @@
+"""
+Pool de conexiones mysql.connector para los backends administrativos
+Conexiones reutilizadas con espera acotada, cursores preparados en el servidor y devolución al terminar el request
+"""
+import os
+import time
+import logging
+import threading
+from typing import Optional
+
+import mysql.connector
+from mysql.connector import pooling
+from mysql.connector.errors import PoolError
+
+logger = logging.getLogger(__name__)
+
+class PoolTimeoutError(Exception):
+    """No se liberó ninguna conexión del pool dentro del timeout"""
+
+class PooledConnection:
+    """
+    Conexión prestada por MySQLPool. cursor() usa por defecto prepared=True
+    (protocolo binario, sentencias preparadas en el servidor); close()
+    cierra sus cursores y devuelve la conexión al pool en lugar de cerrarla.
+    """
+
+    def __init__(self, pool: 'MySQLPool', cnx):
+        self._pool = pool
+        self._cnx = cnx
+        self._cursors = []
+
+    def cursor(self, *args, **kwargs):
+        if not kwargs.get('buffered') and not kwargs.get('raw'):
+            kwargs.setdefault('prepared', self._pool.prepared)
+        cursor = self._cnx.cursor(*args, **kwargs)
+        self._cursors.append(cursor)
+        return cursor
+
+    @property
+    def closed(self) -> bool:
+        return self._cnx is None
+
+    def close(self):
+        """Devuelve la conexión al pool (idempotente)"""
+        if self._cnx is None:
+            return
+        cnx, self._cnx = self._cnx, None
+        try:
+            for cursor in self._cursors:
+                try:
+                    cursor.close()
+                except Exception:
+                    pass
+            if cnx.in_transaction:
+                cnx.rollback()
+            cnx.close()
+        except Exception as e:
+            # La conexión no volvió al pool: se repone el lugar con una nueva
+            logger.warning(f"Conexión descartada al devolverla al pool {self._pool.pool_name}: {e}")
+            self._pool.replace_lost_connection()
+        finally:
+            self._cursors = []
+            self._pool.release_slot()
+
+    def __getattr__(self, name):
+        if self._cnx is None:
+            raise mysql.connector.errors.OperationalError("Connection already returned to the pool")
+        return getattr(self._cnx, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+class MySQLPool:
+    """
+    Envoltorio de mysql.connector.pooling.MySQLConnectionPool:
+    - se crea en el primer checkout (importar el backend no abre conexiones);
+    - un checkout con el pool agotado espera hasta `timeout` segundos en vez
+      de fallar de inmediato con PoolError;
+    - el pool verifica cada conexión con un ping al prestarla y la reconecta
+      si el servidor la cerró (pre-ping);
+    - con init_app, las conexiones que un handler no cerró se devuelven al
+      terminar el request.
+    """
+
+    def __init__(self, db_config: dict, pool_name: str, pool_size: Optional[int] = None,
+                 timeout: Optional[float] = None, prepared: bool = True):
+        self.db_config = dict(db_config)
+        self.pool_name = pool_name
+        size = pool_size or int(os.getenv('DB_POOL_SIZE', '10'))
+        if size > pooling.CNX_POOL_MAXSIZE:
+            logger.warning(f"DB_POOL_SIZE={size} excede el máximo de mysql.connector ({pooling.CNX_POOL_MAXSIZE})")
+            size = pooling.CNX_POOL_MAXSIZE
+        self.pool_size = size
+        self.timeout = timeout if timeout is not None else float(os.getenv('DB_POOL_TIMEOUT', '10'))
+        self.prepared = prepared
+        self._pool = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _get_pool(self) -> pooling.MySQLConnectionPool:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = pooling.MySQLConnectionPool(
+                        pool_name=self.pool_name,
+                        pool_size=self.pool_size,
+                        pool_reset_session=True,
+                        consume_results=True,   # cursores con filas sin leer no bloquean la devolución
+                        autocommit=False,
+                        **self.db_config
+                    )
+        return self._pool
+
+    def get_connection(self) -> PooledConnection:
+        """Presta una conexión; espera hasta `timeout` si todas están en uso"""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeoutError(f"No connection available in pool {self.pool_name} after {self.timeout}s")
+
+        try:
+            pool = self._get_pool()
+            deadline = time.monotonic() + self.timeout
+            while True:
+                try:
+                    cnx = pool.get_connection()
+                    break
+                except PoolError:
+                    # Una devolución en curso todavía no llegó a la cola del pool
+                    if time.monotonic() >= deadline:
+                        raise PoolTimeoutError(f"No connection available in pool {self.pool_name}")
+                    time.sleep(0.01)
+        except Exception:
+            self._slots.release()
+            raise
+
+        connection = PooledConnection(self, cnx)
+        self._track(connection)
+        return connection
+
+    def release_slot(self):
+        self._slots.release()
+
+    def replace_lost_connection(self):
+        try:
+            self._get_pool().add_connection()
+        except Exception as e:
+            logger.warning(f"No se pudo reponer la conexión del pool {self.pool_name}: {e}")
+
+    def _track(self, connection: PooledConnection):
+        """Registra la conexión en el request actual (si lo hay) para devolverla en el teardown"""
+        try:
+            from flask import g, has_request_context
+            if has_request_context():
+                g.setdefault('_mysql_pool_connections', []).append(connection)
+        except ImportError:
+            pass
+
+    def init_app(self, app):
+        """Devuelve al pool las conexiones que el request dejó abiertas"""
+        @app.teardown_request
+        def return_pooled_connections(exc):
+            from flask import g
+            for connection in g.pop('_mysql_pool_connections', []):
+                connection.close()
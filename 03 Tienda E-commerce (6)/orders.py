@@ -231,6 +231,32 @@ class CartItem(Base, TimestampMixin):
     def total_price(self):
         return self.quantity * self.unit_price
 
+class InventoryReservation(Base, TimestampMixin):
+    """Reserva temporal de inventario para un carrito (el stock ya está descontado)"""
+    __tablename__ = 'inventory_reservations'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    cart_id = Column(Integer, ForeignKey('carts.id', ondelete='CASCADE'), nullable=False)
+    product_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    
+    # Relaciones
+    cart = relationship("Cart")
+    product = relationship("Product")
+    
+    # Índices
+    __table_args__ = (
+        Index('idx_inventory_reservations_expires', 'expires_at'),
+        Index('idx_inventory_reservations_product', 'product_id'),
+        UniqueConstraint('cart_id', 'product_id', name='uq_inventory_reservation'),
+        CheckConstraint('quantity > 0', name='ck_inventory_reservation_quantity_positive'),
+    )
+    
+    @hybrid_property
+    def is_expired(self):
+        return self.expires_at <= datetime.now(timezone.utc).replace(tzinfo=None)
+
 # ==============================================
 # MODELOS DE PEDIDOS
 # ==============================================
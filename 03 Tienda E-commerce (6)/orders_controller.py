@@ -14,9 +14,11 @@ import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-from models.orders import Order, OrderItem, OrderStatusHistory, Payment, PaymentRefund, Shipment, ShipmentTracking
+from models.orders import Order, OrderItem, OrderStatusHistory, Payment, PaymentRefund, Shipment, ShipmentTracking, Cart
 from models.catalog import Product, User
 from services.auth_service import token_required, role_required, manager_required, rate_limit
+from services.inventory_service import inventory_service, merge_quantities, InsufficientInventoryError
+from middleware.idempotency import idempotent
 from config.database import get_database_url
 
 # Crear blueprint para pedidos
@@ -45,6 +47,14 @@ class OrderUpdateSchema(Schema):
     status = fields.Str(validate=validate.OneOf(['pending', 'confirmed', 'processing', 'shipped', 'delivered', 'cancelled']))
     notes = fields.Str(validate=validate.Length(max=1000))
 
+class ReservationItemSchema(Schema):
+    product_id = fields.Int(required=True)
+    quantity = fields.Int(required=True, validate=validate.Range(min=1))
+
+class ReservationCreateSchema(Schema):
+    items = fields.List(fields.Nested(ReservationItemSchema), required=True, validate=validate.Length(min=1))
+    ttl = fields.Int(validate=validate.Range(min=60, max=3600), allow_none=True)
+
 class PaymentCreateSchema(Schema):
     order_id = fields.Int(required=True)
     payment_method = fields.Str(required=True, validate=validate.OneOf(['credit_card', 'debit_card', 'paypal', 'bank_transfer', 'cash']))
@@ -57,6 +67,7 @@ class PaymentCreateSchema(Schema):
 order_create_schema = OrderCreateSchema()
 order_update_schema = OrderUpdateSchema()
 payment_create_schema = PaymentCreateSchema()
+reservation_create_schema = ReservationCreateSchema()
 
 def serialize_order(order, include_items=True, include_payments=False, include_shipments=False):
     """Serializa un pedido a diccionario"""
@@ -191,7 +202,7 @@ def get_orders():
         # Construir query
         query = session.query(Order).options(
             joinedload(Order.user),
-            joinedload(Order.items).joinedload(OrderItem.product)
+            joinedload(Order.items).joinedload(OrderItem.product).selectinload(Product.images)
         ).filter(Order.user_id == request.current_user.id)
         
         # Filtrar por estado si se especifica
@@ -262,7 +273,7 @@ def get_order(order_id):
         # Obtener pedido con todas las relaciones
         order = session.query(Order).options(
             joinedload(Order.user),
-            joinedload(Order.items).joinedload(OrderItem.product),
+            joinedload(Order.items).joinedload(OrderItem.product).selectinload(Product.images),
             joinedload(Order.payments),
             joinedload(Order.shipments)
         ).filter_by(id=order_id).first()
@@ -301,6 +312,7 @@ def get_order(order_id):
 
 @orders_bp.route('', methods=['POST'])
 @token_required
+@idempotent()  # Los reintentos con el mismo Idempotency-Key repiten la respuesta original
 @rate_limit(limit=10, window=3600, per='user')  # 10 pedidos por hora por usuario
 def create_order():
     """
@@ -311,6 +323,11 @@ def create_order():
     security:
       - Bearer: []
     parameters:
+      - in: header
+        name: Idempotency-Key
+        type: string
+        required: false
+        description: Clave única por intento de compra; los reintentos devuelven la misma respuesta
       - in: body
         name: order_data
         required: true
@@ -343,7 +360,7 @@ def create_order():
         session = Session()
         
         # Verificar que todos los productos existen y están disponibles
-        product_ids = [item['product_id'] for item in data['items']]
+        product_ids = set(item['product_id'] for item in data['items'])
         products = session.query(Product).filter(
             Product.id.in_(product_ids),
             Product.is_active == True
@@ -359,19 +376,11 @@ def create_order():
         # Crear diccionario de productos para fácil acceso
         products_dict = {p.id: p for p in products}
         
-        # Verificar inventario y calcular precios
+        # Calcular precios (el inventario se descuenta atómicamente antes del commit)
         order_items_data = []
         for item_data in data['items']:
             product = products_dict[item_data['product_id']]
             
-            # Verificar inventario
-            if product.inventory_quantity < item_data['quantity']:
-                session.close()
-                return jsonify({
-                    'success': False,
-                    'error': f'Insufficient inventory for product {product.name}'
-                }), 400
-            
             # Usar precio actual del producto si no se especifica
             unit_price = item_data.get('unit_price', product.price)
             
@@ -414,11 +423,6 @@ def create_order():
             )
             session.add(order_item)
         
-        # Actualizar inventario de productos
-        for item_data in order_items_data:
-            product = products_dict[item_data['product_id']]
-            product.inventory_quantity -= item_data['quantity']
-        
         # Crear historial de estado
         status_history = OrderStatusHistory(
             order_id=order.id,
@@ -427,12 +431,27 @@ def create_order():
         )
         session.add(status_history)
         
+        # Descontar inventario en un solo UPDATE condicional, consumiendo las
+        # reservas del carrito del usuario; es lo último antes del commit para
+        # mantener los bloqueos de fila el menor tiempo posible
+        cart_ids = [cart_id for (cart_id,) in session.query(Cart.id).filter_by(user_id=request.current_user.id)]
+        try:
+            inventory_service.commit_order(session, merge_quantities(order_items_data), cart_ids=cart_ids)
+        except InsufficientInventoryError as e:
+            session.rollback()
+            session.close()
+            names = ', '.join(products_dict[product_id].name for product_id in e.product_ids if product_id in products_dict)
+            return jsonify({
+                'success': False,
+                'error': f'Insufficient inventory for product {names}'
+            }), 400
+        
         session.commit()
         
         # Recargar pedido con relaciones
         order = session.query(Order).options(
             joinedload(Order.user),
-            joinedload(Order.items).joinedload(OrderItem.product)
+            joinedload(Order.items).joinedload(OrderItem.product).selectinload(Product.images)
         ).filter_by(id=order.id).first()
         
         order_data = serialize_order(order, include_items=True)
@@ -524,7 +543,7 @@ def update_order_status(order_id):
         # Recargar pedido
         order = session.query(Order).options(
             joinedload(Order.user),
-            joinedload(Order.items).joinedload(OrderItem.product)
+            joinedload(Order.items).joinedload(OrderItem.product).selectinload(Product.images)
         ).filter_by(id=order_id).first()
         
         order_data = serialize_order(order, include_items=True)
@@ -578,7 +597,7 @@ def cancel_order(order_id):
         session = Session()
         
         order = session.query(Order).options(
-            joinedload(Order.items).joinedload(OrderItem.product)
+            joinedload(Order.items).joinedload(OrderItem.product).selectinload(Product.images)
         ).filter_by(id=order_id).first()
         
         if not order:
@@ -609,8 +628,9 @@ def cancel_order(order_id):
         order.status = 'cancelled'
         
         # Restaurar inventario
-        for item in order.items:
-            item.product.inventory_quantity += item.quantity
+        inventory_service.restock(session, merge_quantities(
+            {'product_id': item.product_id, 'quantity': item.quantity} for item in order.items
+        ))
         
         # Crear historial de estado
         status_history = OrderStatusHistory(
@@ -638,6 +658,145 @@ def cancel_order(order_id):
             'error': 'Internal server error'
         }), 500
 
+@orders_bp.route('/reservations', methods=['POST'])
+@token_required
+@idempotent(ttl=3600)
+@rate_limit(limit=60, window=300, per='user')
+def reserve_inventory():
+    """
+    Reservar inventario para el carrito del usuario
+    ---
+    tags:
+      - Orders
+    security:
+      - Bearer: []
+    parameters:
+      - in: body
+        name: reservation_data
+        required: true
+        schema:
+          type: object
+          properties:
+            items:
+              type: array
+              items:
+                type: object
+                properties:
+                  product_id:
+                    type: integer
+                  quantity:
+                    type: integer
+            ttl:
+              type: integer
+              description: Segundos de validez de la reserva (60-3600)
+    responses:
+      201:
+        description: Reserva creada o renovada
+      400:
+        description: Datos inválidos o inventario insuficiente
+    """
+    try:
+        data = reservation_create_schema.load(request.json)
+        
+        session = Session()
+        
+        cart = session.query(Cart).filter_by(user_id=request.current_user.id).order_by(Cart.id).first()
+        if not cart:
+            cart = Cart(user_id=request.current_user.id)
+            session.add(cart)
+            session.flush()
+        
+        try:
+            reservations = inventory_service.reserve(
+                session, cart.id, merge_quantities(data['items']), ttl=data.get('ttl')
+            )
+        except InsufficientInventoryError as e:
+            session.rollback()
+            session.close()
+            return jsonify({
+                'success': False,
+                'error': 'Insufficient inventory',
+                'product_ids': e.product_ids
+            }), 400
+        
+        session.commit()
+        
+        reservations_data = [
+            {
+                'product_id': reservation.product_id,
+                'quantity': reservation.quantity,
+                'expires_at': reservation.expires_at.isoformat()
+            }
+            for reservation in reservations
+        ]
+        cart_id = cart.id
+        
+        session.close()
+        
+        return jsonify({
+            'success': True,
+            'cart_id': cart_id,
+            'reservations': reservations_data
+        }), 201
+        
+    except ValidationError as e:
+        return jsonify({
+            'success': False,
+            'error': 'Validation error',
+            'details': e.messages
+        }), 400
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': 'Internal server error'
+        }), 500
+
+@orders_bp.route('/reservations', methods=['DELETE'])
+@token_required
+@rate_limit(limit=60, window=300, per='user')
+def release_inventory():
+    """
+    Liberar las reservas de inventario del carrito del usuario
+    ---
+    tags:
+      - Orders
+    security:
+      - Bearer: []
+    parameters:
+      - in: query
+        name: product_id
+        type: integer
+        description: Liberar solo la reserva de este producto
+    responses:
+      200:
+        description: Reservas liberadas
+    """
+    try:
+        product_id = request.args.get('product_id', type=int)
+        
+        session = Session()
+        
+        released = 0
+        for (cart_id,) in session.query(Cart.id).filter_by(user_id=request.current_user.id).all():
+            released += inventory_service.release(
+                session, cart_id, [product_id] if product_id else None
+            )
+        
+        session.commit()
+        session.close()
+        
+        return jsonify({
+            'success': True,
+            'released': released
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': 'Internal server error'
+        }), 500
+
 @orders_bp.route('/admin', methods=['GET'])
 @manager_required
 @rate_limit(limit=100, window=300, per='user')
@@ -682,7 +841,7 @@ def get_all_orders():
         # Construir query
         query = session.query(Order).options(
             joinedload(Order.user),
-            joinedload(Order.items).joinedload(OrderItem.product)
+            joinedload(Order.items).joinedload(OrderItem.product).selectinload(Product.images)
         )
         
         # Aplicar filtros
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Hashing de contraseñas para eCommerce Modular
+bcrypt en un pool acotado con backpressure, costo configurable y calibración por hardware
+"""
+import os
+import re
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from typing import Optional
+
+import bcrypt
+
+logger = logging.getLogger(__name__)
+
+_COST_PATTERN = re.compile(r'^\$2[abxy]?\$(\d{2})\$')
+
+class HasherSaturatedError(Exception):
+    """El pool de hashing está lleno; el cliente debe reintentar más tarde"""
+
+    def __init__(self, retry_after: int):
+        self.retry_after = retry_after
+        super().__init__(f"Password hashing is saturated, retry after {retry_after}s")
+
+def get_cost(hashed: str) -> Optional[int]:
+    """Work factor de un hash bcrypt ($2b$12$... -> 12)"""
+    match = _COST_PATTERN.match(hashed or '')
+    return int(match.group(1)) if match else None
+
+def _gevent_threadpool():
+    """
+    Pool de hilos nativos del hub de gevent si el proceso está parcheado (worker
+    gevent de gunicorn). Con threading parcheado, los hilos de ThreadPoolExecutor
+    son greenlets y bcrypt bloquearía el hub completo.
+    """
+    try:
+        from gevent import monkey
+    except ImportError:
+        return None
+    if not monkey.is_module_patched('threading'):
+        return None
+    import gevent
+    return gevent.get_hub().threadpool
+
+class PasswordHasher:
+    """
+    bcrypt se ejecuta en un ThreadPoolExecutor de `max_workers` hilos (bcrypt
+    libera el GIL), o en el threadpool del hub bajo gevent. Como máximo
+    `max_queue` operaciones esperan turno; más allá se lanza
+    HasherSaturatedError en lugar de ocupar otro hilo del servidor.
+    """
+
+    def __init__(self, rounds: int = 12, max_workers: int = None, max_queue: int = 32,
+                 timeout: float = 10.0):
+        self.rounds = rounds
+        self.max_workers = max_workers or max(1, os.cpu_count() or 1)
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='bcrypt')
+        self._avg_seconds = 0.25  # media móvil del tiempo por hash, para Retry-After
+
+    def _retry_after(self) -> int:
+        """Tiempo estimado para vaciar la cola actual"""
+        return max(1, int(self._avg_seconds * (self.max_queue / self.max_workers + 1) + 0.999))
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherSaturatedError(self._retry_after())
+
+        def task():
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * (time.perf_counter() - started)
+
+        gevent_pool = _gevent_threadpool()
+        if gevent_pool is not None:
+            return self._run_gevent(gevent_pool, task)
+
+        try:
+            future = self._executor.submit(task)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FuturesTimeoutError:
+            raise HasherSaturatedError(self._retry_after())
+
+    def _run_gevent(self, pool, task):
+        """Hilo nativo del hub: el greenlet que espera cede el hub a las demás requests"""
+        import gevent
+
+        if pool.maxsize < self.max_workers:
+            pool.maxsize = self.max_workers
+        try:
+            result = pool.spawn(task)
+        except Exception:
+            self._slots.release()
+            raise
+        result.rawlink(lambda _: self._slots.release())
+        try:
+            return result.get(timeout=self.timeout)
+        except gevent.Timeout:
+            raise HasherSaturatedError(self._retry_after())
+
+    def hash(self, password: str) -> str:
+        """Hashea una contraseña con el costo configurado"""
+        salt = bcrypt.gensalt(rounds=self.rounds)
+        return self._run(bcrypt.hashpw, password.encode('utf-8'), salt).decode('utf-8')
+
+    def verify(self, password: str, hashed: str) -> bool:
+        """Verifica una contraseña contra su hash"""
+        return self._run(bcrypt.checkpw, password.encode('utf-8'), hashed.encode('utf-8'))
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """True si el hash se generó con un costo distinto al configurado"""
+        return get_cost(hashed) != self.rounds
+
+def calibrate(target_ms: float, min_rounds: int = 10, max_rounds: int = 16, samples: int = 3) -> dict:
+    """
+    Mide bcrypt en este hardware y elige el mayor costo cuya mediana no
+    supera target_ms (siempre al menos min_rounds).
+    """
+    password = b'calibration-password'
+    timings = {}
+    chosen = min_rounds
+    for rounds in range(min_rounds, max_rounds + 1):
+        salt = bcrypt.gensalt(rounds=rounds)
+        measured = []
+        for _ in range(samples):
+            started = time.perf_counter()
+            bcrypt.hashpw(password, salt)
+            measured.append((time.perf_counter() - started) * 1000)
+        median = sorted(measured)[len(measured) // 2]
+        timings[rounds] = round(median, 1)
+        if median > target_ms:
+            break
+        chosen = rounds
+
+    return {'rounds': chosen, 'target_ms': target_ms, 'timings_ms': timings}
+
+# Instancia global del hasher (BCRYPT_ROUNDS se obtiene ejecutando este módulo en el hardware de producción)
+password_hasher = PasswordHasher(
+    rounds=int(os.getenv('BCRYPT_ROUNDS', '12')),
+    max_workers=int(os.getenv('BCRYPT_MAX_WORKERS', '0')) or None,
+    max_queue=int(os.getenv('BCRYPT_MAX_QUEUE', '32'))
+)
+
+def main():
+    """Función principal (calibración del work factor)"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Calibración del costo de bcrypt')
+    parser.add_argument('--target-ms', type=float, default=250.0,
+                        help='Latencia objetivo por hash en milisegundos')
+    parser.add_argument('--min-rounds', type=int, default=10, help='Costo mínimo aceptable')
+    parser.add_argument('--max-rounds', type=int, default=16, help='Costo máximo a probar')
+
+    args = parser.parse_args()
+
+    result = calibrate(args.target_ms, args.min_rounds, args.max_rounds)
+    for rounds, ms in result['timings_ms'].items():
+        print(f"  costo {rounds}: {ms} ms")
+    print(f"✓ Costo recomendado para {args.target_ms:.0f} ms: BCRYPT_ROUNDS={result['rounds']}")
+
+if __name__ == "__main__":
+    main()
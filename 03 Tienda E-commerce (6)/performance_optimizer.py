@@ -211,18 +211,20 @@ def cached(timeout=300, key_prefix=''):
         print("   ✅ Sistema de cache Redis implementado")
         
         # 2. Optimizar configuración de SQLAlchemy
-        db_config = """from sqlalchemy import create_engine
+        db_config = """import os
+from sqlalchemy import create_engine
 from sqlalchemy.pool import QueuePool
 from sqlalchemy.orm import sessionmaker
 
 class DatabaseOptimizer:
     @staticmethod
     def create_optimized_engine(database_url):
+        # Mismos valores que DatabaseManager (DB_POOL_SIZE / DB_MAX_OVERFLOW)
         return create_engine(
             database_url,
             poolclass=QueuePool,
-            pool_size=20,
-            max_overflow=30,
+            pool_size=int(os.getenv('DB_POOL_SIZE', '10')),
+            max_overflow=int(os.getenv('DB_MAX_OVERFLOW', '20')),
             pool_pre_ping=True,
             pool_recycle=3600,
             echo=False,
@@ -0,0 +1,201 @@
+"""
+Métricas y dimensionamiento adaptativo del pool de conexiones
+QueuePool instrumentado (espera de checkout, timeouts, ocupación) y controlador de max_overflow por headroom de MySQL
+"""
+import time
+import bisect
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import NullPool, QueuePool
+
+logger = logging.getLogger(__name__)
+
+# Límites superiores (ms) de los buckets del histograma de espera
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+class PoolMetrics:
+    """Histograma de espera por checkout, timeouts y pico de conexiones en uso"""
+
+    def __init__(self, name: str = 'primary'):
+        self.name = name
+        self._lock = threading.Lock()
+        self.bucket_counts = [0] * (len(WAIT_BUCKETS_MS) + 1)  # el último es +Inf
+        self.wait_count = 0
+        self.wait_sum_ms = 0.0
+        self.timeouts = 0
+        self.peak_checked_out = 0
+        self._window = []   # esperas (ms) desde la última lectura del controlador
+        self._window_timeouts = 0
+
+    def observe_wait(self, wait_ms: float, checked_out: int):
+        with self._lock:
+            self.bucket_counts[bisect.bisect_left(WAIT_BUCKETS_MS, wait_ms)] += 1
+            self.wait_count += 1
+            self.wait_sum_ms += wait_ms
+            self.peak_checked_out = max(self.peak_checked_out, checked_out)
+            if len(self._window) < 10000:
+                self._window.append(wait_ms)
+
+    def observe_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+            self._window_timeouts += 1
+
+    def drain_window(self) -> Dict[str, Any]:
+        """Esperas y pico desde la última llamada (para el controlador)"""
+        with self._lock:
+            window, timeouts, peak = self._window, self._window_timeouts, self.peak_checked_out
+            self._window, self._window_timeouts, self.peak_checked_out = [], 0, 0
+        window.sort()
+        p95 = window[min(len(window) - 1, int(len(window) * 0.95))] if window else 0.0
+        return {'checkouts': len(window), 'p95_wait_ms': p95, 'timeouts': timeouts, 'peak_checked_out': peak}
+
+    def snapshot(self, pool: QueuePool) -> Dict[str, Any]:
+        with self._lock:
+            buckets = {}
+            cumulative = 0
+            for bound, count in zip(list(WAIT_BUCKETS_MS) + ['+Inf'], self.bucket_counts):
+                cumulative += count
+                buckets[str(bound)] = cumulative
+            return {
+                'pool': self.name,
+                'size': pool.size(),
+                'max_overflow': pool._max_overflow,
+                'checked_out': pool.checkedout(),
+                'checked_in': pool.checkedin(),
+                'overflow': max(0, pool.overflow()),
+                'timeout_seconds': pool.timeout(),
+                'wait_ms_histogram': buckets,
+                'wait_count': self.wait_count,
+                'wait_sum_ms': round(self.wait_sum_ms, 3),
+                'timeouts': self.timeouts
+            }
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool que mide el tiempo de espera de cada checkout"""
+
+    metrics: Optional[PoolMetrics] = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            if self.metrics is not None:
+                self.metrics.observe_timeout()
+            raise
+        if self.metrics is not None:
+            self.metrics.observe_wait((time.perf_counter() - started) * 1000, self.checkedout())
+        return connection
+
+    def recreate(self):
+        # dispose() recrea el pool: conservar métricas y el max_overflow ajustado
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        pool._max_overflow = self._max_overflow
+        return pool
+
+def instrument(engine, name: str = 'primary') -> PoolMetrics:
+    """Asocia métricas al pool de un engine creado con poolclass=InstrumentedQueuePool"""
+    metrics = PoolMetrics(name)
+    engine.pool.metrics = metrics
+    return metrics
+
+def mysql_connection_headroom(engine) -> Dict[str, int]:
+    """Conexiones abiertas en MySQL (todos los clientes) frente a max_connections"""
+    with engine.connect() as conn:
+        threads = conn.execute(text("SHOW GLOBAL STATUS LIKE 'Threads_connected'")).first()
+        limit = conn.execute(text("SHOW VARIABLES LIKE 'max_connections'")).first()
+    threads_connected, max_connections = int(threads[1]), int(limit[1])
+    return {
+        'threads_connected': threads_connected,
+        'max_connections': max_connections,
+        'headroom': max_connections - threads_connected
+    }
+
+class PoolSizeController:
+    """
+    Ajusta max_overflow del pool entre `min_overflow` y `max_overflow`.
+    Crece `step` conexiones cuando el p95 de espera supera `target_wait_ms` o
+    hubo timeouts, siempre que MySQL conserve al menos `reserve_ratio` de
+    max_connections libres; decrece cuando no hay espera y el pico en uso
+    queda holgado durante `shrink_after` intervalos, o cuando MySQL se queda
+    sin headroom. El headroom se consulta por una conexión propia (NullPool),
+    fuera del pool que dimensiona: con el pool saturado el checkout esperaría
+    pool_timeout, y sus esperas contarían en las métricas que evalúa.
+    """
+
+    def __init__(self, engine, metrics: PoolMetrics, min_overflow: int = 0, max_overflow: int = 50,
+                 step: int = 5, target_wait_ms: float = 20.0, reserve_ratio: float = 0.2,
+                 interval: float = 15.0, shrink_after: int = 4):
+        self.engine = engine
+        self.metrics = metrics
+        self.min_overflow = min_overflow
+        self.max_overflow = max_overflow
+        self.step = step
+        self.target_wait_ms = target_wait_ms
+        self.reserve_ratio = reserve_ratio
+        self.interval = interval
+        self.shrink_after = shrink_after
+        self.decisions: List[Dict[str, Any]] = []
+        self._idle_intervals = 0
+        self._thread = None
+        self._probe_engine = None
+
+    def _set_overflow(self, value: int, reason: str, observed: dict):
+        pool = self.engine.pool
+        value = max(self.min_overflow, min(self.max_overflow, value))
+        if value == pool._max_overflow:
+            return
+        decision = {'from': pool._max_overflow, 'to': value, 'reason': reason, **observed}
+        # QueuePool lee _max_overflow en cada checkout; no requiere recrear el pool
+        pool._max_overflow = value
+        self.decisions = (self.decisions + [decision])[-20:]
+        logger.info(f"Pool {self.metrics.name}: max_overflow {decision['from']} -> {value} ({reason})")
+
+    def tick(self) -> Dict[str, Any]:
+        """Una iteración del controlador"""
+        window = self.metrics.drain_window()
+        if self._probe_engine is None:
+            self._probe_engine = create_engine(self.engine.url, poolclass=NullPool)
+        headroom = mysql_connection_headroom(self._probe_engine)
+        observed = {**window, **headroom}
+        pool = self.engine.pool
+        reserve = int(headroom['max_connections'] * self.reserve_ratio)
+        capacity = pool.size() + pool._max_overflow
+
+        if headroom['headroom'] < reserve:
+            self._idle_intervals = 0
+            self._set_overflow(pool._max_overflow - self.step, 'mysql_headroom_low', observed)
+        elif window['timeouts'] or window['p95_wait_ms'] > self.target_wait_ms:
+            self._idle_intervals = 0
+            if headroom['headroom'] - self.step >= reserve:
+                self._set_overflow(pool._max_overflow + self.step, 'checkout_wait', observed)
+        elif window['peak_checked_out'] <= capacity - 2 * self.step:
+            self._idle_intervals += 1
+            if self._idle_intervals >= self.shrink_after:
+                self._idle_intervals = 0
+                self._set_overflow(pool._max_overflow - self.step, 'idle_capacity', observed)
+        else:
+            self._idle_intervals = 0
+
+        return observed
+
+    def start(self):
+        """Arranca el controlador en un hilo del proceso actual"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name=f'pool-autosize-{self.metrics.name}', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.tick()
+            except Exception as e:
+                logger.warning(f"Error en el ajuste del pool {self.metrics.name}: {e}")
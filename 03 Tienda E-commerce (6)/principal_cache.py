@@ -0,0 +1,270 @@
+"""
+Cache de principales autenticados para eCommerce Modular
+Usuario + roles por user_id y token_version, en proceso y en Redis, con invalidación por pub/sub
+"""
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from models.catalog import User, Role, UserRole
+from config.database import get_redis, get_db_session
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = 'principal:invalidate'
+INVALIDATE_ALL = '*'
+
+# Roles firmados dentro del access token: un fallo de cache solo consulta la fila del usuario
+EMBED_ROLE_CLAIMS = os.getenv('JWT_EMBED_ROLES', 'false').lower() == 'true'
+
+_DATETIME_FIELDS = ('created_at', 'last_login_at')
+
+@dataclass
+class Principal:
+    """Datos del usuario autenticado que usan los decoradores y controladores"""
+    id: int
+    email: str
+    first_name: str
+    last_name: str
+    phone: Optional[str]
+    is_verified: bool
+    token_version: int
+    created_at: Optional[datetime] = None
+    last_login_at: Optional[datetime] = None
+    roles: List[str] = field(default_factory=list)
+
+    @property
+    def full_name(self) -> str:
+        return f"{self.first_name} {self.last_name}"
+
+    def to_json(self) -> str:
+        data = asdict(self)
+        for name in _DATETIME_FIELDS:
+            data[name] = data[name].isoformat() if data[name] else None
+        return json.dumps(data, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, raw: str) -> 'Principal':
+        data = json.loads(raw)
+        for name in _DATETIME_FIELDS:
+            data[name] = datetime.fromisoformat(data[name]) if data[name] else None
+        return cls(**data)
+
+def load_principal(user_id: int, roles: Optional[List[str]] = None) -> Optional[Principal]:
+    """Carga el principal desde la base de datos (roles=None consulta también los roles)"""
+    with get_db_session() as session:
+        user = session.query(User).filter_by(id=user_id, is_active=True).first()
+        if not user:
+            return None
+
+        if roles is None:
+            roles = [name for (name,) in session.query(Role.name).join(UserRole).filter(
+                UserRole.user_id == user_id,
+                Role.is_active == True
+            )]
+
+        return Principal(
+            id=user.id,
+            email=user.email,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            phone=user.phone,
+            is_verified=user.is_verified,
+            token_version=user.token_version or 0,
+            created_at=user.created_at,
+            last_login_at=user.last_login_at,
+            roles=list(roles)
+        )
+
+class PrincipalCache:
+    """
+    Dos niveles: dict en proceso con TTL corto y Redis con TTL más largo.
+    Las escrituras sobre usuarios o roles publican la invalidación para que
+    todos los procesos descarten su copia local; si Redis no está, el TTL
+    local acota cuánto tiempo puede servirse un principal desactualizado.
+    """
+
+    KEY_PREFIX = 'principal'
+
+    def __init__(self, local_ttl: int = 30, redis_ttl: int = 300, max_entries: int = 10000):
+        self.local_ttl = local_ttl
+        self.redis_ttl = redis_ttl
+        self.max_entries = max_entries
+        self._local: Dict[int, Tuple[float, Principal]] = {}
+        self._lock = threading.Lock()
+        self._subscriber = None
+
+    def _redis_key(self, user_id: int) -> str:
+        return f"{self.KEY_PREFIX}:{user_id}"
+
+    def _set_local(self, principal: Principal):
+        with self._lock:
+            if len(self._local) >= self.max_entries:
+                now = time.time()
+                self._local = {k: v for k, v in self._local.items() if v[0] > now}
+                if len(self._local) >= self.max_entries:
+                    self._local.clear()
+            self._local[principal.id] = (time.time() + self.local_ttl, principal)
+
+    def get(self, user_id: int) -> Optional[Principal]:
+        self._ensure_subscriber()
+
+        with self._lock:
+            entry = self._local.get(user_id)
+        if entry and entry[0] > time.time():
+            return entry[1]
+
+        redis_client = get_redis()
+        if redis_client:
+            try:
+                raw = redis_client.get(self._redis_key(user_id))
+                if raw:
+                    principal = Principal.from_json(raw)
+                    self._set_local(principal)
+                    return principal
+            except Exception as e:
+                logger.warning(f"Error leyendo principal desde Redis: {e}")
+        return None
+
+    def set(self, principal: Principal):
+        self._set_local(principal)
+        redis_client = get_redis()
+        if redis_client:
+            try:
+                redis_client.setex(self._redis_key(principal.id), self.redis_ttl, principal.to_json())
+            except Exception as e:
+                logger.warning(f"Error guardando principal en Redis: {e}")
+
+    def _invalidate_local(self, user_ids):
+        with self._lock:
+            if INVALIDATE_ALL in user_ids:
+                self._local.clear()
+                return
+            for user_id in user_ids:
+                self._local.pop(int(user_id), None)
+
+    def invalidate(self, *user_ids):
+        """Descarta los principales indicados (INVALIDATE_ALL = todos) en todos los procesos"""
+        if not user_ids:
+            return
+        self._invalidate_local(user_ids)
+
+        redis_client = get_redis()
+        if not redis_client:
+            return
+        try:
+            if INVALIDATE_ALL in user_ids:
+                keys = list(redis_client.scan_iter(match=f"{self.KEY_PREFIX}:*", count=500))
+            else:
+                keys = [self._redis_key(user_id) for user_id in user_ids]
+            if keys:
+                redis_client.delete(*keys)
+            redis_client.publish(INVALIDATION_CHANNEL, ','.join(str(user_id) for user_id in user_ids))
+        except Exception as e:
+            logger.warning(f"Error invalidando principales en Redis: {e}")
+
+    def _ensure_subscriber(self):
+        """Arranca (una vez por proceso) el hilo que escucha las invalidaciones"""
+        if self._subscriber is not None:
+            return
+        redis_client = get_redis()
+        if not redis_client:
+            return
+        with self._lock:
+            if self._subscriber is not None:
+                return
+            self._subscriber = threading.Thread(
+                target=self._listen, args=(redis_client,), name='principal-invalidation', daemon=True
+            )
+            self._subscriber.start()
+
+    def _listen(self, redis_client):
+        while True:
+            try:
+                pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                # Mensajes perdidos mientras no hubo suscripción: se descarta todo lo local
+                self._invalidate_local([INVALIDATE_ALL])
+                for message in pubsub.listen():
+                    self._invalidate_local(message['data'].split(','))
+            except Exception as e:
+                logger.warning(f"Suscripción de invalidación de principales interrumpida: {e}")
+                time.sleep(1)
+
+# Instancia global de la cache de principales
+principal_cache = PrincipalCache()
+
+def _current_token_version(user_id: int) -> Optional[int]:
+    """token_version vigente del usuario (None si no existe o está inactivo)"""
+    with get_db_session() as session:
+        row = session.query(User.token_version).filter_by(id=user_id, is_active=True).first()
+        return (row[0] or 0) if row else None
+
+def get_principal(user_id: int, token_version: int, claimed_roles: Optional[List[str]] = None) -> Optional[Principal]:
+    """
+    Principal para un token. Si la copia en cache tiene otra token_version se
+    vuelve a cargar desde la base de datos; quien llama compara la versión
+    resultante con la del token para rechazar tokens revocados.
+    """
+    principal = principal_cache.get(user_id)
+    if principal is not None and principal.token_version == token_version:
+        return principal
+
+    roles = claimed_roles if EMBED_ROLE_CLAIMS else None
+    principal = load_principal(user_id, roles=roles)
+    if principal is None:
+        return None
+
+    principal_cache.set(principal)
+    # Una revocación confirmada entre la carga y el set ya invalidó la cache
+    # antes de que escribiéramos: se verifica la versión después del set y,
+    # si cambió, se descarta la copia guardada
+    if _current_token_version(user_id) != principal.token_version:
+        principal_cache.invalidate(user_id)
+        return load_principal(user_id, roles=roles)
+    return principal
+
+# Escrituras ORM sobre usuarios y roles invalidan la cache al confirmar
+@event.listens_for(Session, 'before_flush')
+def _revoke_on_role_change(session, flush_context, instances):
+    """Con roles firmados en el token, un cambio de roles revoca los tokens del usuario"""
+    if not EMBED_ROLE_CLAIMS:
+        return
+    for instance in (*session.new, *session.deleted):
+        if isinstance(instance, UserRole) and instance.user_id:
+            user = session.get(User, instance.user_id)
+            if user is not None:
+                user.token_version = User.token_version + 1
+
+@event.listens_for(Session, 'after_flush')
+def _collect_principal_changes(session, flush_context):
+    changed = set()
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, User) and instance.id:
+            changed.add(instance.id)
+        elif isinstance(instance, UserRole) and instance.user_id:
+            changed.add(instance.user_id)
+        elif isinstance(instance, Role):
+            changed.add(INVALIDATE_ALL)
+    if changed:
+        session.info.setdefault('principal_dirty', set()).update(changed)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_on_commit(session):
+    changed = session.info.pop('principal_dirty', None)
+    if changed:
+        principal_cache.invalidate(*changed)
+
+@event.listens_for(Session, 'after_rollback')
+def _clear_on_rollback(session):
+    session.info.pop('principal_dirty', None)
@@ -0,0 +1,148 @@
+"""
+Servicio de conteo de productos para eCommerce Modular
+Conteos ligeros sobre la tabla products, cacheados en Redis por firma de filtros
+"""
+import os
+import sys
+import json
+import hashlib
+import logging
+from decimal import Decimal
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import func, or_
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from models.catalog import Product
+from config.database import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Parámetros que afectan el total (paginación, orden y cursor no lo cambian)
+COUNT_FILTER_KEYS = ('q', 'category_id', 'brand_id', 'min_price', 'max_price', 'is_featured', 'is_active')
+
+def normalize_search_term(value) -> str:
+    """Término de búsqueda tal como se filtra y se firma (ILIKE no distingue mayúsculas)"""
+    return (value or '').strip().lower()
+
+def apply_product_filters(query, filters: Dict[str, Any]):
+    """Aplica los predicados de filtrado del listado sobre una query de Product"""
+    if filters.get('is_active') is not None:
+        query = query.filter(Product.is_active == filters['is_active'])
+
+    search = normalize_search_term(filters.get('q'))
+    if search:
+        search_term = f"%{search}%"
+        query = query.filter(
+            or_(
+                Product.name.ilike(search_term),
+                Product.description.ilike(search_term),
+                Product.sku.ilike(search_term)
+            )
+        )
+
+    if filters.get('category_id'):
+        query = query.filter(Product.category_id == filters['category_id'])
+
+    if filters.get('brand_id'):
+        query = query.filter(Product.brand_id == filters['brand_id'])
+
+    if filters.get('min_price'):
+        query = query.filter(Product.price >= filters['min_price'])
+
+    if filters.get('max_price'):
+        query = query.filter(Product.price <= filters['max_price'])
+
+    if filters.get('is_featured') is not None:
+        query = query.filter(Product.is_featured == filters['is_featured'])
+
+    return query
+
+class ProductCountService:
+    """Conteos de productos con cache por firma de filtros e invalidación por generación"""
+
+    CACHE_PREFIX = 'product_count'
+    GENERATION_KEY = 'product_count:generation'
+
+    def __init__(self, exact_ttl: int = 300, stale_ttl: int = 3600, approx_cap: int = 1000):
+        self.exact_ttl = exact_ttl      # Vigencia del conteo exacto dentro de una generación
+        self.stale_ttl = stale_ttl      # Vigencia del último valor conocido (modo approx)
+        self.approx_cap = approx_cap    # Tope del conteo acotado en modo approx
+
+    def get_filter_signature(self, filters: Dict[str, Any]) -> str:
+        """Firma normalizada de los filtros que afectan el conteo"""
+        normalized = {}
+        for key in COUNT_FILTER_KEYS:
+            value = filters.get(key)
+            if key == 'q':
+                # El mismo valor que filtra apply_product_filters
+                value = normalize_search_term(value)
+            if value is None or value == '':
+                continue
+            if isinstance(value, Decimal):
+                value = format(value.normalize(), 'f')
+            normalized[key] = value
+
+        raw = json.dumps(normalized, sort_keys=True, default=str)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def count(self, session, filters: Dict[str, Any], approx: bool = False) -> Tuple[Optional[int], bool]:
+        """
+        Retorna (total, es_exacto) para los filtros dados.
+        En modo approx devuelve el último valor conocido o un conteo acotado
+        en vez de recorrer todas las filas que cumplen el filtro. Si el conteo
+        acotado llega a approx_cap el total es desconocido (al menos approx_cap)
+        y se retorna (None, False).
+        """
+        signature = self.get_filter_signature(filters)
+        redis_client = get_redis()
+        cache_key = None
+        last_key = f"{self.CACHE_PREFIX}:last:{signature}"
+
+        if redis_client:
+            try:
+                generation = redis_client.get(self.GENERATION_KEY) or '0'
+                cache_key = f"{self.CACHE_PREFIX}:{generation}:{signature}"
+                cached = redis_client.get(cache_key)
+                if cached is not None:
+                    return int(cached), True
+
+                if approx:
+                    stale = redis_client.get(last_key)
+                    if stale is not None:
+                        return int(stale), False
+            except Exception as e:
+                logger.warning(f"Error leyendo cache de conteos: {e}")
+                cache_key = None
+
+        if approx:
+            bounded_ids = apply_product_filters(session.query(Product.id), filters).limit(self.approx_cap).subquery()
+            total = session.query(func.count()).select_from(bounded_ids).scalar()
+            if total >= self.approx_cap:
+                return None, False
+        else:
+            total = apply_product_filters(session.query(func.count(Product.id)), filters).scalar()
+
+        if redis_client and cache_key:
+            try:
+                pipe = redis_client.pipeline()
+                pipe.setex(cache_key, self.exact_ttl, total)
+                pipe.setex(last_key, self.stale_ttl, total)
+                pipe.execute()
+            except Exception as e:
+                logger.warning(f"Error guardando conteo en cache: {e}")
+
+        return total, True
+
+    def invalidate(self):
+        """Invalida todos los conteos exactos tras una escritura de productos"""
+        redis_client = get_redis()
+        if not redis_client:
+            return
+        try:
+            redis_client.incr(self.GENERATION_KEY)
+        except Exception as e:
+            logger.warning(f"Error invalidando cache de conteos: {e}")
+
+# Instancia global del servicio de conteos
+product_count_service = ProductCountService()
@@ -0,0 +1,186 @@
+"""
+Cache de fragmentos serializados de productos para eCommerce Modular
+LRU en proceso con TTL delante de Redis, versionado por el producto y sus filas relacionadas
+"""
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from config.database import get_redis
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = 'product_fragment:invalidate'
+
+def get_fragment_version(*updated_at) -> Optional[str]:
+    """
+    Versión de un fragmento: el updated_at del producto seguido de las
+    versiones de las filas que también se serializan (categoría, marca e imágenes)
+    """
+    if not updated_at or updated_at[0] is None:
+        return None
+    return '|'.join(
+        value.isoformat() if hasattr(value, 'isoformat') else ('' if value is None else str(value))
+        for value in updated_at
+    )
+
+class ProductFragmentCache:
+    """
+    Cache de dos niveles para el dict serializado de cada producto.
+    Cada entrada guarda la versión con la que se generó (producto, categoría,
+    marca e imágenes); una entrada con otra versión se considera un fallo, así
+    que un cambio en cualquiera de esas filas invalida el fragmento aunque no
+    llegue la invalidación explícita. Las invalidaciones explícitas se
+    publican a todos los procesos y el TTL local acota cuánto puede servirse
+    un fragmento si se pierden.
+    """
+
+    KEY_PREFIX = 'product_fragment'
+
+    def __init__(self, max_entries: int = 5000, redis_ttl: int = 3600, local_ttl: int = 300):
+        self.max_entries = max_entries
+        self.redis_ttl = redis_ttl
+        self.local_ttl = local_ttl
+        self._local = OrderedDict()  # product_id -> (vencimiento, version, data)
+        self._lock = threading.Lock()
+        self._subscriber = None
+
+    def _redis_key(self, product_id: int) -> str:
+        return f"{self.KEY_PREFIX}:{product_id}"
+
+    def _get_local(self, product_id: int, version: Optional[str]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._local.get(product_id)
+            if entry is None:
+                return None
+            if entry[0] <= time.time() or entry[1] != version:
+                del self._local[product_id]
+                return None
+            self._local.move_to_end(product_id)
+            return entry[2]
+
+    def _set_local(self, product_id: int, version: Optional[str], data: Dict[str, Any]):
+        with self._lock:
+            self._local[product_id] = (time.time() + self.local_ttl, version, data)
+            self._local.move_to_end(product_id)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+
+    def get_many(self, keys: Iterable[Tuple[int, Optional[str]]],
+                 load_missing: Callable[[List[int]], Dict[int, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """
+        Obtiene los fragmentos para [(product_id, versión), ...] en el mismo orden
+        (versión de get_fragment_version). Consulta el LRU, luego Redis con un
+        único MGET y finalmente llama a load_missing(ids) para generar los que falten.
+        """
+        self._ensure_subscriber()
+        keys = list(keys)
+        fragments = {}
+        pending = []
+
+        for product_id, version in keys:
+            data = self._get_local(product_id, version)
+            if data is not None:
+                fragments[product_id] = data
+            else:
+                pending.append((product_id, version))
+
+        redis_client = get_redis() if pending else None
+        if redis_client:
+            try:
+                raw_values = redis_client.mget([self._redis_key(product_id) for product_id, _ in pending])
+                still_pending = []
+                for (product_id, version), raw in zip(pending, raw_values):
+                    entry = json.loads(raw) if raw else None
+                    if entry and entry.get('v') == version:
+                        fragments[product_id] = entry['d']
+                        self._set_local(product_id, version, entry['d'])
+                    else:
+                        still_pending.append((product_id, version))
+                pending = still_pending
+            except Exception as e:
+                logger.warning(f"Error leyendo fragmentos desde Redis: {e}")
+
+        if pending:
+            loaded = load_missing([product_id for product_id, _ in pending])
+            self.set_many([
+                (product_id, version, loaded[product_id])
+                for product_id, version in pending if product_id in loaded
+            ])
+            fragments.update(loaded)
+
+        # Copias superficiales: quien llama puede agregar campos sin tocar la cache
+        return [dict(fragments[product_id]) for product_id, _ in keys if product_id in fragments]
+
+    def set_many(self, entries: List[Tuple[int, Optional[str], Dict[str, Any]]]):
+        """Guarda fragmentos [(product_id, version, data), ...] en ambos niveles"""
+        for product_id, version, data in entries:
+            self._set_local(product_id, version, data)
+
+        redis_client = get_redis()
+        if not redis_client or not entries:
+            return
+        try:
+            pipe = redis_client.pipeline()
+            for product_id, version, data in entries:
+                pipe.setex(self._redis_key(product_id), self.redis_ttl,
+                           json.dumps({'v': version, 'd': data}, separators=(',', ':')))
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Error guardando fragmentos en Redis: {e}")
+
+    def _invalidate_local(self, product_ids):
+        with self._lock:
+            for product_id in product_ids:
+                self._local.pop(int(product_id), None)
+
+    def invalidate(self, *product_ids: int):
+        """Elimina los fragmentos de los productos indicados en Redis y en todos los procesos"""
+        self._invalidate_local(product_ids)
+
+        redis_client = get_redis()
+        if not redis_client or not product_ids:
+            return
+        try:
+            redis_client.delete(*[self._redis_key(product_id) for product_id in product_ids])
+            redis_client.publish(INVALIDATION_CHANNEL, ','.join(str(product_id) for product_id in product_ids))
+        except Exception as e:
+            logger.warning(f"Error invalidando fragmentos en Redis: {e}")
+
+    def _ensure_subscriber(self):
+        """Arranca (una vez por proceso) el hilo que escucha las invalidaciones"""
+        if self._subscriber is not None:
+            return
+        redis_client = get_redis()
+        if not redis_client:
+            return
+        with self._lock:
+            if self._subscriber is not None:
+                return
+            self._subscriber = threading.Thread(
+                target=self._listen, args=(redis_client,), name='fragment-invalidation', daemon=True
+            )
+            self._subscriber.start()
+
+    def _listen(self, redis_client):
+        while True:
+            try:
+                pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                # Mensajes perdidos mientras no hubo suscripción: se descarta todo lo local
+                with self._lock:
+                    self._local.clear()
+                for message in pubsub.listen():
+                    self._invalidate_local(message['data'].split(','))
+            except Exception as e:
+                logger.warning(f"Suscripción de invalidación de fragmentos interrumpida: {e}")
+                time.sleep(1)
+
+# Instancia global de la cache de fragmentos
+product_fragment_cache = ProductFragmentCache()
@@ -4,7 +4,11 @@ Endpoints para gestión completa del catálogo de productos
 """
 from flask import Blueprint, request, jsonify
 from marshmallow import Schema, fields, ValidationError, validate
-from sqlalchemy import and_, or_, desc, asc
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+import base64
+import json
+from sqlalchemy import and_, or_, desc, asc, select, func
 from sqlalchemy.orm import sessionmaker, joinedload
 from sqlalchemy import create_engine
 
@@ -13,17 +17,26 @@ import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 from models.catalog import Product, Category, Brand, ProductImage, ProductVariant, Attribute, ProductAttribute
-from models.additional import Review
+from models.additional import Review, ProductReviewStats
 from services.auth_service import token_required, role_required, manager_required, rate_limit
-from config.database import get_database_url
+from services.product_count_service import product_count_service, apply_product_filters
+from services.product_fragment_cache import product_fragment_cache, get_fragment_version
+from services.review_stats_service import serialize_review_stats
+from services.local_search_index import local_search_index
+from middleware.http_cache import conditional_get, register_cache_policy
+from config.database import get_database_url, get_read_session
 
 # Crear blueprint para productos
 products_bp = Blueprint('products', __name__, url_prefix='/api/v1/products')
 
+# Respuestas de lectura cacheables pero siempre revalidadas vía ETag
+register_cache_policy(products_bp, 'public, no-cache')
+
 # Configurar base de datos
 database_url = get_database_url()
 engine = create_engine(database_url)
 Session = sessionmaker(bind=engine)
+# Los endpoints de lectura usan get_read_session(): réplica sana o primario (read-your-writes)
 
 # Esquemas de validación
 class ProductCreateSchema(Schema):
@@ -73,12 +86,67 @@ class ProductSearchSchema(Schema):
     sort_order = fields.Str(validate=validate.OneOf(['asc', 'desc']), missing='asc')
     page = fields.Int(validate=validate.Range(min=1), missing=1)
     per_page = fields.Int(validate=validate.Range(min=1, max=100), missing=20)
+    cursor = fields.Str(validate=validate.Length(max=512))  # Paginación keyset (opaca)
+    count = fields.Str(validate=validate.OneOf(['exact', 'approx']), missing='exact')
+    view = fields.Str(validate=validate.OneOf(['full', 'card']), missing='full')
 
 # Instanciar esquemas
 product_create_schema = ProductCreateSchema()
 product_update_schema = ProductUpdateSchema()
 product_search_schema = ProductSearchSchema()
 
+# Columnas de ordenamiento soportadas y cómo (de)serializar su valor en el cursor
+SORT_FIELDS = {
+    'name': (Product.name, str, str),
+    'price': (Product.price, str, Decimal),
+    'created_at': (Product.created_at, lambda v: v.isoformat(), datetime.fromisoformat),
+}
+
+def get_sort_field(sort_by):
+    """Retorna (columna, serializador, parser) para el campo de ordenamiento"""
+    return SORT_FIELDS.get(sort_by, SORT_FIELDS['created_at'])
+
+def encode_cursor(sort_by, sort_order, product):
+    """Genera un cursor opaco a partir del último producto de la página"""
+    column, dump_value, _ = get_sort_field(sort_by)
+    value = getattr(product, column.key)
+    payload = {
+        's': sort_by,
+        'o': sort_order,
+        'v': dump_value(value) if value is not None else None,
+        'id': product.id
+    }
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, sort_by, sort_order):
+    """Decodifica un cursor y valida que corresponda al ordenamiento actual"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        _, _, load_value = get_sort_field(sort_by)
+        if payload['s'] != sort_by or payload['o'] != sort_order or payload['v'] is None:
+            raise ValueError('Cursor does not match current sort')
+        return load_value(payload['v']), int(payload['id'])
+    except (ValueError, KeyError, TypeError, InvalidOperation, UnicodeError) as e:
+        raise ValidationError({'cursor': ['Invalid cursor']}) from e
+
+def apply_keyset_filter(query, order_field, sort_order, last_value, last_id):
+    """
+    Aplica el filtro de búsqueda por clave (seek) equivalente a
+    (order_field, id) > (last_value, last_id) según la dirección del orden.
+    Evita recorrer y descartar filas como hace OFFSET en páginas profundas.
+    """
+    if sort_order == 'desc':
+        return query.filter(or_(
+            order_field < last_value,
+            and_(order_field == last_value, Product.id < last_id)
+        ))
+    return query.filter(or_(
+        order_field > last_value,
+        and_(order_field == last_value, Product.id > last_id)
+    ))
+
 def serialize_product(product, include_variants=False, include_reviews=False):
     """Serializa un producto a diccionario"""
     data = {
@@ -144,18 +212,150 @@ def serialize_product(product, include_variants=False, include_reviews=False):
             for variant in product.variants
         ]
     
-    # Incluir estadísticas de reseñas si se solicita
+    # Incluir estadísticas de reseñas si se solicita (agregado product_review_stats)
     if include_reviews:
-        # Esto se calcularía en una consulta separada en producción
-        data['review_stats'] = {
-            'average_rating': 4.5,  # Placeholder
-            'review_count': 10      # Placeholder
-        }
+        stats = product.review_stats
+        data['review_stats'] = serialize_review_stats(
+            stats.review_count if stats else 0,
+            stats.rating_sum if stats else 0
+        )
     
     return data
 
+def load_product_fragments(session, product_ids):
+    """Carga y serializa los productos que no están en la cache de fragmentos"""
+    products = session.query(Product).options(
+        joinedload(Product.category),
+        joinedload(Product.brand),
+        joinedload(Product.images)
+    ).filter(Product.id.in_(product_ids)).all()
+    
+    return {product.id: serialize_product(product) for product in products}
+
+# Versiones de las filas relacionadas que forman parte del fragmento serializado
+# (subconsultas correlacionadas por PK o por idx de product_id: no alteran los JOIN de los filtros)
+CATEGORY_VERSION = (
+    select(Category.updated_at)
+    .where(Category.id == Product.category_id)
+    .correlate(Product)
+    .scalar_subquery()
+    .label('category_version')
+)
+
+BRAND_VERSION = (
+    select(Brand.updated_at)
+    .where(Brand.id == Product.brand_id)
+    .correlate(Product)
+    .scalar_subquery()
+    .label('brand_version')
+)
+
+# Cantidad y última modificación: detecta imágenes agregadas, editadas y eliminadas
+IMAGES_VERSION = (
+    select(func.concat(func.count(ProductImage.id), ':', func.coalesce(func.max(ProductImage.updated_at), '')))
+    .where(ProductImage.product_id == Product.id)
+    .correlate(Product)
+    .scalar_subquery()
+    .label('images_version')
+)
+
+def listing_query(session, *columns):
+    """
+    Query de listado: claves del producto, versiones de sus relaciones y su
+    agregado de reseñas en un solo JOIN. El contenido del producto se obtiene
+    después desde la cache de fragmentos.
+    """
+    return session.query(
+        Product.id, Product.updated_at, CATEGORY_VERSION, BRAND_VERSION, IMAGES_VERSION, *columns,
+        ProductReviewStats.review_count, ProductReviewStats.rating_sum
+    ).outerjoin(ProductReviewStats, ProductReviewStats.product_id == Product.id)
+
+# Imagen principal por producto como subconsulta correlacionada (usa idx_product_images_primary)
+PRIMARY_IMAGE_URL = (
+    select(ProductImage.image_url)
+    .where(ProductImage.product_id == Product.id)
+    .order_by(desc(ProductImage.is_primary), asc(ProductImage.sort_order), asc(ProductImage.id))
+    .limit(1)
+    .correlate(Product)
+    .scalar_subquery()
+    .label('image_url')
+)
+
+# Columnas necesarias para renderizar una tarjeta de producto
+CARD_COLUMNS = (
+    Product.id, Product.name, Product.slug, Product.short_description, Product.sku,
+    Product.price, Product.compare_price, Product.inventory_quantity, Product.is_featured,
+    Product.category_id, Product.brand_id, Product.created_at, Product.updated_at,
+    Category.name.label('category_name'), Category.slug.label('category_slug'),
+    Brand.name.label('brand_name'), Brand.slug.label('brand_slug'),
+    PRIMARY_IMAGE_URL
+)
+
+def card_listing_query(session):
+    """
+    Query proyectada para tarjetas: sin description, sin colección de imágenes
+    y sin entidades ORM. Devuelve filas (named tuples) listas para serializar.
+    """
+    return session.query(
+        *CARD_COLUMNS,
+        ProductReviewStats.review_count, ProductReviewStats.rating_sum
+    ).outerjoin(Category, Category.id == Product.category_id) \
+     .outerjoin(Brand, Brand.id == Product.brand_id) \
+     .outerjoin(ProductReviewStats, ProductReviewStats.product_id == Product.id)
+
+def serialize_product_card(row):
+    """Serializa una fila de card_listing_query"""
+    data = {
+        'id': row.id,
+        'name': row.name,
+        'slug': row.slug,
+        'short_description': row.short_description,
+        'sku': row.sku,
+        'price': float(row.price) if row.price else None,
+        'compare_price': float(row.compare_price) if row.compare_price else None,
+        'inventory_quantity': row.inventory_quantity,
+        'is_featured': row.is_featured,
+        'category_id': row.category_id,
+        'brand_id': row.brand_id,
+        'image_url': row.image_url,
+        'review_stats': serialize_review_stats(row.review_count, row.rating_sum),
+        'created_at': row.created_at.isoformat() if row.created_at else None
+    }
+    
+    if row.category_name is not None:
+        data['category'] = {'id': row.category_id, 'name': row.category_name, 'slug': row.category_slug}
+    
+    if row.brand_name is not None:
+        data['brand'] = {'id': row.brand_id, 'name': row.brand_name, 'slug': row.brand_slug}
+    
+    return data
+
+def serialize_listing(session, rows, view='full'):
+    """Serializa filas de listado según la vista solicitada"""
+    if view == 'card':
+        return [serialize_product_card(row) for row in rows]
+    return assemble_products(session, rows)
+
+def assemble_products(session, rows):
+    """Arma la lista serializada a partir de filas de listing_query"""
+    products_data = product_fragment_cache.get_many(
+        [
+            (row.id, get_fragment_version(row.updated_at, row.category_version, row.brand_version, row.images_version))
+            for row in rows
+        ],
+        lambda product_ids: load_product_fragments(session, product_ids)
+    )
+    
+    # Las estadísticas de reseñas cambian sin tocar el producto: no van en el fragmento
+    stats_by_id = {row.id: serialize_review_stats(row.review_count, row.rating_sum) for row in rows}
+    for data in products_data:
+        data['review_stats'] = stats_by_id[data['id']]
+    
+    return products_data
+
 @products_bp.route('', methods=['GET'])
 @rate_limit(limit=100, window=300)  # 100 requests por 5 minutos
+@conditional_get
 def get_products():
     """
     Obtener lista de productos con filtros y búsqueda
@@ -205,6 +405,20 @@ def get_products():
         name: per_page
         type: integer
         description: Productos por página
+      - in: query
+        name: cursor
+        type: string
+        description: Cursor opaco para paginación keyset (vacío para la primera página; usar next_cursor para las siguientes)
+      - in: query
+        name: count
+        type: string
+        enum: [exact, approx]
+        description: Tipo de total en la paginación (approx evita el conteo completo; con más de 1000 resultados omite total y pages e informa total_display "1000+")
+      - in: query
+        name: view
+        type: string
+        enum: [full, card]
+        description: Forma de cada producto (card solo incluye los campos de la tarjeta)
     responses:
       200:
         description: Lista de productos
@@ -222,81 +436,78 @@ def get_products():
         # Validar parámetros de búsqueda
         search_params = product_search_schema.load(request.args)
         
-        session = Session()
-        
-        # Construir query base
-        query = session.query(Product).options(
-            joinedload(Product.category),
-            joinedload(Product.brand),
-            joinedload(Product.images)
-        )
-        
-        # Aplicar filtros
-        if search_params.get('is_active') is not None:
-            query = query.filter(Product.is_active == search_params['is_active'])
-        
-        if search_params.get('q'):
-            search_term = f"%{search_params['q']}%"
-            query = query.filter(
-                or_(
-                    Product.name.ilike(search_term),
-                    Product.description.ilike(search_term),
-                    Product.sku.ilike(search_term)
-                )
-            )
+        session = get_read_session()
         
-        if search_params.get('category_id'):
-            query = query.filter(Product.category_id == search_params['category_id'])
-        
-        if search_params.get('brand_id'):
-            query = query.filter(Product.brand_id == search_params['brand_id'])
-        
-        if search_params.get('min_price'):
-            query = query.filter(Product.price >= search_params['min_price'])
-        
-        if search_params.get('max_price'):
-            query = query.filter(Product.price <= search_params['max_price'])
-        
-        if search_params.get('is_featured') is not None:
-            query = query.filter(Product.is_featured == search_params['is_featured'])
-        
-        # Aplicar ordenamiento
         sort_by = search_params.get('sort_by', 'created_at')
         sort_order = search_params.get('sort_order', 'desc')
+        order_field, _, _ = get_sort_field(sort_by)
         
-        if sort_by == 'name':
-            order_field = Product.name
-        elif sort_by == 'price':
-            order_field = Product.price
-        elif sort_by == 'created_at':
-            order_field = Product.created_at
+        # Construir query base: proyección de tarjeta, o solo claves y el contenido
+        # desde la cache de fragmentos
+        view = search_params.get('view', 'full')
+        if view == 'card':
+            query = card_listing_query(session)
         else:
-            order_field = Product.created_at
+            query = listing_query(session, order_field)
+        
+        # Aplicar filtros
+        query = apply_product_filters(query, search_params)
         
+        # Aplicar ordenamiento
+        # Product.id como desempate: orden estable y requerido por el cursor
         if sort_order == 'desc':
-            query = query.order_by(desc(order_field))
+            query = query.order_by(desc(order_field), desc(Product.id))
         else:
-            query = query.order_by(asc(order_field))
+            query = query.order_by(asc(order_field), asc(Product.id))
         
         # Paginación
         page = search_params.get('page', 1)
         per_page = search_params.get('per_page', 20)
-        
-        total = query.count()
-        products = query.offset((page - 1) * per_page).limit(per_page).all()
+        cursor = search_params.get('cursor')
+        
+        if cursor is not None:
+            # Modo keyset: busca directamente la siguiente página por índice
+            if cursor:
+                last_value, last_id = decode_cursor(cursor, sort_by, sort_order)
+                query = apply_keyset_filter(query, order_field, sort_order, last_value, last_id)
+            
+            products = query.limit(per_page + 1).all()
+            has_next = len(products) > per_page
+            products = products[:per_page]
+            
+            pagination = {
+                'per_page': per_page,
+                'cursor': cursor or None,
+                'next_cursor': encode_cursor(sort_by, sort_order, products[-1]) if has_next else None,
+                'has_next': has_next
+            }
+        else:
+            # Conteo ligero sobre products (sin joins), cacheado por filtros
+            total, total_is_exact = product_count_service.count(
+                session, search_params, approx=search_params.get('count') == 'approx'
+            )
+            # Con un total estimado, la fila extra indica si hay página siguiente
+            products = query.offset((page - 1) * per_page).limit(per_page if total_is_exact else per_page + 1).all()
+            has_next = page * per_page < total if total_is_exact else len(products) > per_page
+            products = products[:per_page]
+            
+            # Información de paginación
+            pagination = {
+                'page': page,
+                'per_page': per_page,
+                'total_is_estimate': not total_is_exact,
+                'has_prev': page > 1,
+                'has_next': has_next
+            }
+            if total is None:
+                # Conteo acotado que llegó al tope: solo se sabe que hay al menos esa cantidad
+                pagination['total_display'] = f"{product_count_service.approx_cap}+"
+            else:
+                pagination['total'] = total
+                pagination['pages'] = (total + per_page - 1) // per_page
         
         # Serializar productos
-        products_data = [serialize_product(product, include_reviews=True) for product in products]
-        
-        # Información de paginación
-        pagination = {
-            'page': page,
-            'per_page': per_page,
-            'total': total,
-            'pages': (total + per_page - 1) // per_page,
-            'has_prev': page > 1,
-            'has_next': page * per_page < total
-        }
+        products_data = serialize_listing(session, products, view)
         
         session.close()
         
@@ -322,6 +533,7 @@ def get_products():
 
 @products_bp.route('/<int:product_id>', methods=['GET'])
 @rate_limit(limit=200, window=300)  # 200 requests por 5 minutos
+@conditional_get
 def get_product(product_id):
     """
     Obtener producto por ID
@@ -340,14 +552,15 @@ def get_product(product_id):
         description: Producto no encontrado
     """
     try:
-        session = Session()
+        session = get_read_session()
         
         product = session.query(Product).options(
             joinedload(Product.category),
             joinedload(Product.brand),
             joinedload(Product.images),
             joinedload(Product.variants),
-            joinedload(Product.attributes)
+            joinedload(Product.attributes),
+            joinedload(Product.review_stats)
         ).filter_by(id=product_id).first()
         
         if not product:
@@ -441,6 +654,8 @@ def create_product():
         product = Product(**data)
         session.add(product)
         session.commit()
+        product_count_service.invalidate()
+        product_fragment_cache.invalidate(product.id)
         
         # Recargar con relaciones
         session.refresh(product)
@@ -526,6 +741,8 @@ def update_product(product_id):
             setattr(product, key, value)
         
         session.commit()
+        product_count_service.invalidate()
+        product_fragment_cache.invalidate(product_id)
         
         # Recargar con relaciones
         product = session.query(Product).options(
@@ -593,6 +810,8 @@ def delete_product(product_id):
         # Soft delete - marcar como inactivo
         product.is_active = False
         session.commit()
+        product_count_service.invalidate()
+        product_fragment_cache.invalidate(product_id)
         
         session.close()
         
@@ -609,6 +828,7 @@ def delete_product(product_id):
 
 @products_bp.route('/featured', methods=['GET'])
 @rate_limit(limit=100, window=300)
+@conditional_get
 def get_featured_products():
     """
     Obtener productos destacados
@@ -620,6 +840,11 @@ def get_featured_products():
         name: limit
         type: integer
         description: Número máximo de productos (default: 10)
+      - in: query
+        name: view
+        type: string
+        enum: [card, full]
+        description: Forma de cada producto (default: full)
     responses:
       200:
         description: Lista de productos destacados
@@ -627,19 +852,19 @@ def get_featured_products():
     try:
         limit = request.args.get('limit', 10, type=int)
         limit = min(limit, 50)  # Máximo 50 productos
+        view = request.args.get('view', 'full')
+        if view not in ('card', 'full'):
+            view = 'full'
         
-        session = Session()
+        session = get_read_session()
         
-        products = session.query(Product).options(
-            joinedload(Product.category),
-            joinedload(Product.brand),
-            joinedload(Product.images)
-        ).filter(
+        query = card_listing_query(session) if view == 'card' else listing_query(session)
+        rows = query.filter(
             Product.is_active == True,
             Product.is_featured == True
         ).order_by(desc(Product.created_at)).limit(limit).all()
         
-        products_data = [serialize_product(product, include_reviews=True) for product in products]
+        products_data = serialize_listing(session, rows, view)
         
         session.close()
         
@@ -657,6 +882,7 @@ def get_featured_products():
 
 @products_bp.route('/search', methods=['GET'])
 @rate_limit(limit=100, window=300)
+@conditional_get
 def search_products():
     """
     Búsqueda avanzada de productos
@@ -682,27 +908,33 @@ def search_products():
                 'error': 'Search query is required'
             }), 400
         
-        session = Session()
-        
-        # Búsqueda full-text (simplificada)
-        search_term = f"%{query_term}%"
-        
-        products = session.query(Product).options(
-            joinedload(Product.category),
-            joinedload(Product.brand),
-            joinedload(Product.images)
-        ).filter(
-            and_(
-                Product.is_active == True,
-                or_(
-                    Product.name.ilike(search_term),
-                    Product.description.ilike(search_term),
-                    Product.sku.ilike(search_term)
+        session = get_read_session()
+        
+        if local_search_index.ready:
+            # Ranking BM25 del índice embebido; las tarjetas salen de la cache de fragmentos
+            hits = local_search_index.search(query_term, page_size=50, include_facets=False)['products']
+            ranked_ids = [hit['id'] for hit in hits]
+            rows_by_id = {
+                row.id: row for row in
+                listing_query(session).filter(Product.id.in_(ranked_ids), Product.is_active == True).all()
+            } if ranked_ids else {}
+            rows = [rows_by_id[product_id] for product_id in ranked_ids if product_id in rows_by_id]
+        else:
+            # El índice aún se está construyendo: búsqueda por subcadena (recorre la tabla)
+            search_term = f"%{query_term}%"
+            
+            rows = listing_query(session).filter(
+                and_(
+                    Product.is_active == True,
+                    or_(
+                        Product.name.ilike(search_term),
+                        Product.description.ilike(search_term),
+                        Product.sku.ilike(search_term)
+                    )
                 )
-            )
-        ).order_by(desc(Product.created_at)).limit(50).all()
+            ).order_by(desc(Product.created_at)).limit(50).all()
         
-        products_data = [serialize_product(product, include_reviews=True) for product in products]
+        products_data = assemble_products(session, rows)
         
         session.close()
         
@@ -0,0 +1,250 @@
+"""
+Rate limiting para eCommerce Modular
+Ventana deslizante (contador) y token bucket con memoria constante por clave, en proceso o en Redis (Lua)
+"""
+import os
+import sys
+import math
+import time
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Dict, List
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from config.database import get_redis
+
+logger = logging.getLogger(__name__)
+
+SLIDING_WINDOW = 'sliding_window'
+TOKEN_BUCKET = 'token_bucket'
+ALGORITHMS = (SLIDING_WINDOW, TOKEN_BUCKET)
+
+@dataclass
+class RateLimitResult:
+    """Resultado de una verificación (los tiempos en segundos enteros, redondeados hacia arriba)"""
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: int
+    retry_after: int = 0
+
+    def headers(self) -> Dict[str, str]:
+        headers = {
+            'X-RateLimit-Limit': str(self.limit),
+            'X-RateLimit-Remaining': str(self.remaining),
+            'X-RateLimit-Reset': str(self.reset_after)
+        }
+        if not self.allowed:
+            headers['Retry-After'] = str(self.retry_after)
+        return headers
+
+def _seconds(ms: float) -> int:
+    return max(0, int(math.ceil(ms / 1000.0)))
+
+def sliding_window_step(state: List[float], now_ms: float, limit: int, window_ms: int):
+    """
+    Contador de ventana deslizante: la ventana anterior pesa en proporción
+    al tramo que aún se solapa. state = [inicio_ventana, actual, anterior].
+    Devuelve (permitido, restantes, reset_ms, retry_ms).
+    """
+    current_window = now_ms - (now_ms % window_ms)
+    if state[0] != current_window:
+        state[2] = state[1] if current_window - state[0] == window_ms else 0
+        state[1] = 0
+        state[0] = current_window
+
+    elapsed = now_ms - current_window
+    estimated = state[2] * (window_ms - elapsed) / window_ms + state[1]
+
+    if estimated + 1 <= limit:
+        state[1] += 1
+        return True, int(limit - estimated - 1), window_ms - elapsed, 0
+
+    if state[2] > 0 and state[1] + 1 <= limit:
+        retry_ms = (estimated + 1 - limit) * window_ms / state[2]
+    else:
+        retry_ms = window_ms - elapsed
+    return False, 0, window_ms - elapsed, retry_ms
+
+def token_bucket_step(state: List[float], now_ms: float, limit: int, window_ms: int):
+    """
+    Token bucket de capacidad `limit` que se rellena por completo en `window_ms`.
+    state = [tokens, última_recarga]. Devuelve (permitido, restantes, reset_ms, retry_ms).
+    """
+    rate = limit / window_ms
+    tokens = min(limit, state[0] + (now_ms - state[1]) * rate)
+    allowed = tokens >= 1
+    if allowed:
+        tokens -= 1
+    state[0] = tokens
+    state[1] = now_ms
+
+    retry_ms = 0 if allowed else (1 - tokens) / rate
+    return allowed, int(tokens), (limit - tokens) / rate, retry_ms
+
+class MemoryBackend:
+    """
+    Estado por proceso: una lista de 3 números por clave. Las claves sin uso
+    por más de su ventana se eliminan en un barrido periódico.
+    """
+
+    def __init__(self, sweep_interval: float = 60.0):
+        self.sweep_interval = sweep_interval
+        self._state = {}  # key -> (expires_at_ms, state)
+        self._lock = threading.Lock()
+        self._next_sweep = 0.0
+
+    def hit(self, algorithm: str, key: str, limit: int, window_ms: int) -> RateLimitResult:
+        now_ms = time.monotonic() * 1000
+        with self._lock:
+            if now_ms >= self._next_sweep:
+                self._sweep(now_ms)
+
+            entry = self._state.get(key)
+            if algorithm == TOKEN_BUCKET:
+                state = entry[1] if entry else [float(limit), now_ms]
+                allowed, remaining, reset_ms, retry_ms = token_bucket_step(state, now_ms, limit, window_ms)
+            else:
+                state = entry[1] if entry else [0, 0, 0]
+                allowed, remaining, reset_ms, retry_ms = sliding_window_step(state, now_ms, limit, window_ms)
+            self._state[key] = (now_ms + 2 * window_ms, state)
+
+        return RateLimitResult(allowed, limit, remaining, _seconds(reset_ms), _seconds(retry_ms))
+
+    def _sweep(self, now_ms: float):
+        """Elimina claves inactivas (llamar con el lock tomado)"""
+        expired = [key for key, (expires_at, _) in self._state.items() if expires_at <= now_ms]
+        for key in expired:
+            del self._state[key]
+        self._next_sweep = now_ms + self.sweep_interval * 1000
+
+    def __len__(self):
+        return len(self._state)
+
+# Mismos algoritmos que sliding_window_step / token_bucket_step, atómicos en Redis.
+# El reloj es el de Redis (TIME), común a todos los workers; replicate_commands
+# permite escribir después de TIME en Redis < 5 (en versiones nuevas no tiene efecto).
+SLIDING_WINDOW_LUA = """
+redis.replicate_commands()
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local current_window = now - (now % window)
+
+local state = redis.call('HMGET', KEYS[1], 'w', 'c', 'p')
+local w = tonumber(state[1]) or current_window
+local c = tonumber(state[2]) or 0
+local p = tonumber(state[3]) or 0
+if w ~= current_window then
+    if current_window - w == window then p = c else p = 0 end
+    c = 0
+    w = current_window
+end
+
+local elapsed = now - current_window
+local estimated = p * (window - elapsed) / window + c
+local allowed = 0
+local remaining = 0
+local retry = 0
+if estimated + 1 <= limit then
+    allowed = 1
+    c = c + 1
+    remaining = math.floor(limit - estimated - 1)
+elseif p > 0 and c + 1 <= limit then
+    retry = math.ceil((estimated + 1 - limit) * window / p)
+else
+    retry = window - elapsed
+end
+
+redis.call('HSET', KEYS[1], 'w', w, 'c', c, 'p', p)
+redis.call('PEXPIRE', KEYS[1], window * 2)
+return {allowed, remaining, window - elapsed, retry}
+"""
+
+TOKEN_BUCKET_LUA = """
+redis.replicate_commands()
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local rate = limit / window
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or limit
+local ts = tonumber(state[2]) or now
+tokens = math.min(limit, tokens + math.max(0, now - ts) * rate)
+
+local allowed = 0
+local retry = 0
+if tokens >= 1 then
+    allowed = 1
+    tokens = tokens - 1
+else
+    retry = math.ceil((1 - tokens) / rate)
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], window * 2)
+return {allowed, math.floor(tokens), math.ceil((limit - tokens) / rate), retry}
+"""
+
+class RedisBackend:
+    """Estado compartido por todos los workers: un hash de 2-3 campos por clave con TTL"""
+
+    KEY_PREFIX = 'ratelimit'
+
+    def __init__(self, redis_client):
+        self.redis = redis_client
+        self._scripts = {
+            SLIDING_WINDOW: redis_client.register_script(SLIDING_WINDOW_LUA),
+            TOKEN_BUCKET: redis_client.register_script(TOKEN_BUCKET_LUA)
+        }
+
+    def hit(self, algorithm: str, key: str, limit: int, window_ms: int) -> RateLimitResult:
+        allowed, remaining, reset_ms, retry_ms = self._scripts[algorithm](
+            keys=[f"{self.KEY_PREFIX}:{key}"], args=[limit, window_ms]
+        )
+        return RateLimitResult(bool(allowed), limit, int(remaining), _seconds(reset_ms), _seconds(retry_ms))
+
+class RateLimiter:
+    """
+    Rate limiter con backend Redis (límites globales entre workers) y respaldo
+    en memoria del proceso si Redis no está disponible o falla.
+    """
+
+    def __init__(self, default_algorithm: str = SLIDING_WINDOW):
+        self.default_algorithm = default_algorithm
+        self.memory = MemoryBackend()
+        self._redis_backend = None
+        self._redis_client = None
+
+    def _backend(self):
+        redis_client = get_redis()
+        if not redis_client:
+            return self.memory
+        if redis_client is not self._redis_client:
+            self._redis_backend = RedisBackend(redis_client)
+            self._redis_client = redis_client
+        return self._redis_backend
+
+    def hit(self, key: str, limit: int, window: int, algorithm: str = None) -> RateLimitResult:
+        """Registra una request para `key` y devuelve si está permitida (window en segundos)"""
+        algorithm = algorithm or self.default_algorithm
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Algoritmo de rate limiting desconocido: {algorithm}")
+
+        key = f"{algorithm}:{key}"
+        window_ms = int(window * 1000)
+        backend = self._backend()
+        if backend is not self.memory:
+            try:
+                return backend.hit(algorithm, key, limit, window_ms)
+            except Exception as e:
+                logger.warning(f"Error en rate limiting con Redis, usando memoria local: {e}")
+        return self.memory.hit(algorithm, key, limit, window_ms)
+
+    def is_allowed(self, key: str, limit: int, window: int) -> bool:
+        """Verifica si una request está permitida"""
+        return self.hit(key, limit, window).allowed
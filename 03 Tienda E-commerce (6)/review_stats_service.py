@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Servicio de estadísticas de reseñas para eCommerce Modular
+Mantiene product_review_stats incrementalmente y lo reconcilia periódicamente
+"""
+import os
+import sys
+import time
+import logging
+
+from sqlalchemy import event, text
+from sqlalchemy.orm.attributes import get_history
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from models.additional import Review
+from config.database import get_db_session
+
+logger = logging.getLogger(__name__)
+
+# Suma deltas de forma atómica; crea la fila si el producto aún no tiene agregado
+UPSERT_DELTA_SQL = text("""
+    INSERT INTO product_review_stats (product_id, review_count, rating_sum, updated_at)
+    VALUES (:product_id, GREATEST(:count_delta, 0), GREATEST(:rating_delta, 0), UTC_TIMESTAMP())
+    ON DUPLICATE KEY UPDATE
+        review_count = GREATEST(review_count + :count_delta, 0),
+        rating_sum = GREATEST(rating_sum + :rating_delta, 0),
+        updated_at = UTC_TIMESTAMP()
+""")
+
+RECONCILE_UPSERT_SQL = text("""
+    INSERT INTO product_review_stats (product_id, review_count, rating_sum, updated_at)
+    SELECT product_id, COUNT(*), SUM(rating), UTC_TIMESTAMP()
+    FROM reviews
+    WHERE is_approved = 1 AND deleted_at IS NULL
+    GROUP BY product_id
+    ON DUPLICATE KEY UPDATE
+        review_count = VALUES(review_count),
+        rating_sum = VALUES(rating_sum),
+        updated_at = VALUES(updated_at)
+""")
+
+RECONCILE_ZERO_SQL = text("""
+    UPDATE product_review_stats s
+    SET s.review_count = 0, s.rating_sum = 0, s.updated_at = UTC_TIMESTAMP()
+    WHERE s.review_count <> 0
+      AND NOT EXISTS (
+        SELECT 1 FROM reviews r
+        WHERE r.product_id = s.product_id AND r.is_approved = 1 AND r.deleted_at IS NULL
+      )
+""")
+
+def serialize_review_stats(review_count, rating_sum):
+    """Serializa el agregado de reseñas para las respuestas de la API"""
+    review_count = review_count or 0
+    return {
+        'average_rating': round((rating_sum or 0) / review_count, 2) if review_count else None,
+        'review_count': review_count
+    }
+
+def _counts(is_approved, deleted_at) -> bool:
+    """Solo las reseñas aprobadas y no eliminadas entran en el agregado"""
+    return bool(is_approved) and deleted_at is None
+
+# Atributos de la reseña que afectan el agregado
+_STATS_ATTRIBUTES = ('rating', 'is_approved', 'deleted_at', 'product_id')
+
+def _previous(target, attribute):
+    """Valor del atributo antes del flush en curso"""
+    history = get_history(target, attribute)
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(target, attribute)
+
+def _apply_delta(connection, product_id, count_delta, rating_delta):
+    if product_id is None or (count_delta == 0 and rating_delta == 0):
+        return
+    connection.execute(UPSERT_DELTA_SQL, {
+        'product_id': product_id,
+        'count_delta': count_delta,
+        'rating_delta': rating_delta
+    })
+
+@event.listens_for(Review, 'after_insert')
+def review_inserted(mapper, connection, target):
+    """Suma la reseña nueva si ya viene aprobada"""
+    if _counts(target.is_approved, target.deleted_at):
+        _apply_delta(connection, target.product_id, 1, target.rating)
+
+@event.listens_for(Review, 'after_update')
+def review_updated(mapper, connection, target):
+    """Aplica aprobación, soft delete o cambio de calificación como deltas"""
+    # Editar el texto u otros campos no toca el agregado
+    if not any(get_history(target, attribute).has_changes() for attribute in _STATS_ATTRIBUTES):
+        return
+
+    old_counts = _counts(_previous(target, 'is_approved'), _previous(target, 'deleted_at'))
+    new_counts = _counts(target.is_approved, target.deleted_at)
+    old_product_id = _previous(target, 'product_id')
+    old_rating = _previous(target, 'rating')
+
+    if old_counts:
+        _apply_delta(connection, old_product_id, -1, -old_rating)
+    if new_counts:
+        _apply_delta(connection, target.product_id, 1, target.rating)
+
+@event.listens_for(Review, 'after_delete')
+def review_deleted(mapper, connection, target):
+    """Resta la reseña eliminada físicamente si estaba contabilizada"""
+    if _counts(_previous(target, 'is_approved'), _previous(target, 'deleted_at')):
+        _apply_delta(connection, _previous(target, 'product_id'), -1, -_previous(target, 'rating'))
+
+def reconcile_review_stats() -> dict:
+    """Recalcula product_review_stats desde reviews para corregir cualquier deriva"""
+    started = time.time()
+    with get_db_session() as session:
+        upserted = session.execute(RECONCILE_UPSERT_SQL).rowcount
+        zeroed = session.execute(RECONCILE_ZERO_SQL).rowcount
+
+    result = {
+        'upserted_rows': upserted,
+        'zeroed_rows': zeroed,
+        'duration_seconds': round(time.time() - started, 3)
+    }
+    logger.info(f"Reconciliación de estadísticas de reseñas: {result}")
+    return result
+
+def main():
+    """Función principal (para cron o como proceso de larga duración)"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Reconciliación de estadísticas de reseñas')
+    parser.add_argument('--interval', type=int, default=0,
+                        help='Segundos entre ejecuciones (0 = ejecutar una sola vez)')
+
+    args = parser.parse_args()
+
+    while True:
+        try:
+            result = reconcile_review_stats()
+            print(f"✓ Estadísticas reconciliadas: {result}")
+        except Exception as e:
+            print(f"❌ Error reconciliando estadísticas: {e}")
+            if not args.interval:
+                raise
+
+        if not args.interval:
+            break
+        time.sleep(args.interval)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Rollups de ventas para el dashboard administrativo
+daily_sales_rollup y product_sales_rollup mantenidos incrementalmente por una sincronización periódica
+"""
+import json
+import time
+import threading
+from datetime import datetime
+
+CANCELLED = 'cancelled'
+
+# Órdenes más nuevas que esto aún pueden tener transacciones con ids menores sin confirmar
+SETTLE_SECONDS = 60
+
+DASHBOARD_QUERY = """
+    SELECT
+        (SELECT COUNT(*) FROM products WHERE status = 'active') AS total_products,
+        (SELECT COUNT(*) FROM users WHERE role = 'customer') AS total_customers,
+        COALESCE(SUM(d.order_count), 0) AS total_orders,
+        COALESCE(SUM(d.gross_sales), 0) AS total_sales,
+        (SELECT JSON_ARRAYAGG(JSON_OBJECT('name', t.name, 'sold', t.units_sold))
+         FROM (SELECT p.name, r.units_sold
+               FROM product_sales_rollup r
+               JOIN products p ON p.id = r.product_id
+               WHERE r.units_sold > 0
+               ORDER BY r.units_sold DESC
+               LIMIT 5) t) AS top_products
+    FROM daily_sales_rollup d
+"""
+
+RECENT_ORDERS_QUERY = """
+    SELECT o.*, u.email as customer_email
+    FROM orders o
+    LEFT JOIN users u ON o.user_id = u.id
+    ORDER BY o.created_at DESC
+    LIMIT 10
+"""
+
+def _json_list(value) -> list:
+    if not value:
+        return []
+    return json.loads(value) if isinstance(value, (str, bytes, bytearray)) else list(value)
+
+def read_dashboard(cursor) -> dict:
+    """Estadísticas del dashboard: totales y más vendidos desde los rollups (cursor con dictionary=True)"""
+    cursor.execute(DASHBOARD_QUERY)
+    row = cursor.fetchone()
+
+    # JSON_ARRAYAGG no garantiza el orden de la subconsulta
+    top_products = sorted(_json_list(row['top_products']), key=lambda p: p['sold'], reverse=True)
+
+    cursor.execute(RECENT_ORDERS_QUERY)
+    recent_orders = cursor.fetchall()
+
+    return {
+        'total_products': row['total_products'],
+        'total_orders': int(row['total_orders']),
+        'total_customers': row['total_customers'],
+        'total_sales': row['total_sales'],
+        'top_products': top_products,
+        'recent_orders': recent_orders
+    }
+
+def _lock_state(cursor, exclusive: bool = False) -> int:
+    """
+    Bloquea la fila de estado y retorna el último order_id incluido en los rollups.
+    Transiciones y catch-up toman primero este lock y luego las órdenes (mismo orden, sin deadlocks).
+    """
+    lock = 'FOR UPDATE' if exclusive else 'LOCK IN SHARE MODE'
+    cursor.execute(f"SELECT last_order_id FROM sales_rollup_state WHERE id = 1 {lock}")
+    row = cursor.fetchone()
+    if row is None:
+        cursor.execute("INSERT IGNORE INTO sales_rollup_state (id, last_order_id) VALUES (1, 0)")
+        cursor.execute(f"SELECT last_order_id FROM sales_rollup_state WHERE id = 1 {lock}")
+        row = cursor.fetchone()
+    return row[0] if isinstance(row, (tuple, list)) else row['last_order_id']
+
+def apply_status_transition(cursor, order_id: int, new_status: str):
+    """
+    Ajusta los rollups para un cambio de estado, en la misma transacción que el
+    UPDATE de la orden. Solo importa entrar o salir de 'cancelled'; las órdenes
+    aún no incluidas por catch_up se cuentan más tarde con su estado final.
+    Retorna el estado anterior (None si la orden no existe).
+    """
+    last_order_id = _lock_state(cursor)
+    cursor.execute("SELECT status, total, DATE(created_at) FROM orders WHERE id = %s FOR UPDATE", (order_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    old_status, total, sales_date = (row if isinstance(row, (tuple, list)) else
+                                     (row['status'], row['total'], row['DATE(created_at)']))
+
+    if order_id > last_order_id or (old_status == CANCELLED) == (new_status == CANCELLED):
+        return old_status
+
+    # +1 al salir de cancelled, -1 al entrar
+    sign = 1 if old_status == CANCELLED else -1
+    cursor.execute("""
+        UPDATE daily_sales_rollup
+        SET gross_sales = gross_sales + %s, cancelled_count = cancelled_count - %s
+        WHERE sales_date = %s
+    """, (sign * (total or 0), sign, sales_date))
+    cursor.execute("""
+        INSERT INTO product_sales_rollup (product_id, units_sold, revenue)
+        SELECT product_id, %s * SUM(quantity), %s * SUM(total_price)
+        FROM order_items WHERE order_id = %s
+        GROUP BY product_id
+        ON DUPLICATE KEY UPDATE
+            units_sold = units_sold + VALUES(units_sold),
+            revenue = revenue + VALUES(revenue)
+    """, (sign, sign, order_id))
+    return old_status
+
+def catch_up(conn, batch_size: int = 1000) -> int:
+    """Incorpora a los rollups un lote de órdenes nuevas (por id); retorna cuántas"""
+    cursor = conn.cursor()
+    try:
+        last_order_id = _lock_state(cursor, exclusive=True)
+        cursor.execute("""
+            SELECT id, created_at < NOW() - INTERVAL %s SECOND FROM orders
+            WHERE id > %s ORDER BY id LIMIT %s
+        """, (SETTLE_SECONDS, last_order_id, batch_size))
+        upper = last_order_id
+        count = 0
+        for order_id, settled in cursor.fetchall():
+            if not settled:
+                break
+            upper = order_id
+            count += 1
+
+        if not count:
+            conn.rollback()
+            return 0
+
+        cursor.execute("""
+            INSERT INTO daily_sales_rollup (sales_date, order_count, cancelled_count, gross_sales)
+            SELECT DATE(created_at), COUNT(*), SUM(status = 'cancelled'),
+                   COALESCE(SUM(CASE WHEN status != 'cancelled' THEN total ELSE 0 END), 0)
+            FROM orders WHERE id > %s AND id <= %s
+            GROUP BY DATE(created_at)
+            ON DUPLICATE KEY UPDATE
+                order_count = order_count + VALUES(order_count),
+                cancelled_count = cancelled_count + VALUES(cancelled_count),
+                gross_sales = gross_sales + VALUES(gross_sales)
+        """, (last_order_id, upper))
+        cursor.execute("""
+            INSERT INTO product_sales_rollup (product_id, units_sold, revenue)
+            SELECT oi.product_id, SUM(oi.quantity), COALESCE(SUM(oi.total_price), 0)
+            FROM order_items oi
+            JOIN orders o ON o.id = oi.order_id
+            WHERE o.id > %s AND o.id <= %s AND o.status != 'cancelled'
+            GROUP BY oi.product_id
+            ON DUPLICATE KEY UPDATE
+                units_sold = units_sold + VALUES(units_sold),
+                revenue = revenue + VALUES(revenue)
+        """, (last_order_id, upper))
+        cursor.execute("UPDATE sales_rollup_state SET last_order_id = %s WHERE id = 1", (upper,))
+        conn.commit()
+        return count
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def sync(conn, batch_size: int = 1000) -> dict:
+    """Incorpora todas las órdenes pendientes por lotes"""
+    started = time.time()
+    processed = 0
+    while True:
+        batch = catch_up(conn, batch_size)
+        processed += batch
+        if batch < batch_size:
+            break
+    return {'orders': processed, 'duration_seconds': round(time.time() - started, 3)}
+
+def start_periodic_sync(get_connection, interval: int, batch_size: int = 1000) -> threading.Thread:
+    """
+    Sincroniza los rollups cada `interval` segundos en un hilo del proceso
+    (el mismo trabajo que --interval). get_connection retorna una conexión
+    nueva del pool o None; el dashboard solo lee y nunca toma el lock de estado.
+    """
+    def run():
+        while True:
+            conn = get_connection()
+            if conn:
+                try:
+                    sync(conn, batch_size)
+                except Exception as e:
+                    print(f"❌ Error sincronizando rollups: {e}")
+                finally:
+                    conn.close()
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name='sales-rollup-sync', daemon=True)
+    thread.start()
+    return thread
+
+def backfill(conn, batch_size: int = 5000) -> dict:
+    """Reconstruye el historial completo: vacía los rollups y los recalcula por lotes"""
+    cursor = conn.cursor()
+    try:
+        _lock_state(cursor, exclusive=True)
+        cursor.execute("DELETE FROM daily_sales_rollup")
+        cursor.execute("DELETE FROM product_sales_rollup")
+        cursor.execute("UPDATE sales_rollup_state SET last_order_id = 0 WHERE id = 1")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return sync(conn, batch_size)
+
+def main():
+    """Función principal (sincronización periódica o reconstrucción del historial)"""
+    import argparse
+    from ecommerce_admin_backend import db_pool
+
+    parser = argparse.ArgumentParser(description='Rollups de ventas del dashboard administrativo')
+    parser.add_argument('--backfill', action='store_true', help='Reconstruir los rollups desde todas las órdenes')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Órdenes por transacción')
+    parser.add_argument('--interval', type=int, default=0,
+                        help='Segundos entre sincronizaciones (0 = ejecutar una sola vez)')
+
+    args = parser.parse_args()
+
+    conn = db_pool.get_connection()
+    try:
+        if args.backfill:
+            result = backfill(conn, args.batch_size)
+            print(f"✓ Rollups reconstruidos: {result}")
+
+        while True:
+            try:
+                result = sync(conn, args.batch_size)
+                print(f"✓ [{datetime.now().isoformat()}] Rollups sincronizados: {result}")
+            except Exception as e:
+                print(f"❌ Error sincronizando rollups: {e}")
+                if not args.interval:
+                    raise
+
+            if not args.interval:
+                break
+            time.sleep(args.interval)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,10 @@ from src.models.catalog import Product, Category, Brand, ProductImage, ProductVa
 from src.middleware.auth_middleware import admin_required, jwt_required
 from sqlalchemy.orm import joinedload
 from src.config.database import db_session
+from src.middleware.http_cache import conditional_get, register_cache_policy
+from src.services.catalog_version_service import bump_catalog_version
+from src.services.search_sync_service import to_search_document, search_document_query
+from src.services.autocomplete_service import autocomplete_service
 import logging
 
 # Configurar logger
@@ -21,7 +25,40 @@ logger = logging.getLogger(__name__)
 # Crear blueprint
 search_bp = Blueprint('search', __name__, url_prefix='/api/search')
 
+# Resultados cacheables pero siempre revalidados vía ETag
+register_cache_policy(search_bp, 'public, no-cache')
+
+# Productos por lote al leer el catálogo para reindexar
+REINDEX_BATCH_SIZE = 500
+
+def _iter_search_documents(batch_size: int = REINDEX_BATCH_SIZE):
+    """
+    Documentos de todo el catálogo leídos por lotes con paginación keyset
+    (id > último id ORDER BY id LIMIT n). Cada lote es una consulta completa
+    y sus relaciones uno-a-muchos se cargan con selectinload en consultas
+    propias, sin cursores en streaming abiertos entre lotes.
+    """
+    last_id = 0
+    while True:
+        batch = search_document_query(db_session).filter(
+            Product.id > last_id
+        ).order_by(Product.id).limit(batch_size).all()
+        if not batch:
+            return
+        
+        for product in batch:
+            yield to_search_document(product)
+        
+        last_id = batch[-1].id
+        # Solo un lote de productos en memoria a la vez
+        db_session.expunge_all()
+
+def _count_products() -> int:
+    """Productos en la base de datos (lo que debe contener el índice nuevo)"""
+    return db_session.query(Product.id).count()
+
 @search_bp.route('/products', methods=['GET'])
+@conditional_get
 def search_products():
     """
     Endpoint para búsqueda avanzada de productos.
@@ -118,6 +155,7 @@ def search_products():
         }), 500
 
 @search_bp.route('/autocomplete', methods=['GET'])
+@conditional_get(extra_version=autocomplete_service.version)
 def autocomplete():
     """
     Endpoint para autocompletado de búsqueda.
@@ -158,72 +196,9 @@ def reindex_products():
     Solo accesible para administradores.
     """
     try:
-        # Obtener todos los productos con sus relaciones
-        products_query = db_session.query(Product).options(
-            joinedload(Product.category),
-            joinedload(Product.brand),
-            joinedload(Product.images),
-            joinedload(Product.variants),
-            joinedload(Product.attributes)
-        )
-        
-        products = products_query.all()
-        
-        # Convertir productos a formato para Elasticsearch
-        es_products = []
-        
-        for product in products:
-            es_product = {
-                "id": product.id,
-                "name": product.name,
-                "description": product.description,
-                "sku": product.sku,
-                "price": float(product.price),
-                "sale_price": float(product.sale_price) if product.sale_price else None,
-                "category_id": product.category_id,
-                "category_name": product.category.name if product.category else None,
-                "brand_id": product.brand_id,
-                "brand_name": product.brand.name if product.brand else None,
-                "tags": product.tags.split(',') if product.tags else [],
-                "rating": float(product.rating) if product.rating else 0.0,
-                "stock": product.stock,
-                "is_featured": product.is_featured,
-                "is_new": product.is_new,
-                "is_sale": product.is_sale,
-                "created_at": product.created_at.isoformat() if product.created_at else None,
-                "updated_at": product.updated_at.isoformat() if product.updated_at else None,
-                "images": [
-                    {
-                        "id": image.id,
-                        "image_url": image.image_url,
-                        "alt_text": image.alt_text
-                    }
-                    for image in product.images
-                ],
-                "variants": [
-                    {
-                        "id": variant.id,
-                        "sku": variant.sku,
-                        "color": variant.color,
-                        "size": variant.size,
-                        "price": float(variant.price),
-                        "stock": variant.stock
-                    }
-                    for variant in product.variants
-                ],
-                "attributes": [
-                    {
-                        "name": attr.name,
-                        "value": attr.value
-                    }
-                    for attr in product.attributes
-                ]
-            }
-            
-            es_products.append(es_product)
-        
-        # Reindexar productos
-        result = search_service.reindex_all_products(es_products)
+        # Reindexar productos en streaming desde la base de datos
+        result = search_service.reindex_all_products(_iter_search_documents(), expected_count=_count_products)
+        bump_catalog_version()
         
         return jsonify({
             "success": result['success'],
@@ -261,58 +236,13 @@ def index_product(product_id):
                 "error": f"Producto con ID {product_id} no encontrado"
             }), 404
         
-        # Convertir producto a formato para Elasticsearch
-        es_product = {
-            "id": product.id,
-            "name": product.name,
-            "description": product.description,
-            "sku": product.sku,
-            "price": float(product.price),
-            "sale_price": float(product.sale_price) if product.sale_price else None,
-            "category_id": product.category_id,
-            "category_name": product.category.name if product.category else None,
-            "brand_id": product.brand_id,
-            "brand_name": product.brand.name if product.brand else None,
-            "tags": product.tags.split(',') if product.tags else [],
-            "rating": float(product.rating) if product.rating else 0.0,
-            "stock": product.stock,
-            "is_featured": product.is_featured,
-            "is_new": product.is_new,
-            "is_sale": product.is_sale,
-            "created_at": product.created_at.isoformat() if product.created_at else None,
-            "updated_at": product.updated_at.isoformat() if product.updated_at else None,
-            "images": [
-                {
-                    "id": image.id,
-                    "image_url": image.image_url,
-                    "alt_text": image.alt_text
-                }
-                for image in product.images
-            ],
-            "variants": [
-                {
-                    "id": variant.id,
-                    "sku": variant.sku,
-                    "color": variant.color,
-                    "size": variant.size,
-                    "price": float(variant.price),
-                    "stock": variant.stock
-                }
-                for variant in product.variants
-            ],
-            "attributes": [
-                {
-                    "name": attr.name,
-                    "value": attr.value
-                }
-                for attr in product.attributes
-            ]
-        }
+        es_product = to_search_document(product)
         
         # Indexar producto
         success = search_service.index_product(es_product)
         
         if success:
+            bump_catalog_version()
             return jsonify({
                 "success": True,
                 "message": f"Producto {product_id} indexado correctamente"
@@ -341,6 +271,7 @@ def delete_product_from_index(product_id):
         success = search_service.delete_product(product_id)
         
         if success:
+            bump_catalog_version()
             return jsonify({
                 "success": True,
                 "message": f"Producto {product_id} eliminado del índice correctamente"
@@ -12,9 +12,12 @@ utilizando Elasticsearch como motor de búsqueda. Incluye:
 
 import os
 import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from elasticsearch import Elasticsearch
-from elasticsearch.exceptions import NotFoundError
-from typing import Dict, List, Any, Optional, Union
+from elasticsearch.exceptions import NotFoundError, TransportError
+from typing import Dict, List, Any, Optional, Union, Iterable, Iterator, Tuple, Callable
 import logging
 
 # Configurar logger
@@ -24,158 +27,231 @@ class SearchService:
     """Servicio de búsqueda con Elasticsearch para productos."""
     
     def __init__(self):
-        """Inicializa la conexión con Elasticsearch."""
+        """Lee la configuración; la conexión con Elasticsearch se abre en el primer uso."""
         self.es_host = os.environ.get('ELASTICSEARCH_HOST', 'elasticsearch')
         self.es_port = os.environ.get('ELASTICSEARCH_PORT', '9200')
         self.es_user = os.environ.get('ELASTICSEARCH_USER', '')
         self.es_pass = os.environ.get('ELASTICSEARCH_PASSWORD', '')
         
-        # Configurar cliente de Elasticsearch
-        if self.es_user and self.es_pass:
-            self.es = Elasticsearch(
-                [f'http://{self.es_host}:{self.es_port}'],
-                http_auth=(self.es_user, self.es_pass)
-            )
-        else:
-            self.es = Elasticsearch([f'http://{self.es_host}:{self.es_port}'])
-        
-        # Índice de productos
+        # Alias de lectura/escritura; apunta a la versión vigente products_v{n}
         self.index_name = 'products'
+        # Alias de la versión en construcción durante una reindexación
+        self.pending_alias = f'{self.index_name}_pending'
+        # IDs eliminados durante la carga de una reindexación (se aplican antes del cambio de alias)
+        self.tombstone_index = f'{self.index_name}_tombstones'
+        # Versiones conservadas tras el cambio de alias (la vigente y la anterior, para volver atrás)
+        self.keep_versions = int(os.environ.get('ELASTICSEARCH_KEEP_INDEX_VERSIONS', '2'))
+        
+        # Carga bulk: límites por chunk, envíos en paralelo y reintentos
+        self.bulk_chunk_size = int(os.environ.get('ELASTICSEARCH_BULK_CHUNK_SIZE', '500'))
+        self.bulk_max_bytes = int(os.environ.get('ELASTICSEARCH_BULK_MAX_BYTES', str(5 * 1024 * 1024)))
+        self.bulk_workers = int(os.environ.get('ELASTICSEARCH_BULK_WORKERS', '4'))
+        self.bulk_max_retries = int(os.environ.get('ELASTICSEARCH_BULK_MAX_RETRIES', '5'))
+        self.bulk_initial_backoff = float(os.environ.get('ELASTICSEARCH_BULK_INITIAL_BACKOFF', '0.5'))
         
-        # Crear índice si no existe
-        self._create_index_if_not_exists()
+        self._es = None
+        self._lock = threading.Lock()
+        # (vencimiento, índice) de la última consulta del alias products_pending
+        self._pending_cache: Tuple[float, Optional[str]] = (0.0, None)
     
-    def _create_index_if_not_exists(self) -> None:
-        """Crea el índice de productos si no existe."""
-        try:
-            if not self.es.indices.exists(index=self.index_name):
-                # Definición del mapeo para productos
-                mapping = {
-                    "settings": {
-                        "analysis": {
-                            "analyzer": {
-                                "spanish_analyzer": {
-                                    "type": "spanish",
-                                    "stopwords": "_spanish_"
-                                },
-                                "autocomplete": {
-                                    "type": "custom",
-                                    "tokenizer": "standard",
-                                    "filter": ["lowercase", "autocomplete_filter"]
-                                }
-                            },
-                            "filter": {
-                                "autocomplete_filter": {
-                                    "type": "edge_ngram",
-                                    "min_gram": 1,
-                                    "max_gram": 20
-                                }
-                            }
+    @property
+    def es(self) -> Elasticsearch:
+        """Cliente de Elasticsearch; en el primer acceso crea el índice si no existe."""
+        if self._es is None:
+            with self._lock:
+                if self._es is None:
+                    # Configurar cliente de Elasticsearch
+                    if self.es_user and self.es_pass:
+                        client = Elasticsearch(
+                            [f'http://{self.es_host}:{self.es_port}'],
+                            http_auth=(self.es_user, self.es_pass)
+                        )
+                    else:
+                        client = Elasticsearch([f'http://{self.es_host}:{self.es_port}'])
+                    
+                    self._es = client
+                    # Crear índice si no existe
+                    self._create_index_if_not_exists()
+        return self._es
+    
+    def warmup(self) -> None:
+        """Conecta con Elasticsearch por adelantado (p. ej. en el post_worker_init de gunicorn)."""
+        self.es
+    
+    def _index_body(self, **settings) -> Dict[str, Any]:
+        """Settings y mapeo de un índice de productos (settings extra p. ej. para la carga masiva)."""
+        body = {
+            "settings": {
+                "analysis": {
+                    "analyzer": {
+                        "spanish_analyzer": {
+                            "type": "spanish",
+                            "stopwords": "_spanish_"
                         },
-                        "number_of_shards": 1,
-                        "number_of_replicas": 1
+                        "autocomplete": {
+                            "type": "custom",
+                            "tokenizer": "standard",
+                            "filter": ["lowercase", "autocomplete_filter"]
+                        }
                     },
-                    "mappings": {
-                        "properties": {
-                            "id": {"type": "integer"},
-                            "name": {
-                                "type": "text",
-                                "analyzer": "spanish_analyzer",
-                                "fields": {
-                                    "autocomplete": {
-                                        "type": "text",
-                                        "analyzer": "autocomplete"
-                                    },
-                                    "keyword": {
-                                        "type": "keyword"
-                                    }
-                                }
-                            },
-                            "description": {
+                    "filter": {
+                        "autocomplete_filter": {
+                            "type": "edge_ngram",
+                            "min_gram": 1,
+                            "max_gram": 20
+                        }
+                    }
+                },
+                "number_of_shards": 1,
+                "number_of_replicas": 1
+            },
+            "mappings": {
+                "properties": {
+                    "id": {"type": "integer"},
+                    "name": {
+                        "type": "text",
+                        "analyzer": "spanish_analyzer",
+                        "fields": {
+                            "autocomplete": {
                                 "type": "text",
-                                "analyzer": "spanish_analyzer"
-                            },
-                            "sku": {
-                                "type": "keyword"
-                            },
-                            "price": {
-                                "type": "float"
-                            },
-                            "sale_price": {
-                                "type": "float"
-                            },
-                            "category_id": {
-                                "type": "integer"
-                            },
-                            "category_name": {
-                                "type": "keyword"
-                            },
-                            "brand_id": {
-                                "type": "integer"
+                                "analyzer": "autocomplete"
                             },
-                            "brand_name": {
+                            "keyword": {
                                 "type": "keyword"
-                            },
-                            "tags": {
-                                "type": "keyword"
-                            },
-                            "rating": {
-                                "type": "float"
-                            },
-                            "stock": {
-                                "type": "integer"
-                            },
-                            "is_featured": {
-                                "type": "boolean"
-                            },
-                            "is_new": {
-                                "type": "boolean"
-                            },
-                            "is_sale": {
-                                "type": "boolean"
-                            },
-                            "created_at": {
-                                "type": "date"
-                            },
-                            "updated_at": {
-                                "type": "date"
-                            },
-                            "images": {
-                                "type": "nested",
-                                "properties": {
-                                    "id": {"type": "integer"},
-                                    "image_url": {"type": "keyword"},
-                                    "alt_text": {"type": "text"}
-                                }
-                            },
-                            "variants": {
-                                "type": "nested",
-                                "properties": {
-                                    "id": {"type": "integer"},
-                                    "sku": {"type": "keyword"},
-                                    "color": {"type": "keyword"},
-                                    "size": {"type": "keyword"},
-                                    "price": {"type": "float"},
-                                    "stock": {"type": "integer"}
-                                }
-                            },
-                            "attributes": {
-                                "type": "nested",
-                                "properties": {
-                                    "name": {"type": "keyword"},
-                                    "value": {"type": "keyword"}
-                                }
                             }
                         }
+                    },
+                    "description": {
+                        "type": "text",
+                        "analyzer": "spanish_analyzer"
+                    },
+                    "sku": {
+                        "type": "keyword"
+                    },
+                    "price": {
+                        "type": "float"
+                    },
+                    "sale_price": {
+                        "type": "float"
+                    },
+                    "category_id": {
+                        "type": "integer"
+                    },
+                    "category_name": {
+                        "type": "keyword"
+                    },
+                    "brand_id": {
+                        "type": "integer"
+                    },
+                    "brand_name": {
+                        "type": "keyword"
+                    },
+                    "tags": {
+                        "type": "keyword"
+                    },
+                    "rating": {
+                        "type": "float"
+                    },
+                    "stock": {
+                        "type": "integer"
+                    },
+                    "is_featured": {
+                        "type": "boolean"
+                    },
+                    "is_new": {
+                        "type": "boolean"
+                    },
+                    "is_sale": {
+                        "type": "boolean"
+                    },
+                    "created_at": {
+                        "type": "date"
+                    },
+                    "updated_at": {
+                        "type": "date"
+                    },
+                    "images": {
+                        "type": "nested",
+                        "properties": {
+                            "id": {"type": "integer"},
+                            "image_url": {"type": "keyword"},
+                            "alt_text": {"type": "text"}
+                        }
+                    },
+                    "variants": {
+                        "type": "nested",
+                        "properties": {
+                            "id": {"type": "integer"},
+                            "sku": {"type": "keyword"},
+                            "color": {"type": "keyword"},
+                            "size": {"type": "keyword"},
+                            "price": {"type": "float"},
+                            "stock": {"type": "integer"}
+                        }
+                    },
+                    "attributes": {
+                        "type": "nested",
+                        "properties": {
+                            "name": {"type": "keyword"},
+                            "value": {"type": "keyword"}
+                        }
                     }
                 }
-                
-                # Crear índice con mapeo
-                self.es.indices.create(index=self.index_name, body=mapping)
-                logger.info(f"Índice '{self.index_name}' creado exitosamente")
+            }
+        }
+        body["settings"].update(settings)
+        return body
+    
+    def _create_index_if_not_exists(self) -> None:
+        """Crea la primera versión del índice de productos detrás del alias si no existe."""
+        try:
+            # exists() también es verdadero para un alias o para un índice 'products' heredado
+            if not self.es.indices.exists(index=self.index_name):
+                index = self._versioned_index(1)
+                body = self._index_body()
+                body["aliases"] = {self.index_name: {}}
+                self.es.indices.create(index=index, body=body)
+                logger.info(f"Índice '{index}' creado con alias '{self.index_name}'")
         except Exception as e:
             logger.error(f"Error al crear índice: {str(e)}")
     
+    def _versioned_index(self, version: int) -> str:
+        return f'{self.index_name}_v{version}'
+    
+    def _index_versions(self) -> Dict[int, List[str]]:
+        """Versiones existentes del índice de productos con sus alias."""
+        prefix = f'{self.index_name}_v'
+        versions = {}
+        for index, info in self.es.indices.get_alias(index=f'{prefix}*').items():
+            suffix = index[len(prefix):]
+            if suffix.isdigit():
+                versions[int(suffix)] = list(info.get('aliases', {}))
+        return versions
+    
+    # Segundos durante los que se reutiliza la consulta del alias products_pending
+    PENDING_CACHE_TTL = 1.0
+    
+    def _pending_index(self, use_cache: bool = True) -> Optional[str]:
+        """Índice en construcción por una reindexación (de cualquier proceso), si lo hay."""
+        expires, pending = self._pending_cache
+        if use_cache and expires > time.monotonic():
+            return pending
+        
+        try:
+            # Una sola consulta; un alias inexistente responde 404
+            response = self.es.indices.get_alias(name=self.pending_alias, ignore=404)
+            pending = next((index for index in response if index not in ('error', 'status')), None)
+        except Exception as e:
+            logger.warning(f"Error consultando el alias '{self.pending_alias}': {str(e)}")
+            return None
+        self._pending_cache = (time.monotonic() + self.PENDING_CACHE_TTL, pending)
+        return pending
+    
+    def write_indices(self) -> List[str]:
+        """Destinos de una escritura: el alias vigente y, durante una reindexación, la versión nueva."""
+        pending = self._pending_index()
+        return [self.index_name, pending] if pending else [self.index_name]
+    
     def index_product(self, product: Dict[str, Any]) -> bool:
         """
         Indexa un producto en Elasticsearch.
@@ -193,53 +269,248 @@ class SearchService:
                 body=product,
                 refresh=True
             )
-            return True
         except Exception as e:
             logger.error(f"Error al indexar producto {product.get('id')}: {str(e)}")
             return False
+        
+        # Durante una reindexación el cambio también va a la versión nueva
+        pending = self._pending_index()
+        if pending:
+            try:
+                self.es.index(index=pending, id=product['id'], body=product)
+                self._clear_tombstones([product['id']])
+            except Exception as e:
+                logger.warning(f"Error al indexar producto {product.get('id')} en '{pending}': {str(e)}")
+        return True
+    
+    def _record_tombstones(self, product_ids: List[int]) -> None:
+        """Registra productos eliminados durante una reindexación (la carga podría volver a crearlos)."""
+        body = "".join(
+            json.dumps({"index": {"_index": self.tombstone_index, "_id": product_id}}) + "\n" +
+            json.dumps({"id": product_id}) + "\n"
+            for product_id in product_ids
+        )
+        try:
+            self.es.bulk(body=body, refresh=False)
+        except Exception as e:
+            logger.warning(f"Error registrando productos eliminados durante la reindexación: {str(e)}")
+    
+    def _clear_tombstones(self, product_ids: List[int]) -> None:
+        """Un producto escrito de nuevo en la versión en construcción ya no debe eliminarse."""
+        body = "".join(
+            json.dumps({"delete": {"_index": self.tombstone_index, "_id": product_id}}) + "\n"
+            for product_id in product_ids
+        )
+        try:
+            self.es.bulk(body=body, refresh=False)
+        except Exception as e:
+            logger.warning(f"Error anulando productos eliminados durante la reindexación: {str(e)}")
     
-    def bulk_index_products(self, products: List[Dict[str, Any]]) -> Dict[str, int]:
+    # Estados de un ítem bulk que se reintentan (rechazo por cola llena o nodo no disponible)
+    RETRYABLE_STATUSES = (429, 502, 503, 504)
+    
+    def bulk_index_products(
+        self,
+        products: Iterable[Dict[str, Any]],
+        index: Optional[str] = None,
+        refresh: bool = True,
+        op_type: str = "index"
+    ) -> Dict[str, int]:
         """
-        Indexa múltiples productos en Elasticsearch usando bulk API.
+        Indexa productos en Elasticsearch usando bulk API en streaming.
+        
+        Los productos se consumen de forma perezosa (puede ser un generador)
+        y se envían en chunks acotados por cantidad (`bulk_chunk_size`) y
+        bytes (`bulk_max_bytes`) desde `bulk_workers` hilos; nunca hay más de
+        dos chunks por hilo en memoria. Los 429 y los ítems rechazados de
+        forma transitoria se reintentan con backoff exponencial.
         
         Args:
-            products: Lista de diccionarios con los datos de los productos
+            products: Iterable de diccionarios con los datos de los productos
+            index: Índice destino (por defecto el alias de productos)
+            refresh: Refrescar el índice al terminar
+            op_type: "index" sobrescribe; "create" conserva los documentos ya
+                existentes (los conflictos se cuentan en "skipped")
             
         Returns:
             Dict: Estadísticas de la operación bulk
         """
-        if not products:
-            return {"total": 0, "success": 0, "failed": 0}
+        index = index or self.index_name
+        stats = {"total": 0, "success": 0, "failed": 0, "skipped": 0}
         
-        try:
-            bulk_data = []
-            for product in products:
-                # Acción de indexación
-                bulk_data.append({"index": {"_index": self.index_name, "_id": product['id']}})
-                # Documento a indexar
-                bulk_data.append(product)
-            
-            # Ejecutar operación bulk
-            response = self.es.bulk(body=bulk_data, refresh=True)
-            
-            # Contar éxitos y fallos
-            success_count = 0
-            failed_count = 0
-            
-            for item in response['items']:
-                if 'index' in item and item['index'].get('status') >= 200 and item['index'].get('status') < 300:
-                    success_count += 1
+        # Escrituras en vivo sobre la versión en construcción: anulan los tombstones previos
+        written = []
+        if op_type == "index" and index != self.index_name:
+            def track(documents):
+                for document in documents:
+                    written.append(document['id'])
+                    yield document
+            products = track(products)
+        
+        def collect(future):
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error(f"Error en bulk indexing: {str(e)}")
+                result = {"failed": future.chunk_size}
+            for key, value in result.items():
+                stats[key] += value
+        
+        with ThreadPoolExecutor(max_workers=self.bulk_workers, thread_name_prefix='es-bulk') as executor:
+            in_flight = set()
+            try:
+                for chunk in self._bulk_chunks(products, index, op_type):
+                    stats["total"] += len(chunk)
+                    future = executor.submit(self._send_bulk_chunk, chunk, op_type)
+                    future.chunk_size = len(chunk)
+                    in_flight.add(future)
+                    # Contrapresión: no leer más productos mientras haya demasiados chunks pendientes
+                    if len(in_flight) >= self.bulk_workers * 2:
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            collect(future)
+            finally:
+                for future in in_flight:
+                    collect(future)
+        
+        if written:
+            self._clear_tombstones(written)
+        
+        if refresh and stats["success"]:
+            try:
+                self.es.indices.refresh(index=index)
+            except Exception as e:
+                logger.warning(f"Error al refrescar '{index}': {str(e)}")
+        
+        return stats
+    
+    def _bulk_chunks(
+        self,
+        documents: Iterable[Dict[str, Any]],
+        index: str,
+        op_type: str
+    ) -> Iterator[List[Tuple[str, str]]]:
+        """Agrupa los documentos serializados en chunks acotados por cantidad y bytes."""
+        chunk, chunk_bytes = [], 0
+        for document in documents:
+            action = json.dumps({op_type: {"_index": index, "_id": document['id']}})
+            source = json.dumps(document, default=str)
+            entry_bytes = len(action.encode('utf-8')) + len(source.encode('utf-8')) + 2
+            if chunk and (len(chunk) >= self.bulk_chunk_size or chunk_bytes + entry_bytes > self.bulk_max_bytes):
+                yield chunk
+                chunk, chunk_bytes = [], 0
+            chunk.append((action, source))
+            chunk_bytes += entry_bytes
+        if chunk:
+            yield chunk
+    
+    def _send_bulk_chunk(self, chunk: List[Tuple[str, str]], op_type: str) -> Dict[str, int]:
+        """Envía un chunk; reintenta con backoff el request completo ante 429 y los ítems transitorios."""
+        result = {"success": 0, "failed": 0, "skipped": 0}
+        pending = chunk
+        
+        for attempt in range(self.bulk_max_retries + 1):
+            if attempt:
+                time.sleep(self.bulk_initial_backoff * (2 ** (attempt - 1)))
+            
+            body = "".join(f"{action}\n{source}\n" for action, source in pending)
+            try:
+                response = self.es.bulk(body=body, refresh=False)
+            except TransportError as e:
+                if getattr(e, 'status_code', None) in self.RETRYABLE_STATUSES:
+                    logger.warning(f"Bulk rechazado ({e.status_code}), reintento {attempt + 1}/{self.bulk_max_retries}")
+                    continue
+                raise
+            
+            retry = []
+            for entry, item in zip(pending, response['items']):
+                status = item.get(op_type, {}).get('status', 500)
+                if 200 <= status < 300:
+                    result["success"] += 1
+                elif status == 409 and op_type == "create":
+                    result["skipped"] += 1
+                elif status in self.RETRYABLE_STATUSES:
+                    retry.append(entry)
                 else:
-                    failed_count += 1
+                    result["failed"] += 1
+                    logger.error(f"Documento rechazado en bulk: {item.get(op_type, {}).get('error')}")
             
-            return {
-                "total": len(products),
-                "success": success_count,
-                "failed": failed_count
-            }
+            if not retry:
+                return result
+            pending = retry
+        
+        logger.error(f"{len(pending)} documentos sin indexar tras {self.bulk_max_retries} reintentos")
+        result["failed"] += len(pending)
+        return result
+    
+    def bulk_delete_products(self, product_ids: List[int], index: Optional[str] = None,
+                             record_tombstones: bool = True) -> Dict[str, int]:
+        """
+        Elimina varios productos del índice en un solo request bulk.
+        
+        Args:
+            product_ids: IDs de los productos (un lote acotado)
+            index: Índice destino (por defecto el alias de productos)
+            record_tombstones: En una versión en construcción, registrar los ids para
+                quitarlos también de lo que cargue la reindexación
+            
+        Returns:
+            Dict: Estadísticas de la operación (un documento inexistente cuenta como eliminado)
+        """
+        if not product_ids:
+            return {"total": 0, "success": 0, "failed": 0}
+        
+        # Eliminación en la versión en construcción: la carga no debe volver a crearlos
+        if record_tombstones and index and index != self.index_name:
+            self._record_tombstones(product_ids)
+        
+        body = "".join(
+            json.dumps({"delete": {"_index": index or self.index_name, "_id": product_id}}) + "\n"
+            for product_id in product_ids
+        )
+        try:
+            response = self.es.bulk(body=body, refresh=False)
         except Exception as e:
-            logger.error(f"Error en bulk indexing: {str(e)}")
-            return {"total": len(products), "success": 0, "failed": len(products)}
+            logger.error(f"Error en bulk delete: {str(e)}")
+            return {"total": len(product_ids), "success": 0, "failed": len(product_ids)}
+        
+        success_count = sum(
+            1 for item in response['items']
+            if 200 <= item['delete'].get('status', 500) < 300 or item['delete'].get('status') == 404
+        )
+        return {"total": len(product_ids), "success": success_count, "failed": len(product_ids) - success_count}
+    
+    def get_indexed_watermarks(self, product_ids: List[int]) -> Dict[int, Optional[str]]:
+        """updated_at indexado de cada producto presente en el índice."""
+        if not product_ids:
+            return {}
+        response = self.es.mget(
+            index=self.index_name,
+            body={"ids": [str(product_id) for product_id in product_ids]},
+            _source_includes=["updated_at"]
+        )
+        return {
+            int(doc['_id']): doc.get('_source', {}).get('updated_at')
+            for doc in response['docs'] if doc.get('found')
+        }
+    
+    def iter_indexed_ids(self, batch_size: int = 1000, index: Optional[str] = None) -> Iterator[List[int]]:
+        """IDs de los documentos del índice (por defecto el alias) por lotes, paginando con search_after."""
+        search_after = None
+        while True:
+            body = {
+                "size": batch_size,
+                "_source": False,
+                "sort": [{"id": "asc"}],
+                "query": {"match_all": {}}
+            }
+            if search_after is not None:
+                body["search_after"] = search_after
+            hits = self.es.search(index=index or self.index_name, body=body)['hits']['hits']
+            if not hits:
+                return
+            yield [int(hit['_id']) for hit in hits]
+            search_after = hits[-1]['sort']
     
     def delete_product(self, product_id: int) -> bool:
         """
@@ -251,6 +522,16 @@ class SearchService:
         Returns:
             bool: True si la eliminación fue exitosa, False en caso contrario
         """
+        pending = self._pending_index()
+        if pending:
+            self._record_tombstones([product_id])
+            try:
+                self.es.delete(index=pending, id=product_id)
+            except NotFoundError:
+                pass
+            except Exception as e:
+                logger.warning(f"Error al eliminar producto {product_id} de '{pending}': {str(e)}")
+        
         try:
             self.es.delete(
                 index=self.index_name,
@@ -512,6 +793,9 @@ class SearchService:
         
         except Exception as e:
             logger.error(f"Error en búsqueda: {str(e)}")
+            fallback = self._local_search(query, filters, sort_by, sort_order, page, page_size, include_facets)
+            if fallback is not None:
+                return fallback
             return {
                 "products": [],
                 "pagination": {
@@ -524,6 +808,16 @@ class SearchService:
                 "error": str(e)
             }
     
+    def _local_search(self, *args) -> Optional[Dict[str, Any]]:
+        """Búsqueda en el índice embebido del proceso (None si no está disponible o aún no se construyó)."""
+        try:
+            from services.local_search_index import local_search_index
+            if local_search_index.ready:
+                return local_search_index.search(*args)
+        except Exception as e:
+            logger.warning(f"Índice local de búsqueda no disponible: {str(e)}")
+        return None
+    
     def autocomplete(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
         """
         Proporciona sugerencias de autocompletado para la búsqueda.
@@ -535,6 +829,15 @@ class SearchService:
         Returns:
             List: Lista de sugerencias
         """
+        # Tries en memoria del proceso; Elasticsearch solo mientras aún no se construyen
+        try:
+            from services.autocomplete_service import autocomplete_service
+            suggestions = autocomplete_service.suggest(query, limit)
+            if suggestions is not None:
+                return suggestions
+        except Exception as e:
+            logger.warning(f"Autocompletado en memoria no disponible: {str(e)}")
+        
         try:
             search_body = {
                 "size": limit,
@@ -554,6 +857,7 @@ class SearchService:
             for hit in response['hits']['hits']:
                 source = hit['_source']
                 suggestion = {
+                    "type": "product",
                     "id": source['id'],
                     "name": source['name'],
                     "sku": source.get('sku', ''),
@@ -572,42 +876,156 @@ class SearchService:
             logger.error(f"Error en autocompletado: {str(e)}")
             return []
     
-    def reindex_all_products(self, products: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def reindex_all_products(self, products: Iterable[Dict[str, Any]],
+                             expected_count: Optional[Callable[[], int]] = None) -> Dict[str, Any]:
         """
-        Reindexar todos los productos (elimina el índice y lo crea de nuevo).
+        Reindexar todos los productos sin cortar las búsquedas.
+        
+        Carga una versión nueva (products_v{n+1}) sin réplicas ni refresco,
+        la compacta con force-merge, restaura réplicas y refresco y luego
+        cambia el alias de forma atómica. El índice vigente sigue sirviendo
+        lecturas y escrituras hasta el cambio; las escrituras hechas durante
+        la carga se aplican también a la versión nueva (alias products_pending)
+        y la carga no las sobrescribe. Si la carga falla, el alias no se toca.
+        Las versiones antiguas se eliminan conservando `keep_versions`.
         
         Args:
-            products: Lista de productos a indexar
+            products: Productos a indexar (puede ser un generador; se consume una sola vez)
+            expected_count: Retorna cuántos productos hay en la base de datos; si el
+                índice nuevo no tiene exactamente esa cantidad, el alias no se cambia
             
         Returns:
             Dict: Estadísticas de la operación
         """
+        new_index = None
+        created = False
+        result = {"total": 0, "success": 0, "failed": 0, "skipped": 0}
         try:
-            # Eliminar índice si existe
-            if self.es.indices.exists(index=self.index_name):
-                self.es.indices.delete(index=self.index_name)
-                logger.info(f"Índice '{self.index_name}' eliminado")
+            pending = self._pending_index(use_cache=False)
+            if pending:
+                return {
+                    "success": False,
+                    "message": f"Ya hay una reindexación en curso ('{pending}')",
+                    "stats": result
+                }
+            
+            versions = self._index_versions()
+            new_index = self._versioned_index(max(versions, default=0) + 1)
+            
+            # Tombstones de esta reindexación: las eliminaciones hechas durante la carga
+            self.es.indices.delete(index=self.tombstone_index, ignore=404)
+            self.es.indices.create(index=self.tombstone_index, body={
+                "settings": {"number_of_shards": 1, "number_of_replicas": 0},
+                "mappings": {"properties": {"id": {"type": "integer"}}}
+            })
+            
+            # Carga masiva: sin réplicas ni refresco periódico
+            body = self._index_body()
+            target_replicas = body["settings"].get("number_of_replicas", 1)
+            body["settings"].update({"number_of_replicas": 0, "refresh_interval": "-1"})
+            body["aliases"] = {self.pending_alias: {}}
+            self.es.indices.create(index=new_index, body=body)
+            created = True
+            logger.info(f"Índice '{new_index}' creado para reindexación")
+            # Los demás procesos pueden tener en cache que no hay reindexación: se
+            # espera a que la vean antes de leer el catálogo, para no perder sus escrituras
+            time.sleep(self.PENDING_CACHE_TTL)
+            
+            result = self.bulk_index_products(products, index=new_index, refresh=False, op_type="create")
+            if result['failed']:
+                raise RuntimeError(f"{result['failed']} productos no se pudieron indexar en '{new_index}'")
+            
+            # La carga pudo volver a crear productos eliminados mientras se leía el catálogo
+            result["deleted"] = self._apply_tombstones(new_index)
             
-            # Crear índice de nuevo
-            self._create_index_if_not_exists()
+            self.es.indices.put_settings(index=new_index, body={"index": {"refresh_interval": None}})
+            self.es.indices.refresh(index=new_index)
             
-            # Indexar productos
-            result = self.bulk_index_products(products)
+            # Una carga truncada no debe reemplazar al índice vigente
+            if expected_count is not None:
+                indexed = self.es.count(index=new_index)['count']
+                expected = expected_count()
+                if indexed != expected:
+                    raise RuntimeError(
+                        f"'{new_index}' tiene {indexed} documentos y la base de datos {expected} productos"
+                    )
+            
+            self.es.indices.forcemerge(index=new_index, max_num_segments=1)
+            self.es.indices.put_settings(index=new_index, body={"index": {"number_of_replicas": target_replicas}})
+            self.es.cluster.health(index=new_index, wait_for_status="yellow", timeout="60s")
+            
+            # Cambio atómico del alias (y migración de un índice 'products' heredado sin versión)
+            actions = [
+                {"remove": {"index": new_index, "alias": self.pending_alias}},
+                {"add": {"index": new_index, "alias": self.index_name}}
+            ]
+            if self.es.indices.exists_alias(name=self.index_name):
+                for index in self.es.indices.get_alias(name=self.index_name):
+                    actions.append({"remove": {"index": index, "alias": self.index_name}})
+            elif self.es.indices.exists(index=self.index_name):
+                actions.append({"remove_index": {"index": self.index_name}})
+            self.es.indices.update_aliases(body={"actions": actions})
+            logger.info(f"Alias '{self.index_name}' apunta a '{new_index}'")
+            
+            self._delete_old_versions()
+            self._drop_tombstones()
             
             return {
                 "success": True,
-                "message": f"Reindexación completada. {result['success']} productos indexados, {result['failed']} fallidos.",
+                "message": f"Reindexación completada en '{new_index}'. {result['success']} productos indexados, {result['failed']} fallidos.",
                 "stats": result
             }
         
         except Exception as e:
             logger.error(f"Error en reindexación: {str(e)}")
+            # Solo se elimina el índice creado por esta llamada (si create falló, puede ser de otro proceso)
+            if created:
+                try:
+                    self.es.indices.delete(index=new_index)
+                except Exception as cleanup_error:
+                    logger.warning(f"No se pudo eliminar '{new_index}': {str(cleanup_error)}")
+                self._drop_tombstones()
             return {
                 "success": False,
                 "message": f"Error en reindexación: {str(e)}",
-                "stats": {"total": len(products), "success": 0, "failed": len(products)}
+                "stats": result
             }
     
+    def _apply_tombstones(self, index: str) -> int:
+        """Elimina de `index` los productos borrados durante la carga; retorna cuántos."""
+        self.es.indices.refresh(index=self.tombstone_index)
+        deleted = 0
+        for product_ids in self.iter_indexed_ids(index=self.tombstone_index):
+            stats = self.bulk_delete_products(product_ids, index=index, record_tombstones=False)
+            if stats["failed"]:
+                raise RuntimeError(f"{stats['failed']} productos eliminados no se pudieron quitar de '{index}'")
+            deleted += stats["success"]
+        if deleted:
+            logger.info(f"{deleted} productos eliminados durante la carga quitados de '{index}'")
+        return deleted
+    
+    def _drop_tombstones(self) -> None:
+        try:
+            self.es.indices.delete(index=self.tombstone_index, ignore=404)
+        except Exception as e:
+            logger.warning(f"No se pudo eliminar '{self.tombstone_index}': {str(e)}")
+    
+    def _delete_old_versions(self) -> List[str]:
+        """Elimina las versiones sin alias más antiguas que las `keep_versions` más recientes."""
+        deleted = []
+        versions = self._index_versions()
+        for version in sorted(versions, reverse=True)[self.keep_versions:]:
+            if versions[version]:
+                continue
+            index = self._versioned_index(version)
+            try:
+                self.es.indices.delete(index=index)
+                deleted.append(index)
+                logger.info(f"Índice antiguo '{index}' eliminado")
+            except Exception as e:
+                logger.warning(f"No se pudo eliminar el índice antiguo '{index}': {str(e)}")
+        return deleted
+    
     def get_product_by_id(self, product_id: int) -> Optional[Dict[str, Any]]:
         """
         Obtiene un producto por su ID.
@@ -655,6 +1073,6 @@ class SearchService:
             }
 
 
-# Instancia singleton del servicio
+# Instancia singleton del servicio (sin conexión hasta el primer uso)
 search_service = SearchService()
 
@@ -0,0 +1,486 @@
+"""
+Sincronización incremental del índice de búsqueda para eCommerce Modular
+Cola deduplicada de productos modificados, indexador en segundo plano por lotes y verificación de consistencia
+"""
+import os
+import sys
+import time
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, joinedload, selectinload
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from models.catalog import Product, ProductImage, ProductVariant, ProductAttribute
+from config.database import get_redis, get_db_session
+
+logger = logging.getLogger(__name__)
+
+# Sorted set: miembro = product_id, score = momento del primer cambio sin indexar
+# (compartido con ecommerce_admin_backend.py)
+DIRTY_PRODUCTS_KEY = 'search:dirty_products'
+
+# Modelos cuyas escrituras cambian el documento indexado de un producto
+PRODUCT_CHILD_MODELS = (ProductImage, ProductVariant, ProductAttribute)
+
+def to_search_document(product: Product) -> dict:
+    """Convierte un producto al documento que se indexa en Elasticsearch."""
+    return {
+        "id": product.id,
+        "name": product.name,
+        "description": product.description,
+        "sku": product.sku,
+        "price": float(product.price),
+        "sale_price": float(product.sale_price) if product.sale_price else None,
+        "category_id": product.category_id,
+        "category_name": product.category.name if product.category else None,
+        "brand_id": product.brand_id,
+        "brand_name": product.brand.name if product.brand else None,
+        "tags": product.tags.split(',') if product.tags else [],
+        "rating": float(product.rating) if product.rating else 0.0,
+        "stock": product.stock,
+        "is_featured": product.is_featured,
+        "is_new": product.is_new,
+        "is_sale": product.is_sale,
+        "created_at": product.created_at.isoformat() if product.created_at else None,
+        "updated_at": product.updated_at.isoformat() if product.updated_at else None,
+        "images": [
+            {
+                "id": image.id,
+                "image_url": image.image_url,
+                "alt_text": image.alt_text
+            }
+            for image in product.images
+        ],
+        "variants": [
+            {
+                "id": variant.id,
+                "sku": variant.sku,
+                "color": variant.color,
+                "size": variant.size,
+                "price": float(variant.price),
+                "stock": variant.stock
+            }
+            for variant in product.variants
+        ],
+        "attributes": [
+            {
+                "name": attr.name,
+                "value": attr.value
+            }
+            for attr in product.attributes
+        ]
+    }
+
+def search_document_query(session):
+    """Productos con las relaciones del documento (selectinload: una consulta IN por relación y lote)"""
+    return session.query(Product).options(
+        joinedload(Product.category),
+        joinedload(Product.brand),
+        selectinload(Product.images),
+        selectinload(Product.variants),
+        selectinload(Product.attributes)
+    )
+
+class DirtyProductQueue:
+    """
+    Productos pendientes de indexar. En Redis es un sorted set compartido por
+    todos los procesos (un id aparece una sola vez y conserva la hora de su
+    primer cambio); sin Redis se usa un diccionario local al proceso.
+    """
+
+    def __init__(self, key: str = DIRTY_PRODUCTS_KEY):
+        self.key = key
+        self._local: Dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, product_ids: Iterable[int], enqueued_at: Optional[float] = None):
+        entries = {int(product_id): enqueued_at or time.time() for product_id in product_ids}
+        self.restore(entries)
+
+    def restore(self, entries: Dict[int, float]):
+        """Encola conservando la hora original (NX: no rejuvenece ids ya pendientes)"""
+        if not entries:
+            return
+        try:
+            redis_client = get_redis()
+            if redis_client:
+                redis_client.zadd(self.key, entries, nx=True)
+                return
+        except Exception as e:
+            logger.warning(f"Error encolando productos para indexar: {e}")
+        with self._lock:
+            for product_id, enqueued_at in entries.items():
+                self._local.setdefault(product_id, enqueued_at)
+
+    def pop(self, count: int) -> Dict[int, float]:
+        """Saca hasta `count` ids, los más antiguos primero (atómico entre procesos)"""
+        entries = {}
+        try:
+            redis_client = get_redis()
+            if redis_client:
+                entries = {int(member): score for member, score in redis_client.zpopmin(self.key, count)}
+        except Exception as e:
+            logger.warning(f"Error leyendo la cola de indexación: {e}")
+        with self._lock:
+            for product_id, enqueued_at in sorted(self._local.items(), key=lambda item: item[1]):
+                if len(entries) >= count:
+                    break
+                entries.setdefault(product_id, self._local.pop(product_id))
+        return entries
+
+    def stats(self) -> Tuple[int, float]:
+        """Tamaño de la cola y antigüedad (s) del cambio pendiente más viejo"""
+        size, oldest = 0, None
+        try:
+            redis_client = get_redis()
+            if redis_client:
+                pipe = redis_client.pipeline()
+                pipe.zcard(self.key)
+                pipe.zrange(self.key, 0, 0, withscores=True)
+                size, head = pipe.execute()
+                oldest = head[0][1] if head else None
+        except Exception as e:
+            logger.warning(f"Error consultando la cola de indexación: {e}")
+        with self._lock:
+            size += len(self._local)
+            if self._local:
+                local_oldest = min(self._local.values())
+                oldest = local_oldest if oldest is None else min(oldest, local_oldest)
+        return size, (time.time() - oldest if oldest is not None else 0.0)
+
+# Instancia global de la cola
+dirty_products = DirtyProductQueue()
+
+# Callbacks con los ids confirmados por este proceso (p. ej. el índice local de búsqueda)
+_commit_listeners = []
+
+def add_commit_listener(callback):
+    """Registra un callback que recibe los product_ids de cada commit (no debe usar la sesión)"""
+    _commit_listeners.append(callback)
+
+def mark_products_dirty(session, product_ids: Iterable[int]):
+    """Encola productos al confirmar la sesión (p. ej. tras un UPDATE masivo que el ORM no ve)"""
+    session.info.setdefault('search_dirty_products', set()).update(product_ids)
+
+# Cualquier sesión ORM que escriba un producto o sus imágenes, variantes o
+# atributos encola el producto al confirmar; nunca antes, para que el
+# indexador lea los datos confirmados.
+@event.listens_for(Session, 'after_flush')
+def _collect_dirty_products(session, flush_context):
+    product_ids = set()
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, Product):
+            product_ids.add(instance.id)
+        elif isinstance(instance, PRODUCT_CHILD_MODELS):
+            product_ids.add(instance.product_id)
+    product_ids.discard(None)
+    if product_ids:
+        mark_products_dirty(session, product_ids)
+
+@event.listens_for(Session, 'after_commit')
+def _enqueue_on_commit(session):
+    product_ids = session.info.pop('search_dirty_products', None)
+    if product_ids:
+        dirty_products.add(product_ids)
+        for callback in _commit_listeners:
+            try:
+                callback(product_ids)
+            except Exception as e:
+                logger.warning(f"Error notificando productos confirmados: {e}")
+
+@event.listens_for(Session, 'after_rollback')
+def _clear_dirty_on_rollback(session):
+    session.info.pop('search_dirty_products', None)
+
+class SearchSyncService:
+    """
+    Indexador incremental: un hilo por proceso revisa la cola cada
+    `poll_interval` segundos y la vacía en lotes de hasta `batch_size`
+    productos cuando el lote está lleno o el cambio más antiguo esperó
+    `coalesce_seconds` (así varias ediciones seguidas del mismo producto
+    se indexan una sola vez). Un cambio no debería tardar más de
+    `max_staleness` segundos en llegar al índice; si ocurre se registra.
+    Tras un lote fallido el hilo espera con backoff exponencial (hasta
+    `max_backoff`) y un producto que falla `max_attempts` veces se descarta
+    a `dead_letter` en lugar de reencolarse indefinidamente.
+    """
+
+    def __init__(self, batch_size: int = 200, coalesce_seconds: float = 2.0,
+                 max_staleness: float = 30.0, poll_interval: float = 0.5, queue: DirtyProductQueue = None,
+                 max_attempts: int = 5, max_backoff: float = 60.0):
+        self.batch_size = batch_size
+        self.coalesce_seconds = coalesce_seconds
+        self.max_staleness = max_staleness
+        self.poll_interval = poll_interval
+        self.queue = queue or dirty_products
+        self.max_attempts = max_attempts
+        self.max_backoff = max_backoff
+        self.last_sync = None
+        self.dead_letter: Dict[int, float] = {}
+        self._attempts: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def configure(self, config):
+        """Toma la configuración de Flask (SEARCH_SYNC_BATCH_SIZE, SEARCH_SYNC_COALESCE_SECONDS,
+        SEARCH_SYNC_MAX_STALENESS, SEARCH_SYNC_POLL_INTERVAL, SEARCH_SYNC_MAX_ATTEMPTS,
+        SEARCH_SYNC_MAX_BACKOFF)"""
+        self.batch_size = int(config.get('SEARCH_SYNC_BATCH_SIZE', self.batch_size))
+        self.coalesce_seconds = float(config.get('SEARCH_SYNC_COALESCE_SECONDS', self.coalesce_seconds))
+        self.max_staleness = float(config.get('SEARCH_SYNC_MAX_STALENESS', self.max_staleness))
+        self.poll_interval = float(config.get('SEARCH_SYNC_POLL_INTERVAL', self.poll_interval))
+        self.max_attempts = int(config.get('SEARCH_SYNC_MAX_ATTEMPTS', self.max_attempts))
+        self.max_backoff = float(config.get('SEARCH_SYNC_MAX_BACKOFF', self.max_backoff))
+
+    # Indexación
+
+    def sync_products(self, product_ids: List[int]) -> Dict[str, int]:
+        """Indexa los productos existentes y elimina del índice los que ya no están en la base de datos"""
+        from services.search_service import search_service
+
+        # Primario, no réplica: el cambio recién confirmado podría no haber llegado aún
+        with get_db_session() as session:
+            documents = [
+                to_search_document(product)
+                for product in search_document_query(session).filter(Product.id.in_(product_ids))
+            ]
+
+        found = {document['id'] for document in documents}
+        missing = [product_id for product_id in product_ids if product_id not in found]
+        result = {"indexed": 0, "deleted": 0, "failed": 0}
+
+        # Durante una reindexación la versión en construcción también recibe el cambio
+        for index in search_service.write_indices():
+            if documents:
+                stats = search_service.bulk_index_products(documents, index=index, refresh=False)
+                result["indexed"] += stats["success"]
+                result["failed"] += stats["failed"]
+            if missing:
+                stats = search_service.bulk_delete_products(missing, index=index)
+                result["deleted"] += stats["success"]
+                result["failed"] += stats["failed"]
+        return result
+
+    def run_once(self, force: bool = False) -> Optional[Dict[str, int]]:
+        """Procesa un lote si corresponde; retorna sus estadísticas (None si no hubo lote)"""
+        size, oldest_age = self.queue.stats()
+        if not size or (not force and size < self.batch_size and oldest_age < self.coalesce_seconds):
+            return None
+
+        entries = self.queue.pop(self.batch_size)
+        if not entries:
+            return None
+
+        try:
+            result = self.sync_products(sorted(entries))
+        except Exception:
+            # Se devuelven a la cola con su hora original para no perder el cambio
+            self.queue.restore(entries)
+            raise
+        if result["failed"]:
+            self._retry_failed(entries)
+        else:
+            with self._lock:
+                for product_id in entries:
+                    self._attempts.pop(product_id, None)
+                    self.dead_letter.pop(product_id, None)
+
+        staleness = time.time() - min(entries.values())
+        if staleness > self.max_staleness:
+            logger.warning(f"Sincronización del índice con {staleness:.1f}s de retraso (máximo {self.max_staleness}s)")
+
+        with self._lock:
+            self.last_sync = {**result, "products": len(entries), "staleness_seconds": round(staleness, 3),
+                              "synced_at": time.time()}
+        return result
+
+    def _retry_failed(self, entries: Dict[int, float]):
+        """
+        Aísla los productos que fallan en un lote reintentándolos de a uno. Si
+        ninguno se indexa es una falla general (p. ej. Elasticsearch caído) y
+        el lote vuelve completo a la cola; si no, los que siguen fallando se
+        reencolan hasta `max_attempts` veces y luego se descartan a
+        `dead_letter` (check_consistency los vuelve a encolar si siguen
+        desactualizados).
+        """
+        failed = {}
+        if len(entries) > 1:
+            for product_id, enqueued_at in entries.items():
+                try:
+                    if not self.sync_products([product_id])["failed"]:
+                        continue
+                except Exception as e:
+                    logger.warning(f"Error reintentando la indexación del producto {product_id}: {e}")
+                failed[product_id] = enqueued_at
+            if len(failed) == len(entries):
+                self.queue.restore(entries)
+                return
+        else:
+            failed = dict(entries)
+
+        retry = {}
+        with self._lock:
+            for product_id in entries:
+                if product_id not in failed:
+                    self._attempts.pop(product_id, None)
+            for product_id, enqueued_at in failed.items():
+                attempts = self._attempts.pop(product_id, 0) + 1
+                if attempts < self.max_attempts:
+                    self._attempts[product_id] = attempts
+                    retry[product_id] = enqueued_at
+                else:
+                    self.dead_letter[product_id] = enqueued_at
+                    logger.error(f"Producto {product_id} descartado de la sincronización del índice tras {attempts} intentos")
+        self.queue.restore(retry)
+
+    def drain(self) -> Dict[str, int]:
+        """Vacía la cola completa (uso desde la línea de comandos)"""
+        totals = {"indexed": 0, "deleted": 0, "failed": 0}
+        while True:
+            result = self.run_once(force=True)
+            if result is None:
+                return totals
+            for key, value in result.items():
+                totals[key] += value
+            if result["failed"]:
+                return totals
+
+    def status(self) -> dict:
+        """Estado de la cola para health checks"""
+        size, oldest_age = self.queue.stats()
+        return {
+            "pending": size,
+            "oldest_pending_seconds": round(oldest_age, 3),
+            "within_sla": oldest_age <= self.max_staleness,
+            "dead_letter": len(self.dead_letter),
+            "last_sync": self.last_sync
+        }
+
+    # Hilo en segundo plano
+
+    def start(self):
+        """Arranca el indexador una vez por proceso (también después de un fork)"""
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='search-sync', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        failures = 0
+        while True:
+            try:
+                result = self.run_once()
+                if result is None:
+                    failures = 0
+                elif not result["failed"]:
+                    failures = 0
+                    continue
+                else:
+                    failures += 1
+            except Exception as e:
+                failures += 1
+                logger.warning(f"Error sincronizando el índice de búsqueda: {e}")
+            # Backoff exponencial mientras los lotes sigan fallando
+            time.sleep(min(self.max_backoff, self.poll_interval * 2 ** failures))
+
+    # Consistencia
+
+    def check_consistency(self, repair: bool = True, batch_size: int = 1000) -> Dict[str, int]:
+        """
+        Compara el índice con la base de datos: productos sin documento o con
+        un updated_at distinto al indexado, y documentos de productos que ya
+        no existen. Con `repair` los encola para el indexador. Recorre ambos
+        lados por lotes, con memoria constante.
+        """
+        from services.search_service import search_service
+
+        result = {"checked": 0, "missing": 0, "stale": 0, "orphaned": 0}
+        dirty = set()
+
+        def flush_dirty():
+            if repair and dirty:
+                self.queue.add(dirty)
+            dirty.clear()
+
+        # Base de datos -> índice
+        with get_db_session(readonly=True) as session:
+            batch = []
+            rows = session.query(Product.id, Product.updated_at).order_by(Product.id).yield_per(batch_size)
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    self._compare_batch(search_service, batch, result, dirty)
+                    flush_dirty()
+                    batch = []
+            if batch:
+                self._compare_batch(search_service, batch, result, dirty)
+                flush_dirty()
+
+        # Índice -> base de datos
+        for index_ids in search_service.iter_indexed_ids(batch_size):
+            with get_db_session(readonly=True) as session:
+                existing = {product_id for (product_id,) in
+                            session.query(Product.id).filter(Product.id.in_(index_ids))}
+            orphaned = [product_id for product_id in index_ids if product_id not in existing]
+            result["orphaned"] += len(orphaned)
+            dirty.update(orphaned)
+            flush_dirty()
+
+        logger.info(f"Consistencia del índice de búsqueda: {result}")
+        return result
+
+    def _compare_batch(self, search_service, rows, result: dict, dirty: set):
+        indexed = search_service.get_indexed_watermarks([row.id for row in rows])
+        for row in rows:
+            result["checked"] += 1
+            expected = row.updated_at.isoformat() if row.updated_at else None
+            if row.id not in indexed:
+                result["missing"] += 1
+                dirty.add(row.id)
+            elif indexed[row.id] != expected:
+                result["stale"] += 1
+                dirty.add(row.id)
+
+# Instancia global del indexador incremental
+search_sync_service = SearchSyncService()
+
+def main():
+    """Función principal (verificación nocturna por cron o indexador como proceso de larga duración)"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Sincronización incremental del índice de búsqueda')
+    parser.add_argument('--check-consistency', action='store_true',
+                        help='Comparar updated_at de la base de datos con el índice y encolar las diferencias')
+    parser.add_argument('--no-repair', action='store_true', help='Solo informar diferencias, sin encolarlas')
+    parser.add_argument('--interval', type=int, default=0,
+                        help='Segundos entre vaciados de la cola (0 = vaciar una vez y salir)')
+
+    args = parser.parse_args()
+
+    try:
+        if args.check_consistency:
+            result = search_sync_service.check_consistency(repair=not args.no_repair)
+            print(f"✓ Consistencia verificada: {result}")
+            if args.no_repair:
+                return
+
+        while True:
+            result = search_sync_service.drain()
+            print(f"✓ Cola de indexación procesada: {result}")
+            if not args.interval:
+                break
+            time.sleep(args.interval)
+    except Exception as e:
+        print(f"❌ Error en la sincronización del índice: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -78,6 +78,23 @@ class Config:
             password=os.getenv('DB_PASSWORD', 'ecommerce_password')
         )
         
+        # Pool de conexiones por proceso y ajuste automático de max_overflow
+        self.db_pool_size = int(os.getenv('DB_POOL_SIZE', '10'))
+        self.db_max_overflow = int(os.getenv('DB_MAX_OVERFLOW', '20'))
+        self.db_pool_timeout = int(os.getenv('DB_POOL_TIMEOUT', '30'))
+        self.db_pool_autosize = os.getenv('DB_POOL_AUTOSIZE', 'false').lower() == 'true'
+        self.db_pool_overflow_min = int(os.getenv('DB_POOL_OVERFLOW_MIN', '0'))
+        self.db_pool_overflow_max = int(os.getenv('DB_POOL_OVERFLOW_MAX', '50'))
+        self.db_pool_target_wait_ms = float(os.getenv('DB_POOL_TARGET_WAIT_MS', '20'))
+        
+        # Réplicas de lectura (URLs separadas por coma) y guardas de consistencia
+        self.database_replica_urls = [
+            url.strip() for url in os.getenv('DB_REPLICA_URLS', '').split(',') if url.strip()
+        ]
+        self.replica_max_lag_seconds = int(os.getenv('DB_REPLICA_MAX_LAG_SECONDS', '5'))
+        self.replica_check_interval = int(os.getenv('DB_REPLICA_CHECK_INTERVAL', '5'))
+        self.read_your_writes_seconds = int(os.getenv('DB_READ_YOUR_WRITES_SECONDS', '10'))
+        
         # Configuración de Redis
         self.redis = RedisConfig(
             host=os.getenv('REDIS_HOST', 'localhost'),
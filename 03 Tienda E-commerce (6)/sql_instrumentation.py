@@ -0,0 +1,147 @@
+"""
+Instrumentación SQL por request para eCommerce Modular
+Cuenta sentencias y tiempo de base de datos, detecta patrones N+1 y aplica presupuestos de queries
+"""
+import re
+import time
+import hashlib
+import logging
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+from flask import request, current_app
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+_PLACEHOLDER = r'(?:%s|%\(\w+\)s|\?|:\w+)'
+_IN_LIST_PATTERN = re.compile(rf'\(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})+\s*\)')
+_LITERAL_PATTERN = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+
+class QueryBudgetExceeded(Exception):
+    """Un endpoint ejecutó más sentencias SQL que su presupuesto"""
+
+    def __init__(self, endpoint: str, count: int, budget: int):
+        self.endpoint = endpoint
+        self.count = count
+        self.budget = budget
+        super().__init__(f"{endpoint} executed {count} SQL statements (budget: {budget})")
+
+def fingerprint(statement: str) -> str:
+    """Forma normalizada de una sentencia: sin literales y con listas IN colapsadas"""
+    normalized = _IN_LIST_PATTERN.sub('(?+)', statement)
+    normalized = _LITERAL_PATTERN.sub('?', normalized)
+    return _WHITESPACE_PATTERN.sub(' ', normalized).strip()
+
+class RequestQueryStats:
+    """Sentencias ejecutadas durante un request"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        self.started = time.perf_counter()
+
+    def record(self, statement: str, duration: float):
+        self.count += 1
+        self.duration += duration
+        self.fingerprints[fingerprint(statement)] += 1
+
+    def repeated(self, threshold: int):
+        """Fingerprints ejecutados al menos `threshold` veces (candidatos a N+1)"""
+        return [(statement, count) for statement, count in self.fingerprints.most_common() if count >= threshold]
+
+_current_stats: ContextVar[Optional[RequestQueryStats]] = ContextVar('sql_request_stats', default=None)
+
+# Hooks a nivel de clase Engine: cubren el engine de DatabaseManager, sus réplicas
+# y los engines propios de cada controlador
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_stats.get() is not None:
+        conn.info.setdefault('sql_query_start', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    starts = conn.info.get('sql_query_start')
+    if stats is None or not starts:
+        return
+    stats.record(statement, time.perf_counter() - starts.pop())
+
+def query_budget(max_queries: int):
+    """Presupuesto de sentencias SQL para un endpoint (sustituye a SQL_QUERY_BUDGET)"""
+    def decorator(f):
+        f.query_budget = max_queries
+        return f
+    return decorator
+
+def _endpoint_budget(default: int) -> int:
+    view = current_app.view_functions.get(request.endpoint)
+    return getattr(view, 'query_budget', default)
+
+def init_sql_instrumentation(app):
+    """
+    Registra la instrumentación en la app. Configuración:
+    SQL_INSTRUMENTATION (True), SQL_N_PLUS_ONE_THRESHOLD (5 repeticiones del
+    mismo fingerprint), SQL_QUERY_BUDGET (0 = sin límite) y
+    SQL_QUERY_BUDGET_MODE ('warn' registra, 'raise' lanza QueryBudgetExceeded; usar en tests).
+    """
+    if not app.config.get('SQL_INSTRUMENTATION', True):
+        return
+
+    threshold = app.config.get('SQL_N_PLUS_ONE_THRESHOLD', 5)
+    default_budget = app.config.get('SQL_QUERY_BUDGET', 0)
+    budget_mode = app.config.get('SQL_QUERY_BUDGET_MODE', 'warn')
+
+    @app.before_request
+    def start_sql_stats():
+        _current_stats.set(RequestQueryStats())
+
+    @app.after_request
+    def report_sql_stats(response):
+        stats = _current_stats.get()
+        if stats is None:
+            return response
+        _current_stats.set(None)
+
+        total_ms = (time.perf_counter() - stats.started) * 1000
+        db_ms = stats.duration * 1000
+        response.headers.add(
+            'Server-Timing', f'db;desc="SQL ({stats.count})";dur={db_ms:.1f}, app;dur={total_ms:.1f}'
+        )
+
+        endpoint = request.endpoint or request.path
+        repeated = stats.repeated(threshold)
+        log_fields = {
+            'endpoint': endpoint,
+            'method': request.method,
+            'status': response.status_code,
+            'sql_count': stats.count,
+            'sql_ms': round(db_ms, 1),
+            'duration_ms': round(total_ms, 1),
+            'sql_repeated': [
+                {'fingerprint': hashlib.sha1(statement.encode('utf-8')).hexdigest()[:12],
+                 'count': count, 'statement': statement[:200]}
+                for statement, count in repeated
+            ]
+        }
+
+        if repeated:
+            logger.warning(f"Posible N+1 en {endpoint}: {len(repeated)} sentencias repetidas", extra=log_fields)
+        else:
+            logger.info(f"SQL en {endpoint}: {stats.count} sentencias, {db_ms:.1f} ms", extra=log_fields)
+
+        budget = _endpoint_budget(default_budget)
+        if budget and stats.count > budget:
+            if budget_mode == 'raise':
+                raise QueryBudgetExceeded(endpoint, stats.count, budget)
+            logger.warning(f"{endpoint} excedió su presupuesto de queries: {stats.count} > {budget}", extra=log_fields)
+
+        return response
+
+    @app.teardown_request
+    def clear_sql_stats(exc):
+        _current_stats.set(None)
@@ -0,0 +1,172 @@
+"""
+Servicio de estado del sistema para eCommerce Modular
+Health probe y estadísticas cacheadas sobre el engine compartido, refrescadas por un hilo en segundo plano
+"""
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import func
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from models.catalog import Product, User
+from models.orders import Order
+from config.database import db_manager, get_redis, get_db_session
+
+logger = logging.getLogger(__name__)
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+class SystemStatusService:
+    """
+    Los endpoints /health y /api/v1/stats solo leen snapshots en memoria.
+    Un hilo por proceso los refresca: el probe cada `health_interval`
+    segundos con el engine de db_manager (sin crear pools nuevos) y las
+    estadísticas cada `stats_interval` segundos. El rollup de estadísticas se
+    comparte por Redis y solo un worker por intervalo ejecuta los conteos.
+    """
+
+    STATS_KEY = 'system_stats'
+    STATS_LOCK_KEY = 'system_stats:lock'
+
+    def __init__(self, health_interval: float = 5.0, stats_interval: float = 60.0):
+        self.health_interval = health_interval
+        self.stats_interval = stats_interval
+        self._health = None   # (monotonic, snapshot)
+        self._stats = None    # (monotonic, snapshot)
+        self._lock = threading.Lock()
+        self._refresher = None
+        self._pid = None
+
+    def configure(self, config):
+        """Toma los intervalos de la configuración de Flask (HEALTH_CHECK_INTERVAL, STATS_REFRESH_INTERVAL)"""
+        self.health_interval = float(config.get('HEALTH_CHECK_INTERVAL', self.health_interval))
+        self.stats_interval = float(config.get('STATS_REFRESH_INTERVAL', self.stats_interval))
+
+    # Health
+
+    def probe(self) -> dict:
+        """Ejecuta el probe de MySQL y Redis sobre las conexiones del pool compartido"""
+        status = db_manager.health_check()
+        mysql_error = next((error for error in status['errors'] if error.startswith('MySQL')), None)
+        return {
+            'database': 'connected' if status['mysql'] else f"error: {mysql_error}",
+            'redis': 'connected' if status['redis'] else 'unavailable',
+            'checked_at': _utcnow().isoformat()
+        }
+
+    def get_health(self) -> dict:
+        """Último resultado del probe (se ejecuta en línea solo si el snapshot está vencido)"""
+        self._ensure_refresher()
+        snapshot = self._fresh(self._health, self.health_interval)
+        if snapshot is None:
+            snapshot = self._refresh_health()
+        return snapshot
+
+    def _refresh_health(self) -> dict:
+        snapshot = self.probe()
+        with self._lock:
+            self._health = (time.monotonic(), snapshot)
+        return snapshot
+
+    # Estadísticas
+
+    def compute_stats(self) -> dict:
+        """Calcula el rollup con una sola consulta (tres subconsultas escalares)"""
+        since = _utcnow() - timedelta(days=30)
+        with get_db_session(readonly=True) as session:
+            active_products, active_users, orders_last_30_days = session.query(
+                session.query(func.count(Product.id)).filter(Product.is_active == True).scalar_subquery(),
+                session.query(func.count(User.id)).filter(User.is_active == True).scalar_subquery(),
+                session.query(func.count(Order.id)).filter(Order.created_at >= since).scalar_subquery()
+            ).one()
+
+        return {
+            'active_products': active_products or 0,
+            'active_users': active_users or 0,
+            'orders_last_30_days': orders_last_30_days or 0,
+            'computed_at': _utcnow().isoformat()
+        }
+
+    def get_stats(self) -> dict:
+        """Último rollup de estadísticas"""
+        self._ensure_refresher()
+        snapshot = self._fresh(self._stats, self.stats_interval)
+        if snapshot is None:
+            snapshot = self._refresh_stats()
+        return snapshot
+
+    def _refresh_stats(self) -> dict:
+        redis_client = get_redis()
+        snapshot = None
+
+        if redis_client:
+            try:
+                # Otro worker ya calculó el rollup de este intervalo
+                cached = redis_client.get(self.STATS_KEY)
+                lock_ttl = max(1, int(self.stats_interval))
+                if cached and not redis_client.set(self.STATS_LOCK_KEY, os.getpid(), nx=True, ex=lock_ttl):
+                    snapshot = json.loads(cached)
+            except Exception as e:
+                logger.warning(f"Error leyendo rollup de estadísticas desde Redis: {e}")
+
+        if snapshot is None:
+            snapshot = self.compute_stats()
+            if redis_client:
+                try:
+                    redis_client.setex(
+                        self.STATS_KEY, max(1, int(self.stats_interval * 10)),
+                        json.dumps(snapshot, separators=(',', ':'))
+                    )
+                except Exception as e:
+                    logger.warning(f"Error guardando rollup de estadísticas en Redis: {e}")
+
+        with self._lock:
+            self._stats = (time.monotonic(), snapshot)
+        return snapshot
+
+    # Refresco en segundo plano
+
+    def _fresh(self, entry, interval: float) -> Optional[dict]:
+        """Snapshot si tiene menos de dos intervalos (el hilo lo renueva cada intervalo)"""
+        if entry is not None and time.monotonic() - entry[0] < interval * 2:
+            return entry[1]
+        return None
+
+    def _ensure_refresher(self):
+        """Arranca el hilo de refresco una vez por proceso (también después de un fork)"""
+        if self._refresher is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._refresher is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._refresher = threading.Thread(target=self._run, name='system-status', daemon=True)
+            self._refresher.start()
+
+    def _run(self):
+        next_health = next_stats = 0.0
+        while True:
+            now = time.monotonic()
+            if now >= next_health:
+                try:
+                    self._refresh_health()
+                except Exception as e:
+                    logger.warning(f"Error ejecutando health probe: {e}")
+                next_health = now + self.health_interval
+            if now >= next_stats:
+                try:
+                    self._refresh_stats()
+                except Exception as e:
+                    logger.warning(f"Error actualizando estadísticas: {e}")
+                next_stats = now + self.stats_interval
+            time.sleep(max(0.1, min(next_health, next_stats) - time.monotonic()))
+
+# Instancia global del servicio de estado
+system_status_service = SystemStatusService()
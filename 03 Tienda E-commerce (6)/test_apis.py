@@ -254,6 +254,90 @@ class APITester:
         self.log_test("Search Products", success, message, response_time)
         return success
     
+    def test_products_cursor_pagination(self):
+        """Test de paginación keyset (cursor) en el listado de productos"""
+        params = {'cursor': '', 'per_page': 5, 'sort_by': 'price', 'sort_order': 'asc'}
+        response, response_time = self.make_request('GET', '/api/v1/products', params)
+        
+        if response and response.status_code == 200:
+            data = response.json()
+            pagination = data.get('pagination', {})
+            success = data.get('success', False) and 'next_cursor' in pagination
+            message = f"First page: {len(data.get('products', []))} products, has_next: {pagination.get('has_next')}"
+            
+            if success and pagination.get('next_cursor'):
+                params['cursor'] = pagination['next_cursor']
+                next_response, next_time = self.make_request('GET', '/api/v1/products', params)
+                response_time += next_time
+                
+                if next_response and next_response.status_code == 200:
+                    first_ids = {p['id'] for p in data.get('products', [])}
+                    next_ids = {p['id'] for p in next_response.json().get('products', [])}
+                    success = not (first_ids & next_ids)
+                    message += f", next page: {len(next_ids)} products, overlap: {not success}"
+                else:
+                    success = False
+                    message = f"Next page HTTP {next_response.status_code if next_response else 'No response'}"
+        else:
+            success = False
+            message = f"HTTP {response.status_code if response else 'No response'}"
+        
+        self.log_test("Products Cursor Pagination", success, message, response_time)
+        return success
+    
+    def test_products_conditional_get(self):
+        """Test de ETag / If-None-Match en el listado de productos"""
+        response, response_time = self.make_request('GET', '/api/v1/products')
+        
+        etag = response.headers.get('ETag') if response is not None else None
+        if response is not None and response.status_code == 200 and etag:
+            cached_response, cached_time = self.make_request(
+                'GET', '/api/v1/products', headers={'If-None-Match': etag}
+            )
+            response_time += cached_time
+            success = cached_response is not None and cached_response.status_code == 304
+            message = f"ETag {etag}, revalidation HTTP {cached_response.status_code if cached_response is not None else 'No response'}"
+        else:
+            success = False
+            message = f"HTTP {response.status_code if response is not None else 'No response'}, ETag: {etag}"
+        
+        self.log_test("Products Conditional GET", success, message, response_time)
+        return success
+    
+    def test_products_compression(self):
+        """Test de compresión gzip del listado de productos"""
+        response, response_time = self.make_request(
+            'GET', '/api/v1/products?per_page=50', headers={'Accept-Encoding': 'gzip'}
+        )
+        
+        if response is not None and response.status_code == 200:
+            encoding = response.headers.get('Content-Encoding')
+            vary = response.headers.get('Vary', '')
+            # Respuestas menores al umbral mínimo se envían sin comprimir
+            success = 'Accept-Encoding' in vary and (encoding == 'gzip' or len(response.content) < 1024)
+            message = f"Content-Encoding: {encoding}, Vary: {vary}, {len(response.content)} bytes"
+        else:
+            success = False
+            message = f"HTTP {response.status_code if response is not None else 'No response'}"
+        
+        self.log_test("Products Compression", success, message, response_time)
+        return success
+    
+    def test_server_timing(self):
+        """Test del header Server-Timing con el conteo de SQL del request"""
+        response, response_time = self.make_request('GET', '/api/v1/products?per_page=20')
+        
+        if response is not None and response.status_code == 200:
+            server_timing = response.headers.get('Server-Timing', '')
+            success = 'db;' in server_timing and 'app;' in server_timing
+            message = f"Server-Timing: {server_timing or 'missing'}"
+        else:
+            success = False
+            message = f"HTTP {response.status_code if response is not None else 'No response'}"
+        
+        self.log_test("Server-Timing SQL Stats", success, message, response_time)
+        return success
+    
     def test_get_featured_products(self):
         """Test de obtener productos destacados"""
         response, response_time = self.make_request('GET', '/api/v1/products/featured')
@@ -315,6 +399,61 @@ class APITester:
         self.log_test("API Stats", success, message, response_time)
         return success
     
+    def test_inventory_reservation(self):
+        """Test de reserva y liberación de inventario del carrito"""
+        if not self.user_token:
+            self.log_test("Inventory Reservation", False, "No user token available", 0)
+            return False
+        
+        response, response_time = self.make_request('GET', '/api/v1/products', data={'per_page': 50})
+        products = response.json().get('products', []) if response is not None and response.status_code == 200 else []
+        products = [p for p in products if p.get('inventory_quantity', 0) > 0]
+        if not products:
+            self.log_test("Inventory Reservation", False, "No products in stock", response_time)
+            return False
+        
+        reserve_response, reserve_time = self.make_request(
+            'POST', '/api/v1/orders/reservations',
+            data={'items': [{'product_id': products[0]['id'], 'quantity': 1}], 'ttl': 60},
+            auth_token=self.user_token
+        )
+        release_response, release_time = self.make_request(
+            'DELETE', '/api/v1/orders/reservations', auth_token=self.user_token
+        )
+        response_time += reserve_time + release_time
+        
+        success = (reserve_response is not None and reserve_response.status_code == 201 and
+                   release_response is not None and release_response.status_code == 200 and
+                   release_response.json().get('released', 0) >= 1)
+        message = (f"Reserve HTTP {reserve_response.status_code if reserve_response is not None else 'No response'}, "
+                   f"release HTTP {release_response.status_code if release_response is not None else 'No response'}")
+        
+        self.log_test("Inventory Reservation", success, message, response_time)
+        return success
+    
+    def test_idempotency_key(self):
+        """Test de Idempotency-Key: el reintento repite la respuesta original"""
+        if not self.user_token:
+            self.log_test("Idempotency Key", False, "No user token available", 0)
+            return False
+        
+        headers = {'Idempotency-Key': f"test-{int(time.time() * 1000)}"}
+        data = {'items': [{'product_id': 0, 'quantity': 1}]}
+        first, first_time = self.make_request('POST', '/api/v1/orders/reservations', data=data,
+                                              headers=headers, auth_token=self.user_token)
+        retry, retry_time = self.make_request('POST', '/api/v1/orders/reservations', data=data,
+                                              headers=headers, auth_token=self.user_token)
+        
+        success = (first is not None and retry is not None and
+                   retry.status_code == first.status_code and
+                   retry.headers.get('Idempotent-Replayed') == 'true' and
+                   retry.content == first.content)
+        message = (f"First HTTP {first.status_code if first is not None else 'No response'}, "
+                   f"replayed: {retry.headers.get('Idempotent-Replayed') if retry is not None else None}")
+        
+        self.log_test("Idempotency Key", success, message, first_time + retry_time)
+        return success
+    
     def test_rate_limiting(self):
         """Test de rate limiting"""
         # Hacer múltiples requests rápidas para probar rate limiting
@@ -334,14 +473,38 @@ class APITester:
         
         response_time = time.time() - start_time
         
+        # Los endpoints con rate limiting informan su cupo en headers X-RateLimit-*
+        products_response, products_time = self.make_request('GET', '/api/v1/products')
+        response_time += products_time
+        limit_header = products_response.headers.get('X-RateLimit-Limit') if products_response is not None else None
+        remaining_header = products_response.headers.get('X-RateLimit-Remaining') if products_response is not None else None
+        
         # Rate limiting funciona si se bloquea después de varios requests
         # O si todos pasan (límite no alcanzado)
-        success = success_count > 0
-        message = f"{success_count}/10 requests successful, rate limited: {rate_limited}"
+        success = success_count > 0 and limit_header is not None and remaining_header is not None
+        message = (f"{success_count}/10 requests successful, rate limited: {rate_limited}, "
+                   f"X-RateLimit-Limit: {limit_header}, X-RateLimit-Remaining: {remaining_header}")
         
         self.log_test("Rate Limiting", success, message, response_time)
         return success
     
+    def test_logout_revokes_token(self):
+        """Test de logout: el token deja de ser válido (debe ejecutarse al final)"""
+        if not self.user_token:
+            self.log_test("Logout Revokes Token", False, "No user token available", 0)
+            return False
+        
+        logout_response, logout_time = self.make_request('POST', '/api/v1/auth/logout', auth_token=self.user_token)
+        me_response, me_time = self.make_request('GET', '/api/v1/auth/me', auth_token=self.user_token)
+        
+        success = (logout_response is not None and logout_response.status_code == 200 and
+                   me_response is not None and me_response.status_code == 401)
+        message = (f"Logout HTTP {logout_response.status_code if logout_response is not None else 'No response'}, "
+                   f"/me after logout HTTP {me_response.status_code if me_response is not None else 'No response'}")
+        
+        self.log_test("Logout Revokes Token", success, message, logout_time + me_time)
+        return success
+    
     def run_all_tests(self):
         """Ejecuta todos los tests"""
         print("🚀 Iniciando suite de testing para eCommerce Modular API")
@@ -364,14 +527,23 @@ class APITester:
         # Tests de productos
         self.test_get_products()
         self.test_search_products()
+        self.test_products_cursor_pagination()
+        self.test_products_conditional_get()
+        self.test_products_compression()
+        self.test_server_timing()
         self.test_get_featured_products()
         
         # Tests de pedidos
         self.test_get_user_orders()
+        self.test_inventory_reservation()
+        self.test_idempotency_key()
         
         # Tests de seguridad
         self.test_rate_limiting()
         
+        # Revoca el token del usuario: siempre al final
+        self.test_logout_revokes_token()
+        
         # Resumen de resultados
         print("-" * 80)
         self.print_summary()
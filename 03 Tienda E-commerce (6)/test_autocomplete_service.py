@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Tests unitarios del trie de autocompletado
+No requieren servidor, base de datos ni Redis
+"""
+import os
+import sys
+
+# Agregar el directorio src al path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from services.autocomplete_service import PrefixTrie, TOP_K, normalize
+
+def build_trie(*entries):
+    """Trie construido a partir de tuplas (clave, peso, sugerencia)"""
+    trie = PrefixTrie()
+    for key, weight, suggestion in entries:
+        trie.insert(key, weight, suggestion)
+    trie.build()
+    return trie
+
+def test_normalize_folds_accents_and_punctuation():
+    assert normalize("  Camión   Rojo-XL! ") == "camion rojo xl"
+    assert normalize(None) == ""
+
+def test_insert_splits_shared_edge():
+    camiseta, camisa = {"name": "camiseta"}, {"name": "camisa"}
+    trie = build_trie(("camiseta", 1, camiseta), ("camisa", 2, camisa))
+
+    # La arista "camiseta" se divide en "camis" + ("eta", "a")
+    label, middle = trie.root.children["c"]
+    assert label == "camis"
+    assert sorted(child_label for child_label, _ in middle.children.values()) == ["a", "eta"]
+    assert trie.keys == 2
+
+def test_lookup_prefixes():
+    camiseta, camisa = {"name": "camiseta"}, {"name": "camisa"}
+    trie = build_trie(("camiseta", 1, camiseta), ("camisa", 2, camisa))
+
+    assert trie.lookup("") == (camisa, camiseta)
+    assert trie.lookup("cam") == (camisa, camiseta)
+    assert trie.lookup("camis") == (camisa, camiseta)
+    # Prefijo que termina a mitad de una arista
+    assert trie.lookup("camise") == (camiseta,)
+    assert trie.lookup("camiseta") == (camiseta,)
+
+def test_lookup_without_match():
+    trie = build_trie(("camiseta", 1, {"name": "camiseta"}))
+
+    assert trie.lookup("pantalon") == ()
+    assert trie.lookup("camisetas") == ()
+    assert trie.lookup("camx") == ()
+
+def test_top_is_sorted_by_weight_and_deduplicated():
+    roja = {"name": "Camiseta roja"}
+    azul = {"name": "Camiseta azul"}
+    # Cada palabra del nombre inicia una clave: la misma sugerencia llega dos veces bajo "c"
+    trie = build_trie(
+        ("camiseta roja", 5, roja),
+        ("roja", 5, roja),
+        ("camiseta azul", 1, azul),
+        ("azul", 1, azul),
+    )
+
+    assert trie.lookup("camiseta") == (roja, azul)
+    assert trie.lookup("r") == (roja,)
+
+def test_top_is_limited_to_top_k():
+    suggestions = [{"id": i} for i in range(TOP_K + 5)]
+    trie = build_trie(*((f"producto {i}", i, suggestion) for i, suggestion in enumerate(suggestions)))
+
+    top = trie.lookup("producto")
+    assert len(top) == TOP_K
+    assert top[0] is suggestions[-1]
+    assert [suggestion["id"] for suggestion in top] == sorted((s["id"] for s in top), reverse=True)
+
+def test_empty_key_is_ignored():
+    trie = build_trie(("", 1, {"name": "vacío"}))
+
+    assert trie.keys == 0
+    assert trie.lookup("") == ()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Tests unitarios del índice local de búsqueda (stemmer, ranking BM25 y filtros)
+No requieren servidor, base de datos ni Elasticsearch
+"""
+import os
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+# Agregar el directorio src al path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from services import local_search_index as index_module
+from services.local_search_index import LocalSearchIndex, _IndexData, analyze, stem
+
+def product_row(id, name, **fields):
+    """Fila con las columnas de LocalSearchIndex._query"""
+    row = {
+        'id': id, 'name': name, 'sku': f'SKU-{id}', 'short_description': None, 'description': None,
+        'price': 10.0, 'compare_price': None, 'inventory_quantity': 5, 'is_featured': False,
+        'is_active': True, 'deleted_at': None,
+        'created_at': datetime(2024, 1, id), 'updated_at': datetime(2024, 1, id),
+        'category_id': 1, 'category_name': 'Ropa', 'brand_id': 1, 'brand_name': 'Acme'
+    }
+    row.update(fields)
+    return SimpleNamespace(**row)
+
+def build_index(*rows):
+    index = LocalSearchIndex()
+    data = _IndexData()
+    index._apply_rows(data, rows)
+    index._data = data
+    return index
+
+def result_ids(result):
+    return [product['id'] for product in result['products']]
+
+@pytest.fixture
+def catalog():
+    return build_index(
+        product_row(1, 'Camiseta roja', price=15.0, category_id=1, brand_id=1, is_featured=True),
+        product_row(2, 'Pantalón azul', description='Combina con cualquier camiseta', price=40.0,
+                    category_id=2, brand_id=1),
+        product_row(3, 'Zapatos de cuero', price=80.0, inventory_quantity=0, category_id=3, brand_id=2),
+        product_row(4, 'Camisetas deportivas', price=None, category_id=1, brand_id=2),
+    )
+
+def test_stem_plurals_and_gender():
+    assert stem('camisetas') == 'camiset'
+    assert stem('camiseta') == 'camiset'
+    assert stem('rojo') == stem('roja') == stem('rojos') == 'roj'
+    assert stem('pantalones') == 'pantalon'
+    assert stem('canciones') == 'cancion'
+    assert stem('luces') == 'luz'
+
+def test_stem_keeps_short_tokens_and_numbers():
+    assert stem('sol') == 'sol'
+    assert stem('2024') == '2024'
+
+def test_analyze_folds_and_drops_stopwords():
+    assert analyze('La Camiseta ROJA de algodón') == ['camiset', 'roj', 'algodon']
+    assert analyze('La Camiseta ROJA', stemming=False) == ['camiseta', 'roja']
+    assert analyze(None) == []
+
+def test_search_requires_built_index():
+    with pytest.raises(RuntimeError):
+        LocalSearchIndex().search('camiseta')
+
+def test_bm25_ranks_name_above_description(catalog):
+    result = catalog.search('camiseta', include_facets=False)
+
+    # El nombre pesa 3 veces la descripción; el pantalón solo la menciona en la descripción
+    assert result_ids(result)[-1] == 2
+    assert set(result_ids(result)) == {1, 2, 4}
+    scores = [product['score'] for product in result['products']]
+    assert scores == sorted(scores, reverse=True)
+    assert result['engine'] == 'local'
+
+def test_plural_query_matches_singular(catalog):
+    assert set(result_ids(catalog.search('camisetas', include_facets=False))) == {1, 2, 4}
+
+def test_last_term_matches_as_prefix(catalog):
+    assert result_ids(catalog.search('zapa', include_facets=False)) == [3]
+    assert result_ids(catalog.search('inexistente', include_facets=False)) == []
+
+def test_filters(catalog):
+    def ids(**filters):
+        return sorted(result_ids(catalog.search(filters=filters, include_facets=False)))
+
+    assert ids(category_id='1') == [1, 4]
+    assert ids(brand_id=2) == [3, 4]
+    # Sin precio cuenta como 0
+    assert ids(price_min='20') == [2, 3]
+    assert ids(price_max=40) == [1, 2, 4]
+    assert ids(in_stock=True) == [1, 2, 4]
+    assert ids(is_featured=True) == [1]
+    assert ids(category_id=1, brand_id=1) == [1]
+
+def test_sort_places_missing_values_last(catalog):
+    result = catalog.search(sort_by='price', sort_order='desc', include_facets=False)
+
+    assert result_ids(result) == [3, 2, 1, 4]
+
+def test_default_order_is_newest_first(catalog):
+    assert result_ids(catalog.search(include_facets=False)) == [4, 3, 2, 1]
+
+def test_pagination_and_facets(catalog):
+    result = catalog.search(page=2, page_size=3)
+
+    assert result_ids(result) == [1]
+    assert result['pagination'] == {'page': 2, 'page_size': 3, 'total_items': 4, 'total_pages': 2}
+    assert {'name': 'Ropa', 'count': 4} in result['facets']['categories']
+    assert result['facets']['price_ranges'][0] == {'from': None, 'to': 50, 'count': 3}
+
+def test_inactive_rows_are_removed():
+    index = build_index(
+        product_row(1, 'Camiseta roja'),
+        product_row(1, 'Camiseta roja', is_active=False),
+    )
+
+    assert result_ids(index.search('camiseta', include_facets=False)) == []
+    assert index._data.total_len == 0
+
+def test_copy_does_not_modify_published_index(catalog):
+    published = catalog._data
+    data = published.copy()
+    catalog._apply_rows(data, [product_row(5, 'Camiseta verde'), product_row(1, 'Camiseta', is_active=False)])
+
+    assert 5 not in published.postings['camiset']
+    assert 1 in published.postings['camiset']
+    assert set(data.postings['camiset']) == {2, 4, 5}
+
+class FakeQuery:
+    """Query de LocalSearchIndex._query: ignora los filtros y retorna las filas dadas"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def filter(self, *criteria):
+        return self
+
+    def all(self):
+        return list(self.rows)
+
+@pytest.fixture
+def refreshable(monkeypatch):
+    @contextmanager
+    def session(*args, **kwargs):
+        yield None
+
+    monkeypatch.setattr(index_module, 'get_db_session', session)
+    index = build_index(product_row(1, 'Camiseta roja'), product_row(2, 'Pantalón azul'))
+    index.db_rows = []
+    index._query = lambda session: FakeQuery(index.db_rows)
+    return index
+
+def test_watermark_tracks_ids_at_latest_updated_at(refreshable):
+    assert refreshable._data.watermark == datetime(2024, 1, 2)
+    assert refreshable._data.watermark_ids == {2}
+
+def test_refresh_without_changes_keeps_published_index(refreshable):
+    published = refreshable._data
+    # La consulta por updated_at >= marca siempre retorna la fila de la marca
+    refreshable.db_rows = [product_row(2, 'Pantalón azul', updated_at=datetime(2024, 1, 2))]
+
+    assert refreshable.refresh() == 0
+    assert refreshable._data is published
+
+def test_refresh_applies_rows_at_or_after_watermark(refreshable):
+    published = refreshable._data
+    refreshable.db_rows = [
+        product_row(2, 'Pantalón azul', updated_at=datetime(2024, 1, 2)),
+        product_row(3, 'Camiseta verde', updated_at=datetime(2024, 1, 2)),
+    ]
+
+    assert refreshable.refresh() == 1
+    assert refreshable._data is not published
+    assert refreshable._data.watermark_ids == {2, 3}
+    assert result_ids(refreshable.search('verde', include_facets=False)) == [3]
+
+    # La siguiente pasada no encuentra cambios
+    assert refreshable.refresh() == 0
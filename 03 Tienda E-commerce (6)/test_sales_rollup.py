@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Tests unitarios de los ajustes de rollups por cambio de estado de una orden
+Usan un cursor falso: no requieren MySQL
+"""
+from datetime import date
+
+import pytest
+
+import sales_rollup
+
+class FakeCursor:
+    """Cursor que responde la fila de estado y la orden, y registra las demás sentencias"""
+
+    def __init__(self, last_order_id, order=None, dictionary=False):
+        self.last_order_id = last_order_id
+        self.order = order
+        self.dictionary = dictionary
+        self.executed = []
+        self._row = None
+
+    def execute(self, query, params=()):
+        query = ' '.join(query.split())
+        self.executed.append((query, params))
+        if query.startswith('SELECT last_order_id'):
+            self._row = {'last_order_id': self.last_order_id} if self.dictionary else (self.last_order_id,)
+        elif query.startswith('SELECT status'):
+            if self.order is None:
+                self._row = None
+            elif self.dictionary:
+                status, total, sales_date = self.order
+                self._row = {'status': status, 'total': total, 'DATE(created_at)': sales_date}
+            else:
+                self._row = self.order
+        else:
+            self._row = None
+
+    def fetchone(self):
+        return self._row
+
+    def updates(self):
+        """Sentencias que modifican los rollups con sus parámetros"""
+        return [(query.split()[0], params) for query, params in self.executed
+                if query.startswith(('UPDATE daily_sales_rollup', 'INSERT INTO product_sales_rollup'))]
+
+SALES_DATE = date(2024, 3, 1)
+
+@pytest.mark.parametrize('dictionary', [False, True])
+@pytest.mark.parametrize('old_status, new_status, sign', [
+    ('confirmed', 'cancelled', -1),
+    ('pending', 'cancelled', -1),
+    ('cancelled', 'confirmed', 1),
+    ('cancelled', 'pending', 1),
+])
+def test_entering_or_leaving_cancelled_adjusts_rollups(dictionary, old_status, new_status, sign):
+    cursor = FakeCursor(last_order_id=10, order=(old_status, 150.0, SALES_DATE), dictionary=dictionary)
+
+    assert sales_rollup.apply_status_transition(cursor, 7, new_status) == old_status
+    assert cursor.updates() == [
+        ('UPDATE', (sign * 150.0, sign, SALES_DATE)),
+        ('INSERT', (sign, sign, 7)),
+    ]
+
+@pytest.mark.parametrize('old_status, new_status', [
+    ('pending', 'confirmed'),
+    ('confirmed', 'shipped'),
+    ('cancelled', 'cancelled'),
+])
+def test_transitions_that_keep_cancellation_do_not_touch_rollups(old_status, new_status):
+    cursor = FakeCursor(last_order_id=10, order=(old_status, 150.0, SALES_DATE))
+
+    assert sales_rollup.apply_status_transition(cursor, 7, new_status) == old_status
+    assert cursor.updates() == []
+
+def test_order_not_yet_rolled_up_is_left_to_catch_up():
+    cursor = FakeCursor(last_order_id=10, order=('confirmed', 150.0, SALES_DATE))
+
+    assert sales_rollup.apply_status_transition(cursor, 11, 'cancelled') == 'confirmed'
+    assert cursor.updates() == []
+
+def test_missing_order_returns_none():
+    cursor = FakeCursor(last_order_id=10)
+
+    assert sales_rollup.apply_status_transition(cursor, 7, 'cancelled') is None
+    assert cursor.updates() == []
+
+def test_missing_total_counts_as_zero():
+    cursor = FakeCursor(last_order_id=10, order=('cancelled', None, SALES_DATE))
+
+    sales_rollup.apply_status_transition(cursor, 7, 'confirmed')
+
+    assert cursor.updates()[0] == ('UPDATE', (0, 1, SALES_DATE))
+
+def test_state_row_is_locked_before_the_order():
+    cursor = FakeCursor(last_order_id=10, order=('confirmed', 150.0, SALES_DATE))
+
+    sales_rollup.apply_status_transition(cursor, 7, 'cancelled')
+
+    first, second = cursor.executed[0][0], cursor.executed[1][0]
+    assert first.startswith('SELECT last_order_id') and first.endswith('LOCK IN SHARE MODE')
+    assert second.startswith('SELECT status') and second.endswith('FOR UPDATE')
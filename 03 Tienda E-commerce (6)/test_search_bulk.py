@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Tests unitarios de la carga bulk de SearchService (chunks acotados y reintentos)
+Usan un cliente falso: no requieren Elasticsearch
+"""
+import os
+import sys
+import json
+import time
+
+import pytest
+from elasticsearch.exceptions import TransportError
+
+# Agregar el directorio src al path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from services.search_service import SearchService
+
+class FakeElasticsearch:
+    """Responde a bulk() con las respuestas encoladas (un dict o una excepción por llamada)"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.bodies = []
+
+    def bulk(self, body, refresh=False):
+        self.bodies.append(body)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+def items(op_type, *statuses):
+    return {'items': [{op_type: {'status': status}} for status in statuses]}
+
+def documents(count, size=10):
+    return [{'id': i, 'name': 'x' * size} for i in range(count)]
+
+@pytest.fixture
+def service(monkeypatch):
+    service = SearchService()
+    service.bulk_chunk_size = 3
+    service.bulk_max_bytes = 10 * 1024
+    service.bulk_max_retries = 2
+    service.bulk_initial_backoff = 0.5
+    service.sleeps = []
+    monkeypatch.setattr(time, 'sleep', service.sleeps.append)
+    return service
+
+def test_chunks_are_bounded_by_count(service):
+    chunks = list(service._bulk_chunks(documents(7), 'products_v2', 'index'))
+
+    assert [len(chunk) for chunk in chunks] == [3, 3, 1]
+    action, source = chunks[0][0]
+    assert json.loads(action) == {'index': {'_index': 'products_v2', '_id': 0}}
+    assert json.loads(source)['id'] == 0
+
+def test_chunks_are_bounded_by_bytes(service):
+    docs = documents(4, size=400)
+    [[(action, source)]] = service._bulk_chunks(docs[:1], 'p', 'index')
+    entry_bytes = len(action) + len(source) + 2
+    service.bulk_chunk_size = 100
+    service.bulk_max_bytes = entry_bytes * 2
+
+    chunks = list(service._bulk_chunks(docs, 'p', 'index'))
+
+    assert [len(chunk) for chunk in chunks] == [2, 2]
+    for chunk in chunks:
+        assert sum(len(action) + len(source) + 2 for action, source in chunk) <= service.bulk_max_bytes
+
+def test_oversized_document_gets_its_own_chunk(service):
+    service.bulk_max_bytes = 100
+    docs = [{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'x' * 500}, {'id': 3, 'name': 'b'}]
+
+    chunks = list(service._bulk_chunks(docs, 'p', 'index'))
+
+    assert [[json.loads(source)['id'] for _, source in chunk] for chunk in chunks] == [[1], [2], [3]]
+
+def test_no_documents_yield_no_chunks(service):
+    assert list(service._bulk_chunks([], 'p', 'index')) == []
+
+def test_send_counts_item_results(service):
+    service._es = FakeElasticsearch(items('create', 201, 409, 400))
+    chunk = next(service._bulk_chunks(documents(3), 'p', 'create'))
+
+    assert service._send_bulk_chunk(chunk, 'create') == {'success': 1, 'failed': 1, 'skipped': 1}
+    assert service.sleeps == []
+
+def test_send_retries_only_transient_items(service):
+    service._es = FakeElasticsearch(items('index', 200, 429, 503), items('index', 200, 200))
+    chunk = next(service._bulk_chunks(documents(3), 'p', 'index'))
+
+    assert service._send_bulk_chunk(chunk, 'index') == {'success': 3, 'failed': 0, 'skipped': 0}
+    # El reintento solo reenvía los dos documentos rechazados
+    assert service._es.bodies[1].count('\n') == 4
+    assert '"_id": 0' not in service._es.bodies[1]
+    assert service.sleeps == [0.5]
+
+def test_send_retries_rejected_request_with_backoff(service):
+    service._es = FakeElasticsearch(TransportError(429, 'es_rejected_execution_exception', {}),
+                                    TransportError(503, 'unavailable', {}),
+                                    items('index', 200, 200, 200))
+    chunk = next(service._bulk_chunks(documents(3), 'p', 'index'))
+
+    assert service._send_bulk_chunk(chunk, 'index') == {'success': 3, 'failed': 0, 'skipped': 0}
+    assert service.sleeps == [0.5, 1.0]
+
+def test_send_gives_up_after_max_retries(service):
+    service._es = FakeElasticsearch(*(items('index', 429) for _ in range(service.bulk_max_retries + 1)))
+    chunk = next(service._bulk_chunks(documents(1), 'p', 'index'))
+
+    assert service._send_bulk_chunk(chunk, 'index') == {'success': 0, 'failed': 1, 'skipped': 0}
+    assert len(service._es.bodies) == service.bulk_max_retries + 1
+
+def test_send_raises_non_retryable_errors(service):
+    service._es = FakeElasticsearch(TransportError(400, 'mapper_parsing_exception', {}))
+    chunk = next(service._bulk_chunks(documents(1), 'p', 'index'))
+
+    with pytest.raises(TransportError):
+        service._send_bulk_chunk(chunk, 'index')
+    assert service.sleeps == []
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Tests unitarios de la cola de productos pendientes y del indexador incremental
+Usan la cola local al proceso: no requieren Redis, base de datos ni Elasticsearch
+"""
+import os
+import sys
+import time
+
+import pytest
+
+# Agregar el directorio src al path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from services import search_sync_service as sync_module
+from services.search_sync_service import DirtyProductQueue, SearchSyncService
+
+class FailingRedis:
+    """Cliente cuyas operaciones fallan (Redis caído después de conectar)"""
+
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            raise ConnectionError("Redis no disponible")
+        return fail
+
+def unavailable_redis():
+    raise ConnectionError("Redis no disponible")
+
+@pytest.fixture(params=[lambda: None, unavailable_redis, FailingRedis],
+                ids=['sin_redis', 'get_redis_falla', 'operaciones_fallan'])
+def queue(request, monkeypatch):
+    monkeypatch.setattr(sync_module, 'get_redis', request.param)
+    return DirtyProductQueue(key='test:dirty_products')
+
+def test_local_queue_deduplicates_and_keeps_first_time(queue):
+    queue.add([1, 2], enqueued_at=100.0)
+    queue.add([2, 3], enqueued_at=200.0)
+
+    assert queue.pop(10) == {1: 100.0, 2: 100.0, 3: 200.0}
+    assert queue.pop(10) == {}
+
+def test_local_queue_pops_oldest_first(queue):
+    queue.restore({1: 300.0, 2: 100.0, 3: 200.0})
+
+    assert queue.pop(2) == {2: 100.0, 3: 200.0}
+    assert queue.pop(2) == {1: 300.0}
+
+def test_local_queue_stats(queue):
+    assert queue.stats() == (0, 0.0)
+
+    now = time.time()
+    queue.add([1], enqueued_at=now - 10)
+    queue.add([2], enqueued_at=now - 5)
+
+    size, oldest_age = queue.stats()
+    assert size == 2
+    assert 10 <= oldest_age < 20
+
+class FakeSync(SearchSyncService):
+    """Indexador cuyo sync_products falla para los ids de `failing` (o lanza si `down`)"""
+
+    def __init__(self, queue, failing=(), down=False, **kwargs):
+        super().__init__(queue=queue, **kwargs)
+        self.failing = set(failing)
+        self.down = down
+        self.calls = []
+
+    def sync_products(self, product_ids):
+        self.calls.append(list(product_ids))
+        if self.down:
+            raise ConnectionError("Elasticsearch no disponible")
+        failed = len(self.failing.intersection(product_ids))
+        return {"indexed": len(product_ids) - failed, "deleted": 0, "failed": failed}
+
+@pytest.fixture
+def local_queue(monkeypatch):
+    monkeypatch.setattr(sync_module, 'get_redis', lambda: None)
+    return DirtyProductQueue(key='test:dirty_products')
+
+def test_run_once_waits_to_coalesce(local_queue):
+    sync = FakeSync(local_queue, batch_size=10, coalesce_seconds=60)
+    local_queue.add([1, 2])
+
+    assert sync.run_once() is None
+    assert sync.run_once(force=True) == {"indexed": 2, "deleted": 0, "failed": 0}
+    assert sync.calls == [[1, 2]]
+    assert local_queue.stats()[0] == 0
+
+def test_run_once_restores_batch_when_sync_raises(local_queue):
+    sync = FakeSync(local_queue, down=True)
+    local_queue.add([1, 2], enqueued_at=100.0)
+
+    with pytest.raises(ConnectionError):
+        sync.run_once(force=True)
+    assert local_queue.pop(10) == {1: 100.0, 2: 100.0}
+
+def test_failing_product_is_isolated_and_dead_lettered(local_queue):
+    sync = FakeSync(local_queue, failing=[2], max_attempts=2)
+    local_queue.add([1, 2, 3], enqueued_at=100.0)
+
+    sync.run_once(force=True)
+    # Reintento de a uno: solo el producto 2 vuelve a la cola
+    assert sync.calls == [[1, 2, 3], [1], [2], [3]]
+    assert local_queue.stats()[0] == 1
+    assert sync.dead_letter == {}
+
+    sync.run_once(force=True)
+    assert local_queue.stats()[0] == 0
+    assert sync.dead_letter == {2: 100.0}
+    assert sync.status()["dead_letter"] == 1
+
+def test_whole_batch_failure_is_not_counted_as_attempts(local_queue):
+    sync = FakeSync(local_queue, failing=[1, 2], max_attempts=1)
+    local_queue.add([1, 2], enqueued_at=100.0)
+
+    sync.run_once(force=True)
+
+    # Falla general: el lote vuelve completo y nada se descarta
+    assert local_queue.pop(10) == {1: 100.0, 2: 100.0}
+    assert sync.dead_letter == {}
+
+def test_successful_sync_clears_dead_letter(local_queue):
+    sync = FakeSync(local_queue)
+    sync.dead_letter[1] = 100.0
+    local_queue.add([1])
+
+    sync.run_once(force=True)
+
+    assert sync.dead_letter == {}